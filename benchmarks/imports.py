@@ -0,0 +1,153 @@
+# Import time of the modules of the API, each measured in a fresh interpreter, and the heavy dependencies
+# they pull in. Results are written as JSON and can be compared against a baseline, failing on regressions
+#
+# usage: python benchmarks/imports.py --output results.json
+#        python benchmarks/imports.py --baseline baseline.json --threshold 0.3
+
+from sys import executable, version, exit
+from os.path import dirname, abspath, join
+from argparse import ArgumentParser
+from json import dumps, loads
+from platform import platform
+from statistics import median
+from subprocess import run
+from time import time
+
+from typing import Any, Dict, List, Tuple
+
+_ROOT = abspath(join(dirname(__file__), '..'))
+
+# statement measured -> heavy dependencies it must not import
+_IMPORTS: Dict[str, Tuple[str, ...]] = {
+    "import holoai_api": ("aiohttp", "Crypto", "jsonschema", "transformers"),
+    "import holoai_api.utils": ("aiohttp", "Crypto", "jsonschema", "transformers"),
+    "import holoai_api.types": ("aiohttp", "Crypto", "jsonschema", "transformers"),
+    "from holoai_api import HoloAI_API": ("Crypto", "jsonschema", "transformers"),
+    "from holoai_api.story import HoloAI_Story": ("Crypto", "jsonschema", "transformers"),
+}
+
+_HEAVY_MODULES = ("aiohttp", "Crypto", "jsonschema", "transformers")
+
+# run in the fresh interpreter: time the statement, and list the heavy modules it imported
+_SCRIPT = """
+from sys import modules
+from time import perf_counter
+
+start = perf_counter()
+{statement}
+elapsed = perf_counter() - start
+
+print(elapsed)
+print(",".join(name for name in {heavy!r} if name in modules))
+"""
+
+def measure_import(statement: str) -> Tuple[float, List[str]]:
+    """
+    Import time of a statement in a fresh interpreter
+
+    :return: Time of the import (in seconds), heavy modules imported
+    """
+
+    script = _SCRIPT.format(statement = statement, heavy = _HEAVY_MODULES)
+    result = run([executable, "-c", script], cwd = _ROOT, capture_output = True, text = True)
+    assert result.returncode == 0, f"'{statement}' failed: {result.stderr}"
+
+    elapsed, modules = result.stdout.splitlines()[-2:]
+
+    return float(elapsed), [name for name in modules.split(",") if name]
+
+def bench(statement: str, repeat: int) -> Dict[str, Any]:
+    # the first run warms the bytecode cache, and isn't counted
+    measure_import(statement)
+
+    times = []
+    for _ in range(repeat):
+        elapsed, modules = measure_import(statement)
+        times.append(elapsed)
+
+    return { "min": min(times), "median": median(times), "repeat": repeat, "heavy_modules": modules }
+
+# === Comparison === #
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Tuple[str, float]]:
+    """
+    Compare the median times against a baseline
+
+    :return: Imports slower than the baseline by more than the threshold, with their ratio
+    """
+
+    regressions = []
+
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+
+        ratio = result["median"] / reference["median"]
+        if 1 + threshold < ratio:
+            regressions.append((name, ratio))
+
+    return regressions
+
+def check_heavy_modules(results: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """
+    :return: Imports pulling in heavy dependencies they shouldn't, with these dependencies
+    """
+
+    eager = []
+
+    for name, result in results["results"].items():
+        forbidden = [module for module in result["heavy_modules"] if module in _IMPORTS.get(name, ())]
+        if forbidden:
+            eager.append((name, forbidden))
+
+    return eager
+
+def main():
+    parser = ArgumentParser(description = "Import time of the modules of the API")
+    parser.add_argument("--output", default = None, help = "Write the results to this file")
+    parser.add_argument("--baseline", default = None, help = "Results to compare against")
+    parser.add_argument("--threshold", type = float, default = 0.3, help = "Tolerated slowdown relative to the baseline")
+    parser.add_argument("--filter", default = None, help = "Only measure the statements containing this string")
+    parser.add_argument("--repeat", type = int, default = 7, help = "Number of fresh interpreters per statement")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": time(),
+        "python": version,
+        "platform": platform(),
+        "results": {},
+    }
+
+    for statement in _IMPORTS:
+        if args.filter is not None and args.filter not in statement:
+            continue
+
+        result = bench(statement, args.repeat)
+        results["results"][statement] = result
+
+        modules = ", ".join(result["heavy_modules"]) or "-"
+        print(f"{statement:<45} median {result['median'] * 1000:8.1f} ms   min {result['min'] * 1000:8.1f} ms   heavy: {modules}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(dumps(results, indent = 4))
+
+    failed = False
+
+    for name, modules in check_heavy_modules(results):
+        print(f"EAGER IMPORT {name}: imports {', '.join(modules)}")
+        failed = True
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = loads(f.read())
+
+        for name, ratio in compare(results, baseline, args.threshold):
+            print(f"REGRESSION {name}: {ratio:.2f}x the baseline")
+            failed = True
+
+    if failed:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
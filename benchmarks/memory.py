@@ -0,0 +1,260 @@
+# Memory harness: load a synthetic account (N stories of M KB) from the fake server under tracemalloc,
+# and report the peak and retained memory of each step of the loading, so the structures to blame can be found.
+# The fake server runs in a separate process, so its allocations aren't traced
+#
+# usage: python benchmarks/memory.py --stories 1000 --story-size 16
+#        python benchmarks/memory.py --stories 1000 --story-size 16 --budget proxies=20M --budget total=200M
+
+from sys import path, executable, exit
+from os.path import dirname, abspath, join
+from argparse import ArgumentParser
+from asyncio import run, gather
+from json import dumps
+from subprocess import Popen
+import tracemalloc
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api import HoloAI_API
+from holoai_api.bench import _wait_reachable
+from holoai_api.utils import format_and_decrypt_stories
+from holoai_api.story import HoloAI_Story, HoloAI_StoryProxy
+from holoai_api.GlobalSettings import GlobalSettings
+from holoai_api.FakeServer import generate_story, get_account_key
+from holoai_api.types import Model, Prefix
+
+from typing import Any, Dict, List, Tuple, NoReturn
+
+_SUBSYSTEMS = ("raw_json", "decrypted", "proxies", "tokenizer_cache", "trees")
+
+_SIZE_UNITS = { "K": 1 << 10, "M": 1 << 20, "G": 1 << 30 }
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size in bytes, with an optional K, M or G suffix
+    """
+
+    unit = _SIZE_UNITS.get(size[-1:].upper())
+
+    return int(float(size[:-1]) * unit) if unit is not None else int(size)
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if _SIZE_UNITS[unit] <= abs(size):
+            return f"{size / _SIZE_UNITS[unit]:.1f} {unit}iB"
+
+    return f"{size} B"
+
+class _Phase:
+    """
+    Measure the peak and retained memory of a block, with the allocation sites that grew the most
+    """
+
+    name: str
+    top: int
+    result: Dict[str, Any]
+
+    # peaks of the run before each reset, so the peak of the whole run can be computed
+    _run_peaks: List[int]
+
+    def __init__(self, name: str, top: int, run_peaks: List[int]):
+        self.name = name
+        self.top = top
+        self._run_peaks = run_peaks
+
+    def __enter__(self) -> "_Phase":
+        self._snapshot = tracemalloc.take_snapshot() if self.top else None
+
+        # reset_peak is only available from python 3.9, the peak is then a global peak
+        if hasattr(tracemalloc, "reset_peak"):
+            self._run_peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        self._start = tracemalloc.get_traced_memory()[0]
+
+        return self
+
+    def __exit__(self, *args):
+        current, peak = tracemalloc.get_traced_memory()
+
+        self.result = {
+            "peak": peak - self._start,
+            "retained": current - self._start,
+            "top": [],
+        }
+
+        if self._snapshot is not None:
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+
+            stats = snapshot.compare_to(self._snapshot.filter_traces(filters), "lineno")
+            self.result["top"] = [{ "site": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff }
+                                  for stat in stats[:self.top]]
+
+def _has_tokenizer() -> bool:
+    try:
+        import transformers
+    except ImportError:
+        return False
+
+    return True
+
+def _warm_up() -> NoReturn:
+    """
+    Go once through the loading of a story, so the lazy imports of the decryption and of the proxies
+    aren't counted in the phases
+    """
+
+    account_key = get_account_key("password", "salt")
+    story = generate_story(account_key, 16, iterations = 1)
+
+    format_and_decrypt_stories(account_key, story)
+    HoloAI_Story(None, GlobalSettings()).loads([story])
+
+async def _generate(proxy: HoloAI_StoryProxy, generations: int) -> NoReturn:
+    for _ in range(generations):
+        await proxy.generate()
+
+async def measure(args: Any) -> Dict[str, Any]:
+    results = {}
+    run_peaks = []
+
+    api = HoloAI_API(base_address = args.base_url)
+    account_key = await api.high_level.login(args.email, args.password)
+
+    _warm_up()
+    tracemalloc.start(args.frames)
+
+    try:
+        # get_stories, split in its fetch and its decryption
+        with _Phase("raw_json", args.top, run_peaks) as phase:
+            home = await api.low_level.get_home()
+            stories = home["pageProps"]["user"]["stories"]
+        results["raw_json"] = phase.result
+
+        with _Phase("decrypted", args.top, run_peaks) as phase:
+            format_and_decrypt_stories(account_key, *stories)
+        results["decrypted"] = phase.result
+
+        with _Phase("proxies", args.top, run_peaks) as phase:
+            holo_story = HoloAI_Story(api, GlobalSettings())
+            proxies = holo_story.loads(stories)
+        results["proxies"] = phase.result
+
+        # building the contexts of the generations needs the tokenizer
+        if not _has_tokenizer():
+            results["tokenizer_cache"] = None
+            results["trees"] = None
+        else:
+            from holoai_api.Tokenizer import Tokenizer
+
+            # the bundled tokenizer, so it works offline
+            with _Phase("tokenizer_cache", args.top, run_peaks) as phase:
+                Tokenizer.encode(Model.Model_20B, str(proxies[0]) if proxies else "")
+            results["tokenizer_cache"] = phase.result
+
+            for proxy in proxies:
+                proxy.model = Model.Model_20B
+                proxy.prefix = Prefix.Generic.to_prefix_header({})
+
+            # generations appended to every story, with their memoized contexts
+            with _Phase("trees", args.top, run_peaks) as phase:
+                await gather(*(_generate(proxy, args.generations) for proxy in proxies))
+            results["trees"] = phase.result
+
+        total_current, peak = tracemalloc.get_traced_memory()
+        total_peak = max(run_peaks + [peak])
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "stories": len(stories),
+        "story_size": args.story_size * 1024,
+        "subsystems": results,
+        "total": { "peak": total_peak, "retained": total_current },
+    }
+
+def check_budgets(report: Dict[str, Any], budgets: Dict[str, int]) -> List[Tuple[str, int, int]]:
+    """
+    :return: Subsystems (or total) retaining more than their budget, with their retained memory and budget
+    """
+
+    exceeded = []
+
+    for name, budget in budgets.items():
+        result = report["total"] if name == "total" else report["subsystems"].get(name)
+        if result is not None and budget < result["retained"]:
+            exceeded.append((name, result["retained"], budget))
+
+    return exceeded
+
+def _print_report(report: Dict[str, Any]):
+    print(f"{report['stories']} stories of {format_size(report['story_size'])}")
+    print(f"{'subsystem':<18}{'peak':>14}{'retained':>14}")
+
+    for name, result in report["subsystems"].items():
+        if result is None:
+            print(f"{name:<18}{'skipped':>14}")
+            continue
+
+        print(f"{name:<18}{format_size(result['peak']):>14}{format_size(result['retained']):>14}")
+        for site in result["top"]:
+            print(f"    {format_size(site['size_diff']):>12}  {site['site']}")
+
+    print(f"{'total':<18}{format_size(report['total']['peak']):>14}{format_size(report['total']['retained']):>14}")
+
+def main():
+    parser = ArgumentParser(description = "Memory usage of the loading of an account, per subsystem")
+    parser.add_argument("--base-url", default = "http://127.0.0.1:8090", help = "Address of the fake server")
+    parser.add_argument("--email", default = "user@example.com")
+    parser.add_argument("--password", default = "password")
+    parser.add_argument("--stories", type = int, default = 200, help = "Number of stories of the account")
+    parser.add_argument("--story-size", type = int, default = 16, help = "Size of the text of a story (in KB)")
+    parser.add_argument("--generations", type = int, default = 20, help = "Fragments appended to each story")
+    parser.add_argument("--top", type = int, default = 3, help = "Number of allocation sites shown per subsystem")
+    parser.add_argument("--frames", type = int, default = 1, help = "Number of frames traced per allocation")
+    parser.add_argument("--budget", action = "append", default = [],
+                        help = f"Maximum retained memory, as NAME=SIZE (NAME in {', '.join(_SUBSYSTEMS)} or total)")
+    parser.add_argument("--no-spawn", action = "store_true", help = "Use an already running fake server")
+    parser.add_argument("--json", default = None, help = "Write the report to this file")
+    args = parser.parse_args()
+
+    budgets = {}
+    for budget in args.budget:
+        name, _, size = budget.partition("=")
+        assert name in _SUBSYSTEMS or name == "total", f"Unknown subsystem '{name}'"
+        budgets[name] = parse_size(size)
+
+    server = None
+    if not args.no_spawn:
+        port = args.base_url.rsplit(":", 1)[-1].strip("/")
+        server = Popen([executable, "-m", "holoai_api.FakeServer", "--port", port,
+                        "--email", args.email, "--password", args.password,
+                        "--stories", str(args.stories), "--story-size", str(args.story_size * 1024)],
+                       cwd = join(dirname(abspath(__file__)), ".."))
+
+    try:
+        if server is not None:
+            run(_wait_reachable(args.base_url, 60 + args.stories / 100))
+
+        report = run(measure(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    _print_report(report)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            f.write(dumps(report, indent = 4))
+
+    exceeded = check_budgets(report, budgets)
+    for name, retained, budget in exceeded:
+        print(f"OVER BUDGET {name}: {format_size(retained)} retained, budget {format_size(budget)}")
+
+    if exceeded:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# Offline micro-benchmarks of the hot paths of the API, on synthetic fixtures
+# Results are written as JSON and can be compared against a baseline, failing on regressions
+#
+# usage: python benchmarks/micro.py --output results.json
+#        python benchmarks/micro.py --baseline baseline.json --threshold 0.2
+#        python benchmarks/micro.py --filter decrypt --stories 1000
+
+from sys import path, version, exit
+from os.path import dirname, abspath, join
+from argparse import ArgumentParser
+from copy import deepcopy
+from gc import collect, disable, enable, isenabled
+from json import dumps, loads
+from platform import platform
+from random import Random
+from statistics import median
+from time import perf_counter, time
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api import srp
+from holoai_api.FakeServer import generate_story, generate_text, get_account_key, _sjcl_envelope
+from holoai_api.utils import Sjcl_ccm, format_and_decrypt_stories, encrypt_and_format_stories, \
+                             build_gen_settings, _gen_tables_cache
+from holoai_api.Preset import Preset
+from holoai_api.BanList import BanList
+from holoai_api.BiasGroup import BiasGroup
+from holoai_api.types import Model
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# the tokenizer of this model is bundled, so it works offline
+_TOKENIZER_MODEL = Model.Model_20B
+
+_BENCHMARKS: List[Tuple[str, Callable[[Any], Optional[Dict[str, Any]]]]] = []
+
+def benchmark(name: str):
+    def register(func: Callable[[Any], Optional[Dict[str, Any]]]):
+        _BENCHMARKS.append((name, func))
+
+        return func
+
+    return register
+
+def measure(func: Callable[[Any], Any], setup: Optional[Callable[[], Any]] = None,
+            repeat: int = 5, number: int = 1) -> Dict[str, Any]:
+    """
+    Time a function, with the garbage collector disabled (as timeit does)
+
+    :param func: Function to time, called with the result of setup
+    :param setup: Called right before each call, untimed
+    :param repeat: Number of measures
+    :param number: Number of calls per measure
+
+    :return: Time per call (in seconds) of the measures
+    """
+
+    times = []
+    gc_enabled = isenabled()
+
+    for _ in range(repeat):
+        collect()
+        disable()
+
+        try:
+            if setup is None:
+                start = perf_counter()
+                for _ in range(number):
+                    func(None)
+                elapsed = perf_counter() - start
+            else:
+                # the setup runs right before each call (e.g. to clear a cache), out of the measure
+                elapsed = 0.0
+                for _ in range(number):
+                    arg = setup()
+
+                    start = perf_counter()
+                    func(arg)
+                    elapsed += perf_counter() - start
+
+            times.append(elapsed / number)
+        finally:
+            if gc_enabled:
+                enable()
+
+    return { "min": min(times), "median": median(times), "mean": sum(times) / len(times), "repeat": repeat, "number": number }
+
+# === Fixtures === #
+_ACCOUNT_KEY = get_account_key("password", "salt")
+_stories_cache: Dict[int, List[Dict[str, Any]]] = {}
+
+def _get_stories(count: int) -> List[Dict[str, Any]]:
+    """
+    Encrypted stories, generated once per count
+    """
+
+    stories = _stories_cache.get(count)
+    if stories is None:
+        rng = Random(count)
+        stories = [generate_story(_ACCOUNT_KEY, 1024, rng = rng) for _ in range(count)]
+        _stories_cache[count] = stories
+
+    return stories
+
+def _has_tokenizer() -> bool:
+    try:
+        import transformers
+    except ImportError:
+        return False
+
+    return True
+
+# === Benchmarks === #
+@benchmark("sjcl_ccm.decrypt")
+def bench_sjcl_decrypt(args: Any) -> Dict[str, Any]:
+    content = _sjcl_envelope(generate_text(4096, Random(0)), 1000)
+    content["ct"] = Sjcl_ccm.encrypt(content, _ACCOUNT_KEY).decode()
+
+    return measure(lambda _: Sjcl_ccm.decrypt(content, _ACCOUNT_KEY), repeat = args.repeat, number = 200)
+
+@benchmark("sjcl_ccm.encrypt")
+def bench_sjcl_encrypt(args: Any) -> Dict[str, Any]:
+    content = _sjcl_envelope(generate_text(4096, Random(0)), 1000)
+
+    return measure(lambda _: Sjcl_ccm.encrypt(content, _ACCOUNT_KEY), repeat = args.repeat, number = 200)
+
+def _bench_stories(count: int):
+    @benchmark(f"format_and_decrypt_stories[{count}]")
+    def bench_decrypt_stories(args: Any) -> Optional[Dict[str, Any]]:
+        if count not in args.stories:
+            return None
+
+        stories = _get_stories(count)
+
+        return measure(lambda stories: format_and_decrypt_stories(_ACCOUNT_KEY, *stories),
+                       lambda: deepcopy(stories), repeat = args.repeat)
+
+    @benchmark(f"encrypt_and_format_stories[{count}]")
+    def bench_encrypt_stories(args: Any) -> Optional[Dict[str, Any]]:
+        if count not in args.stories:
+            return None
+
+        stories = deepcopy(_get_stories(count))
+        format_and_decrypt_stories(_ACCOUNT_KEY, *stories)
+
+        return measure(lambda stories: encrypt_and_format_stories(_ACCOUNT_KEY, *stories),
+                       lambda: deepcopy(stories), repeat = args.repeat)
+
+for _count in (1000, 10000):
+    _bench_stories(_count)
+
+@benchmark("tokenizer.encode.cold")
+def bench_tokenizer_cold(args: Any) -> Optional[Dict[str, Any]]:
+    if not _has_tokenizer():
+        return None
+
+    from holoai_api.Tokenizer import Tokenizer
+
+    text = generate_text(8192, Random(0))
+
+    # cold = the tokenizer is loaded again
+    return measure(lambda _: Tokenizer.encode(_TOKENIZER_MODEL, text), Tokenizer._tokenizer.clear, repeat = args.repeat)
+
+@benchmark("tokenizer.encode.warm")
+def bench_tokenizer_warm(args: Any) -> Optional[Dict[str, Any]]:
+    if not _has_tokenizer():
+        return None
+
+    from holoai_api.Tokenizer import Tokenizer
+
+    text = generate_text(8192, Random(0))
+    Tokenizer.encode(_TOKENIZER_MODEL, text)
+
+    return measure(lambda _: Tokenizer.encode(_TOKENIZER_MODEL, text), repeat = args.repeat, number = 20)
+
+@benchmark("story.build_context[large]")
+def bench_build_context(args: Any) -> Optional[Dict[str, Any]]:
+    if not _has_tokenizer():
+        return None
+
+    from holoai_api.story import HoloAI_Story
+    from holoai_api.GlobalSettings import GlobalSettings
+
+    story = deepcopy(_get_stories(1)[0])
+    format_and_decrypt_stories(_ACCOUNT_KEY, story)
+    story["content"]["ct"]["content"] = generate_text(1 << 20, Random(0))
+
+    proxy = HoloAI_Story(None, GlobalSettings()).load(story)
+    proxy.model = _TOKENIZER_MODEL
+
+    # the built contexts are memoized, measure the build
+    return measure(lambda _: proxy.build_context(), proxy._context_cache.clear, repeat = args.repeat, number = 5)
+
+@benchmark("low_level._parse_stream_data")
+def bench_parse_stream_data(args: Any) -> Dict[str, Any]:
+    from holoai_api._low_level import Low_Level
+
+    rng = Random(0)
+    content = { "completion_id": "0" * 32, "completions": [generate_text(800, rng) for _ in range(2)] }
+    stream_content = f"event:completion\nid:1\ndata:{dumps(content)}\n\n"
+
+    low_level = Low_Level(None)
+
+    return measure(lambda _: low_level._parse_stream_data(stream_content), repeat = args.repeat, number = 2000)
+
+def _get_gen_settings_fixture() -> Tuple[Preset, List[BanList], List[BiasGroup]]:
+    rng = Random(0)
+
+    preset = Preset("bench", _TOKENIZER_MODEL, { "temperature": 0.7, "tfs": 0.9 })
+    banlists = [BanList(*(generate_text(12, rng) for _ in range(20))) for _ in range(10)]
+    biases = [BiasGroup(0.1 * i).add(*(generate_text(12, rng) for _ in range(20))) for i in range(10)]
+
+    return preset, banlists, biases
+
+@benchmark("utils.build_gen_settings.cold")
+def bench_build_gen_settings_cold(args: Any) -> Optional[Dict[str, Any]]:
+    if not _has_tokenizer():
+        return None
+
+    preset, banlists, biases = _get_gen_settings_fixture()
+
+    # cold = the sequences are tokenized and the tables compiled again
+    def clear():
+        _gen_tables_cache.clear()
+        for group in banlists + biases:
+            group._tables = {}
+
+    return measure(lambda _: build_gen_settings(preset, banlists, biases), clear, repeat = args.repeat, number = 20)
+
+@benchmark("utils.build_gen_settings.warm")
+def bench_build_gen_settings_warm(args: Any) -> Optional[Dict[str, Any]]:
+    if not _has_tokenizer():
+        return None
+
+    preset, banlists, biases = _get_gen_settings_fixture()
+    build_gen_settings(preset, banlists, biases)
+
+    return measure(lambda _: build_gen_settings(preset, banlists, biases), repeat = args.repeat, number = 2000)
+
+@benchmark("srp.process_challenge")
+def bench_process_challenge(args: Any) -> Dict[str, Any]:
+    salt, verifier = srp.create_verifier_and_salt(b"password")
+
+    k = srp.btoi(srp.hash_padded(srp.itob(srp.N), b'\x02'))
+    challenge = (k * verifier + pow(2, srp.generate_private_value(), srp.N)) % srp.N
+
+    return measure(lambda _: srp.process_challenge(b"password", salt, challenge), repeat = args.repeat, number = 5)
+
+# === Comparison === #
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Tuple[str, float]]:
+    """
+    Compare the median times against a baseline
+
+    :return: Benchmarks slower than the baseline by more than the threshold, with their ratio
+    """
+
+    regressions = []
+
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if result is None or reference is None:
+            continue
+
+        ratio = result["median"] / reference["median"]
+        if 1 + threshold < ratio:
+            regressions.append((name, ratio))
+
+    return regressions
+
+def main():
+    parser = ArgumentParser(description = "Offline micro-benchmarks of the API")
+    parser.add_argument("--output", default = None, help = "Write the results to this file")
+    parser.add_argument("--baseline", default = None, help = "Results to compare against")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "Tolerated slowdown relative to the baseline")
+    parser.add_argument("--filter", default = None, help = "Only run the benchmarks containing this string")
+    parser.add_argument("--repeat", type = int, default = 5, help = "Number of measures per benchmark")
+    parser.add_argument("--stories", type = int, nargs = "+", default = [1000, 10000], choices = [1000, 10000],
+                        help = "Numbers of stories of the story benchmarks")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": time(),
+        "python": version,
+        "platform": platform(),
+        "results": {},
+    }
+
+    for name, func in _BENCHMARKS:
+        if args.filter is not None and args.filter not in name:
+            continue
+
+        result = func(args)
+        results["results"][name] = result
+
+        if result is None:
+            print(f"{name:<45} skipped")
+        else:
+            print(f"{name:<45} median {result['median'] * 1000:10.3f} ms   min {result['min'] * 1000:10.3f} ms")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(dumps(results, indent = 4))
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = loads(f.read())
+
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x the baseline")
+
+        if regressions:
+            exit(1)
+
+if __name__ == "__main__":
+    main()
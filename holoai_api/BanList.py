@@ -1,17 +1,31 @@
 from holoai_api.Preset import Model
 from holoai_api.Tokenizer import Tokenizer
 
-from typing import List, Union, Iterable, Union
+from itertools import count
+from types import MappingProxyType
+
+from typing import Any, Dict, List, Mapping, Tuple, Union, Union
+
+# versions of the banlists, unique across banlists so a version identifies the content of a banlist
+_versions = count(1)
 
 class BanList:
     _sequences: List[Union[List[int], str]]
 
+    # sequences by their tokens (first sequence of each), by model. Cleared when the sequences change
+    _tables: Dict[Model, Mapping[Tuple[int, ...], Union[List[int], str]]]
+
     enabled: bool
 
+    # changed on every change of the banlist
+    version: int
+
     def __init__(self, *sequences: Union[List[int], str], enabled: bool = True):
+        self.version = next(_versions)
         self.enabled = enabled
 
         self._sequences = []
+        self._tables = {}
         if sequences:
             self.add(*sequences)
 
@@ -24,8 +38,17 @@ class BanList:
 
             self._sequences.append(sequence)
 
+        self._tables = {}
+        self.version = next(_versions)
+
         return self
 
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+
+        if name == "enabled":
+            super().__setattr__("version", next(_versions))
+
     def __iadd__(self, o: Union[List[int], str]) -> "BanList":
         self.add(o)
 
@@ -34,8 +57,28 @@ class BanList:
     def __iter__(self):
         return self._sequences.__iter__()
 
-    def get_tokenized_banlist(self, model: Model) -> Iterable[List[int]]:
-        return (Tokenizer.tokenize_if_not(model, s) for s in self._sequences)
+    def get_tokenized_table(self, model: Model) -> Mapping[Tuple[int, ...], Union[List[int], str]]:
+        """
+        Get the sequences by their tokens, merging the sequences with the same tokens (the first one is kept).
+        The table is computed once per model, until the banlist changes
+
+        :param model: Model to tokenize for
+        """
+
+        table = self._tables.get(model)
+
+        if table is None:
+            sequences = {}
+            for s in self._sequences:
+                sequences.setdefault(tuple(Tokenizer.tokenize_if_not(model, s)), s)
+
+            table = MappingProxyType(sequences)
+            self._tables[model] = table
+
+        return table
+
+    def get_tokenized_banlist(self, model: Model) -> Tuple[Tuple[int, ...], ...]:
+        return tuple(self.get_tokenized_table(model))
 
     def __str__(self) -> str:
         return self._sequences.__str__()
\ No newline at end of file
@@ -1,17 +1,34 @@
 from holoai_api.Preset import Model
 from holoai_api.Tokenizer import Tokenizer
 
-from typing import Dict, Iterable, List, Union, Any
+from itertools import count
+from types import MappingProxyType
+
+from typing import Dict, Iterable, List, Mapping, Tuple, Union, Any
+
+# versions of the groups, unique across groups so a version identifies the content of a group
+_versions = count(1)
 
 class BiasGroup:
     _sequences: List[Union[List[int], str]]
 
+    # sequences by their tokens (first sequence of each), by model. Cleared when the sequences change
+    _tables: Dict[Model, Mapping[Tuple[int, ...], Union[List[int], str]]]
+
     strength: float
     rep_pen: bool
     enabled: bool
 
+    # changed on every change of the group
+    version: int
+
+    # fields changing the version when set
+    _VERSIONED_FIELDS = ("strength", "rep_pen", "enabled")
+
     def __init__(self, strength: float, rep_pen: float = 1.0, enabled: bool = True):
         self._sequences = []
+        self._tables = {}
+        self.version = next(_versions)
 
         self.strength = strength
         self.rep_pen = rep_pen
@@ -33,8 +50,17 @@ class BiasGroup:
 
             self._sequences.append(sequence)
 
+        self._tables = {}
+        self.version = next(_versions)
+
         return self
 
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+
+        if name in self._VERSIONED_FIELDS:
+            super().__setattr__("version", next(_versions))
+
     def __iadd__(self, o: List[int]) -> "BiasGroup":
         self.add(o)
 
@@ -46,11 +72,31 @@ class BiasGroup:
                   "enabled": self.enabled,
                   "value": s } for s in self._sequences)
 
+    def get_tokenized_table(self, model: Model) -> Mapping[Tuple[int, ...], Union[List[int], str]]:
+        """
+        Get the sequences by their tokens, merging the sequences with the same tokens (the first one is kept).
+        The table is computed once per model, until the sequences change
+
+        :param model: Model to tokenize for
+        """
+
+        table = self._tables.get(model)
+
+        if table is None:
+            sequences = {}
+            for s in self._sequences:
+                sequences.setdefault(tuple(Tokenizer.tokenize_if_not(model, s)), s)
+
+            table = MappingProxyType(sequences)
+            self._tables[model] = table
+
+        return table
+
     def get_tokenized_biases(self, model: Model) -> Iterable[Dict[str, any]]:
         return ({ "strength": self.strength,
                   "repPen": self.rep_pen,
                   "enabled": self.enabled,
-                  "value": Tokenizer.tokenize_if_not(model, s) } for s in self._sequences)
+                  "value": list(tokens) } for tokens in self.get_tokenized_table(model))
 
     def __str__(self) -> str:
         return "{ " \
@@ -0,0 +1,218 @@
+from sqlite3 import connect, Connection
+from hashlib import sha256
+
+from holoai_api.types import Model
+
+from typing import Dict, List, Any, Iterable, Optional, NoReturn
+
+# size of the chunks read from the documents (in characters)
+_READ_CHUNK_SIZE = 1 << 16
+
+class DatasetIndex:
+    """
+    Local content-addressed index of the uploaded prompt tune datasets.
+    Documents are identified by the hash of their normalized text (universal newlines), and datasets
+    by the set of their documents, so identical datasets can be reused instead of uploaded again
+    """
+
+    _connection: Connection
+
+    path: str
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the SQLite database (created if it doesn't exist)
+        """
+
+        self.path = path
+
+        self._connection = connect(path, check_same_thread = False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("CREATE TABLE IF NOT EXISTS documents ("
+                                           "hash TEXT PRIMARY KEY, "
+                                           "tokens_length INTEGER"
+                                       ");"
+                                       "CREATE TABLE IF NOT EXISTS datasets ("
+                                           "id TEXT PRIMARY KEY, "
+                                           "name TEXT NOT NULL, "
+                                           "key TEXT NOT NULL"
+                                       ");"
+                                       "CREATE INDEX IF NOT EXISTS datasets_key ON datasets (key);"
+                                       "CREATE TABLE IF NOT EXISTS dataset_documents ("
+                                           "dataset_id TEXT NOT NULL, "
+                                           "position INTEGER NOT NULL, "
+                                           "hash TEXT NOT NULL, "
+                                           "filename TEXT NOT NULL, "
+                                           "PRIMARY KEY (dataset_id, position)"
+                                       ");"
+                                       "CREATE TABLE IF NOT EXISTS token_estimates ("
+                                           "hash TEXT NOT NULL, "
+                                           "model TEXT NOT NULL, "
+                                           "tokens_length INTEGER NOT NULL, "
+                                           "PRIMARY KEY (hash, model)"
+                                       ");")
+        self._connection.commit()
+
+    def close(self) -> NoReturn:
+        self._connection.close()
+
+    def __enter__(self) -> "DatasetIndex":
+        return self
+
+    def __exit__(self, *args) -> NoReturn:
+        self.close()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """
+        Hash of the normalized text of a document
+        """
+
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+        return sha256(text.encode()).hexdigest()
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """
+        Hash of the normalized text of a document, read in chunks (text mode already normalizes the newlines)
+        """
+
+        h = sha256()
+
+        with open(path) as f:
+            while True:
+                chunk = f.read(_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                h.update(chunk.encode())
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _get_key(hashes: Iterable[str]) -> str:
+        # a dataset is identified by its set of documents
+        return sha256(",".join(sorted(set(hashes))).encode()).hexdigest()
+
+    def get_tokens_length(self, document_hash: str) -> Optional[int]:
+        """
+        Get the number of tokens of a document, as counted by the server
+
+        :return: Number of tokens or None if unknown
+        """
+
+        row = self._connection.execute("SELECT tokens_length FROM documents WHERE hash = ?", (document_hash,)).fetchone()
+
+        return None if row is None else row[0]
+
+    def get_token_estimate(self, document_hash: str, model: Model) -> Optional[int]:
+        """
+        Get the number of tokens of a document, as counted locally
+
+        :return: Number of tokens or None if the document wasn't counted for this model
+        """
+
+        row = self._connection.execute("SELECT tokens_length FROM token_estimates WHERE hash = ? AND model = ?",
+                                       (document_hash, model.value)).fetchone()
+
+        return None if row is None else row[0]
+
+    def set_token_estimates(self, estimates: Dict[str, int], model: Model) -> NoReturn:
+        """
+        Remember the number of tokens of documents, as counted locally
+
+        :param estimates: Number of tokens, by document hash
+        :param model: Model the documents were tokenized for
+        """
+
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO token_estimates (hash, model, tokens_length) VALUES (?, ?, ?)",
+                                         ((document_hash, model.value, tokens) for document_hash, tokens in estimates.items()))
+
+    def find_dataset(self, hashes: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """
+        Find a dataset with exactly the same documents, and known token lengths
+
+        :param hashes: Hashes of the documents
+
+        :return: Dataset (as returned by the server, with the token lengths) or None if no dataset matches,
+                 or if the token length of one of its documents is unknown
+        """
+
+        row = self._connection.execute("SELECT id, name FROM datasets WHERE key = ?", (self._get_key(hashes),)).fetchone()
+        if row is None:
+            return None
+
+        dataset_id, name = row
+        documents = self._connection.execute("SELECT dataset_documents.filename, documents.tokens_length "
+                                             "FROM dataset_documents JOIN documents ON dataset_documents.hash = documents.hash "
+                                             "WHERE dataset_id = ? ORDER BY position", (dataset_id,)).fetchall()
+
+        # the callers need the lengths (e.g. to compute the number of steps), so the dataset isn't reused without them
+        if any(tokens_length is None for _, tokens_length in documents):
+            return None
+
+        return {
+            "id": dataset_id,
+            "name": name,
+            "documents": [{ "filename": filename, "tokensLength": tokens_length } for filename, tokens_length in documents],
+        }
+
+    def add_dataset(self, dataset: Dict[str, Any], hashes: List[str], name: str = "", filenames: Optional[List[str]] = None) -> NoReturn:
+        """
+        Index a created dataset
+
+        :param dataset: Dataset, as returned by the server
+        :param hashes: Hashes of the documents of the dataset, in the same order
+        :param name: Name of the dataset, if the server doesn't return it
+        :param filenames: Filenames of the documents, if the server doesn't return them
+        """
+
+        documents = dataset.get("documents", [])
+
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO datasets (id, name, key) VALUES (?, ?, ?)",
+                                     (dataset["id"], dataset.get("name", name), self._get_key(hashes)))
+            self._connection.execute("DELETE FROM dataset_documents WHERE dataset_id = ?", (dataset["id"],))
+
+            for i, document_hash in enumerate(hashes):
+                document = documents[i] if i < len(documents) else {}
+                filename = document.get("filename", filenames[i] if filenames is not None else "")
+
+                self._connection.execute("INSERT INTO dataset_documents (dataset_id, position, hash, filename) VALUES (?, ?, ?, ?)",
+                                         (dataset["id"], i, document_hash, filename))
+
+                self._connection.execute("INSERT INTO documents (hash, tokens_length) VALUES (?, ?) "
+                                         "ON CONFLICT (hash) DO UPDATE SET tokens_length = COALESCE(excluded.tokens_length, tokens_length)",
+                                         (document_hash, document.get("tokensLength")))
+
+    def remove_dataset(self, dataset_id: str) -> NoReturn:
+        with self._connection:
+            self._connection.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+            self._connection.execute("DELETE FROM dataset_documents WHERE dataset_id = ?", (dataset_id,))
+
+    async def refresh(self, api: "HoloAI_API") -> NoReturn:
+        """
+        Sync the index with the datasets of the account: deleted datasets are forgotten,
+        and the token lengths are updated
+
+        :param api: API used to read the datasets
+        """
+
+        content = await api.low_level.read_prompt_tune_datasets()
+        datasets = content if type(content) is list else content.get("data", [])
+        datasets = { dataset["id"]: dataset for dataset in datasets }
+
+        indexed = self._connection.execute("SELECT id, name FROM datasets").fetchall()
+
+        for dataset_id, name in indexed:
+            dataset = datasets.get(dataset_id)
+
+            if dataset is None:
+                self.remove_dataset(dataset_id)
+            else:
+                rows = self._connection.execute("SELECT hash, filename FROM dataset_documents WHERE dataset_id = ? "
+                                                "ORDER BY position", (dataset_id,)).fetchall()
+
+                self.add_dataset(dataset, [row[0] for row in rows], name, [row[1] for row in rows])
@@ -0,0 +1,699 @@
+# Local stand-in for the HoloAI server, for offline tests and benchmarks
+# Implements the endpoints used by the API, with configurable latency, error injection and throttling
+
+from aiohttp import web
+from base64 import b64encode
+from secrets import token_bytes, token_hex
+from random import Random
+from asyncio import sleep
+from time import time, monotonic
+from json import dumps
+from argparse import ArgumentParser
+
+from Crypto.Protocol.KDF import PBKDF2
+from Crypto.Hash import SHA1
+
+from holoai_api import srp
+from holoai_api.utils import encrypt_and_format_stories
+
+from typing import Dict, List, Any, Optional, NoReturn
+
+_WORDS = ("the", "a", "dragon", "castle", "knight", "sword", "night", "storm", "whispered", "ran", "forest", "old",
+          "light", "shadow", "and", "of", "to", "she", "he", "they", "river", "stone", "quiet", "gate", "fire")
+
+def get_account_key(password: str, key_salt: str) -> bytes:
+    """
+    Account key of an account, as derived by login
+    """
+
+    return PBKDF2(password.encode(), key_salt.encode(), 16, 1, hmac_hash_module = SHA1).hex().encode()
+
+def generate_text(size: int, rng: Optional[Random] = None) -> str:
+    """
+    Generate a text of roughly `size` characters
+    """
+
+    rng = Random() if rng is None else rng
+
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+
+    return " ".join(words)[:size]
+
+def _sjcl_envelope(ct: Any, iterations: int) -> Dict[str, Any]:
+    return {
+        "iv": b64encode(token_bytes(16)).decode(),
+        "v": 1,
+        "iter": iterations,
+        "ks": 128,
+        "ts": 64,
+        "mode": "ccm",
+        "adata": "",
+        "cipher": "aes",
+        "salt": b64encode(token_bytes(8)).decode(),
+        "ct": ct,
+        "decrypted": True,
+    }
+
+def generate_story(account_key: bytes, content_size: int = 1024, story_id: Optional[str] = None,
+                   rng: Optional[Random] = None, iterations: int = 1000) -> Dict[str, Any]:
+    """
+    Generate an encrypted story, as returned by the server
+
+    :param account_key: Account key the story is encrypted with
+    :param content_size: Size of the text of the story (in characters)
+    :param story_id: Id of the story, random if None
+    :param rng: Random generator of the text
+    :param iterations: PBKDF2 iterations of the encryption
+    """
+
+    rng = Random() if rng is None else rng
+    now = int(time() * 1000)
+
+    text = generate_text(content_size, rng)
+
+    story = {
+        "id": token_hex(16) if story_id is None else story_id,
+        "createdAt": now,
+        "lastUpdatedAt": now,
+        "title": _sjcl_envelope(generate_text(24, rng).title(), iterations),
+        "preview": _sjcl_envelope(text[:200], iterations),
+        "content": _sjcl_envelope({
+            "content": text,
+            "depressedWords": { "depressedWords": [] },
+            "favoredPhrases": { "favoredPhrases": [] },
+            "worldInfo": [],
+        }, iterations),
+        "description": None,
+        "genSettings": {
+            "id": token_hex(8),
+            "noCompletions": 2,
+            "numCharactersRequested": 200,
+            "repetitionPenalty": 1.1,
+            "repetitionPenaltySlope": 4.5,
+            "tfs": 0.8,
+            "temperature": 1.1,
+            "generateUntilSentence": False,
+            "badWords": [],
+            "logitBias": [],
+        },
+    }
+
+    encrypt_and_format_stories(account_key, story)
+
+    return story
+
+class FakeServer:
+    """
+    aiohttp server implementing the endpoints used by the API (SRP login, "next" pages, stories, generation
+    with SSE streaming, prompt tunes and datasets), backed by in-memory accounts
+    """
+
+    _runner: Optional[web.AppRunner]
+
+    # email -> account
+    accounts: Dict[str, Dict[str, Any]]
+    # session token -> email
+    sessions: Dict[str, str]
+    # email -> B -> b of the pending SRP challenges (several logins of an account can be in flight)
+    _challenges: Dict[str, Dict[int, int]]
+
+    tunes: Dict[str, Dict[str, Any]]
+    datasets: Dict[str, Dict[str, Any]]
+
+    build_id: str
+
+    latency: float
+    jitter: float
+    error_rate: float
+    error_status: int
+    max_requests_per_second: Optional[float]
+    tune_queue_time: float
+    tune_step_time: float
+
+    # path -> [(status, remaining count)], errors returned before the next requests on a path
+    _injected_errors: Dict[str, List[List[int]]]
+    _tokens: float
+    _tokens_at: float
+
+    app: web.Application
+    address: Optional[str]
+    request_count: int
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 500,
+                 max_requests_per_second: Optional[float] = None, tune_queue_time: float = 1.0,
+                 tune_step_time: float = 0.1, seed: Optional[int] = None):
+        """
+        :param latency: Delay added to every response (in seconds)
+        :param jitter: Maximum random delay added to the latency (in seconds)
+        :param error_rate: Probability of a request to fail with error_status
+        :param error_status: Status of the random errors
+        :param max_requests_per_second: Rate above which requests are rejected with 429, None for no limit
+        :param tune_queue_time: Time a prompt tune stays queued (in seconds)
+        :param tune_step_time: Time of a training step of a prompt tune (in seconds)
+        :param seed: Seed of the random delays, errors and generations
+        """
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_requests_per_second = max_requests_per_second
+        self.tune_queue_time = tune_queue_time
+        self.tune_step_time = tune_step_time
+
+        self._rng = Random(seed)
+        self._runner = None
+        self._injected_errors = {}
+        self._tokens = float("inf")     # capped to the burst on the first request
+        self._tokens_at = monotonic()
+
+        self.accounts = {}
+        self.sessions = {}
+        self._challenges = {}
+        self.tunes = {}
+        self.datasets = {}
+
+        self.build_id = token_hex(8)
+        self.address = None
+        self.request_count = 0
+
+        self.app = web.Application(middlewares = [self._middleware], client_max_size = 1 << 30)
+        self.app.add_routes([
+            web.get("/", self._index),
+            web.get("/404", self._not_found),
+            web.post("/api/register_credentials", self._register_credentials),
+            web.post("/api/srp_init", self._srp_init),
+            web.post("/api/srp_verify", self._srp_verify),
+            web.get("/_next/data/{build_id}/home.json", self._home),
+            web.get("/_next/data/{build_id}/write/{story_id}.json", self._story),
+            web.get("/_next/data/{build_id}/tuner.json", self._tuner),
+            web.post("/api/update_story", self._update_story),
+            web.post("/api/upsert_generation_settings", self._upsert_generation_settings),
+            web.post("/api/read_snapshots", self._read_snapshots),
+            web.post("/api/draw_completions", self._draw_completions),
+            web.post("/api/select_completion", self._select_completion),
+            web.post("/api/search_prompt_tunes", self._search_prompt_tunes),
+            web.post("/api/read_prompt_tunes", self._read_prompt_tunes),
+            web.post("/api/read_prompt_tune", self._read_prompt_tune),
+            web.post("/api/create_prompt_tunes", self._create_prompt_tune),
+            web.post("/api/create_prompt_tune_dataset", self._create_prompt_tune_dataset),
+            web.post("/api/read_prompt_tune_datasets", self._read_prompt_tune_datasets),
+            web.post("/api/delete_prompt_tune_dataset", self._delete_prompt_tune_dataset),
+        ])
+
+    # === Lifecycle === #
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start the server
+
+        :param port: Port to listen on, 0 for a free port
+
+        :return: Base address of the server
+        """
+
+        self._runner = web.AppRunner(self.app, access_log = None)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.address = f"http://{host}:{port}"
+
+        return self.address
+
+    async def stop(self) -> NoReturn:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeServer":
+        await self.start()
+
+        return self
+
+    async def __aexit__(self, *args) -> NoReturn:
+        await self.stop()
+
+    # === Accounts === #
+    def add_account(self, email: str, password: str, stories: int = 0, story_size: int = 1024) -> Dict[str, Any]:
+        """
+        Create an account, with generated stories
+
+        :param email: Email of the account
+        :param password: Password of the account
+        :param stories: Number of stories to generate
+        :param story_size: Size of the text of each story (in characters)
+
+        :return: Account ({ "email", "salt", "verifier", "key_salt", "account_key", "stories" })
+        """
+
+        s, v = srp.create_verifier_and_salt(password.encode())
+        key_salt = token_hex(16)
+        account_key = get_account_key(password, key_salt)
+
+        account = {
+            "email": email,
+            "salt": s,
+            "verifier": v,
+            "key_salt": key_salt,
+            "account_key": account_key,
+            "stories": {},
+        }
+
+        for _ in range(stories):
+            story = generate_story(account_key, story_size, rng = self._rng)
+            account["stories"][story["id"]] = story
+
+        self.accounts[email] = account
+
+        return account
+
+    def inject_error(self, path: str, status: int = 500, count: int = 1) -> NoReturn:
+        """
+        Make the next requests on a path fail
+
+        :param path: Path of the requests (e.g. /api/draw_completions)
+        :param status: Status of the errors
+        :param count: Number of requests to fail
+        """
+
+        self._injected_errors.setdefault(path, []).append([status, count])
+
+    # === Helpers === #
+    @staticmethod
+    def _error(status: int, message: str) -> web.Response:
+        return web.json_response({ "statusCode": status, "error": message }, status = status)
+
+    def _get_account(self, request: web.Request) -> Optional[Dict[str, Any]]:
+        email = self.sessions.get(request.cookies.get("session"))
+
+        return None if email is None else self.accounts.get(email)
+
+    def _check_build_id(self, request: web.Request) -> bool:
+        return request.match_info["build_id"] == self.build_id
+
+    def _take_injected_error(self, path: str) -> Optional[int]:
+        errors = self._injected_errors.get(path)
+        if not errors:
+            return None
+
+        status = errors[0][0]
+        errors[0][1] -= 1
+        if errors[0][1] <= 0:
+            errors.pop(0)
+
+        return status
+
+    def _is_throttled(self) -> bool:
+        if self.max_requests_per_second is None:
+            return False
+
+        # token bucket, with a burst of one second of requests
+        now = monotonic()
+        self._tokens = min(self.max_requests_per_second, self._tokens + (now - self._tokens_at) * self.max_requests_per_second)
+        self._tokens_at = now
+
+        if self._tokens < 1:
+            return True
+
+        self._tokens -= 1
+
+        return False
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.request_count += 1
+
+        if self._is_throttled():
+            rsp = self._error(429, "Too many requests")
+            rsp.headers["Retry-After"] = "1"
+
+            return rsp
+
+        delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            await sleep(delay)
+
+        status = self._take_injected_error(request.path)
+        if status is None and self.error_rate and self._rng.random() < self.error_rate:
+            status = self.error_status
+
+        if status is not None:
+            return self._error(status, "Injected error")
+
+        return await handler(request)
+
+    # === Routes === #
+    async def _index(self, request: web.Request) -> web.Response:
+        return web.Response(text = "<html><body>HoloAI</body></html>", content_type = "text/html")
+
+    async def _not_found(self, request: web.Request) -> web.Response:
+        data = dumps({ "props": { "pageProps": { "statusCode": 404 } }, "page": "/404", "buildId": self.build_id }, separators = (',', ':'))
+        html = f'<html><body><script id="__NEXT_DATA__" type="application/json">{data}</script></body></html>'
+
+        return web.Response(text = html, content_type = "text/html", status = 404)
+
+    async def _register_credentials(self, request: web.Request) -> web.Response:
+        data = await request.json()
+
+        email = data["emailAddress"]
+        if email in self.accounts:
+            return self._error(409, "Account already exists")
+
+        key_salt = token_hex(16)
+        self.accounts[email] = {
+            "email": email,
+            "salt": int(data["salt"]),
+            "verifier": int(data["verifier"]),
+            "key_salt": key_salt,
+            "account_key": None,
+            "stories": {},
+        }
+
+        return web.json_response({ "encryptionKeySalt": key_salt }, status = 201)
+
+    async def _srp_init(self, request: web.Request) -> web.Response:
+        data = await request.json()
+
+        account = self.accounts.get(data.get("emailAddress"))
+        if account is None:
+            return self._error(401, "Unknown account")
+
+        # B = k * v + g^b
+        k = srp.btoi(srp.hash_padded(srp.itob(srp.N), b'\x02'))
+        b = srp.generate_private_value()
+        B = (k * account["verifier"] + pow(2, b, srp.N)) % srp.N
+
+        self._challenges.setdefault(account["email"], {})[B] = b
+
+        return web.json_response({ "srp": { "salt": str(account["salt"]), "challenge": str(B) } })
+
+    async def _srp_verify(self, request: web.Request) -> web.Response:
+        data = await request.json()
+
+        email = data.get("emailAddress")
+        account = self.accounts.get(email)
+        challenges = self._challenges.get(email)
+        if account is None or not challenges:
+            return self._error(401, "No pending challenge")
+
+        A = int(data["A"])
+
+        # the request doesn't say which challenge it answers, find the one matching the evidence
+        for B, b in challenges.items():
+            u = srp.btoi(srp.hash_padded(srp.itob(A), srp.itob(B)))
+
+            # S = (A * v^u)^b
+            S = pow(A * pow(account["verifier"], u, srp.N), b, srp.N)
+            if str(srp.compute_client_evidence(A, B, S)) == data["M1"]:
+                del challenges[B]
+                break
+        else:
+            return self._error(401, "Invalid credentials")
+
+        session = token_hex(32)
+        self.sessions[session] = email
+
+        rsp = web.json_response({ "encryptionKeySalt": account["key_salt"] })
+        rsp.set_cookie("session", session, httponly = True)
+
+        return rsp
+
+    async def _home(self, request: web.Request) -> web.Response:
+        if not self._check_build_id(request):
+            return self._error(404, "Not found")
+
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        user = { "email": account["email"], "stories": list(account["stories"].values()) }
+
+        return web.json_response({ "pageProps": { "user": user }, "__N_SSP": True })
+
+    async def _story(self, request: web.Request) -> web.Response:
+        if not self._check_build_id(request):
+            return self._error(404, "Not found")
+
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        story = account["stories"].get(request.match_info["story_id"])
+        if story is None:
+            return self._error(404, "Story not found")
+
+        return web.json_response({ "pageProps": { "story": story }, "__N_SSP": True })
+
+    async def _tuner(self, request: web.Request) -> web.Response:
+        if not self._check_build_id(request):
+            return self._error(404, "Not found")
+
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        tunes = [self._get_tune(tune) for tune in self.tunes.values() if tune["owner"] == account["email"]]
+
+        return web.json_response({ "pageProps": { "tunes": tunes }, "__N_SSP": True })
+
+    async def _update_story(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        data = await request.json()
+        story_id = data["story_id"]
+
+        story = account["stories"].setdefault(story_id, { "id": story_id, "createdAt": int(time() * 1000) })
+        story.update(data["content_change"])
+        story["id"] = story_id
+        story["lastUpdatedAt"] = int(time() * 1000)
+
+        return web.json_response(story)
+
+    async def _upsert_generation_settings(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        data = (await request.json())["set_story"]
+
+        story = account["stories"].get(data["id"])
+        if story is None:
+            return self._error(404, "Story not found")
+
+        story["genSettings"] = dict(data["settings"], logitBias = dumps([]))
+
+        return web.json_response({ "id": data["id"] })
+
+    async def _read_snapshots(self, request: web.Request) -> web.Response:
+        if self._get_account(request) is None:
+            return self._error(401, "Unauthorized")
+
+        return web.json_response({ "snapshots": [] })
+
+    async def _draw_completions(self, request: web.Request) -> web.StreamResponse:
+        if self._get_account(request) is None:
+            return self._error(401, "Unauthorized")
+
+        data = await request.json()
+        if not isinstance(data.get("promptTokens"), list) or not isinstance(data.get("prefixTokens"), list):
+            return self._error(400, "Expected prefixTokens and promptTokens")
+
+        completions = [generate_text(200, self._rng) for _ in range(2)]
+        content = { "completion_id": token_hex(16), "completions": completions }
+
+        if "text/event-stream" not in request.headers.get("Accept", ""):
+            return web.json_response(content)
+
+        # stream the completions by pieces, the last event holding the full content
+        rsp = web.StreamResponse(headers = { "Content-Type": "text/event-stream", "Cache-Control": "no-cache" })
+        await rsp.prepare(request)
+
+        for end in range(50, 200, 50):
+            partial = { "completion_id": content["completion_id"], "completions": [c[:end] for c in completions] }
+            await rsp.write(f"event:partial\ndata:{dumps(partial)}\n\n".encode())
+            await sleep(0)
+
+        await rsp.write(f"event:completion\ndata:{dumps(content)}\n\n".encode())
+        await rsp.write_eof()
+
+        return rsp
+
+    async def _select_completion(self, request: web.Request) -> web.Response:
+        if self._get_account(request) is None:
+            return self._error(401, "Unauthorized")
+
+        data = await request.json()
+
+        return web.json_response({ "completion_id": data["completion_id"], "completion_no": data["completion_no"] })
+
+    def _get_tune(self, tune: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Tune as returned by the server, with its progress computed from its creation time
+        """
+
+        steps = tune["numTrainSteps"]
+        elapsed = time() - tune["_created"] - self.tune_queue_time
+
+        if elapsed < 0:
+            run_status = { "currentStepNo": 0 }
+        elif self.tune_step_time <= 0 or steps <= elapsed / self.tune_step_time:
+            run_status = None
+        else:
+            run_status = { "currentStepNo": max(1, int(elapsed / self.tune_step_time)) }
+
+        return dict(((k, v) for k, v in tune.items() if not k.startswith("_") and k != "owner"), runStatus = run_status)
+
+    def _search(self, data: Dict[str, Any], tunes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        tags = (data.get("filter") or {}).get("tags")
+        if tags:
+            tunes = [tune for tune in tunes if set(tags) <= set(tune["tags"])]
+
+        model = (data.get("filter") or {}).get("modelId")
+        if model:
+            tunes = [tune for tune in tunes if tune["modelId"] == model]
+
+        return sorted(tunes, key = lambda tune: tune["createdAt"], reverse = True)
+
+    async def _search_prompt_tunes(self, request: web.Request) -> web.Response:
+        data = await request.json()
+
+        tunes = self._search(data, [tune for tune in self.tunes.values() if tune["public"]])
+        page = tunes[data.get("from", 0):data.get("to", 10)]
+
+        return web.json_response({ "data": [self._get_tune(tune) for tune in page], "total": len(tunes) })
+
+    async def _read_prompt_tunes(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        tunes = [self._get_tune(tune) for tune in self.tunes.values() if tune["owner"] == account["email"]]
+
+        return web.json_response({ "data": tunes })
+
+    async def _read_prompt_tune(self, request: web.Request) -> web.Response:
+        data = await request.json()
+
+        tune = self.tunes.get(data.get("id"))
+        if tune is None:
+            return self._error(404, "Prompt tune not found")
+
+        return web.json_response({ "data": self._get_tune(tune) })
+
+    async def _create_prompt_tune(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        data = await request.json()
+
+        dataset = self.datasets.get(data["datasetId"])
+        if dataset is None or dataset["owner"] != account["email"]:
+            return self._error(404, "Dataset not found")
+
+        now = time()
+        tune = {
+            "id": token_hex(16),
+            "title": data["title"],
+            "description": data["description"],
+            "modelId": data["modelId"],
+            "tags": data["tags"],
+            "public": data["public"],
+            "listed": data["listed"],
+            "nsfw": data["nsfw"],
+            "numTrainSteps": data["numTrainSteps"],
+            "checkpoints": data["checkpoints"],
+            "datasetId": data["datasetId"],
+            "createdAt": int(now * 1000),
+            "owner": account["email"],
+            "_created": now,
+        }
+        self.tunes[tune["id"]] = tune
+
+        if data["destroyDataAfterTune"]:
+            del self.datasets[data["datasetId"]]
+
+        return web.json_response({ "data": self._get_tune(tune) })
+
+    async def _create_prompt_tune_dataset(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        # gzip bodies are decompressed by aiohttp
+        data = await request.json()
+
+        dataset = {
+            "id": token_hex(16),
+            "name": data["name"],
+            "documents": [{ "filename": document["filename"], "tokensLength": len(document["text"].split()) }
+                          for document in data["documents"]],
+            "owner": account["email"],
+        }
+        self.datasets[dataset["id"]] = dataset
+
+        return web.json_response({ k: v for k, v in dataset.items() if k != "owner" })
+
+    async def _read_prompt_tune_datasets(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        datasets = [{ k: v for k, v in dataset.items() if k != "owner" }
+                    for dataset in self.datasets.values() if dataset["owner"] == account["email"]]
+
+        return web.json_response({ "data": datasets })
+
+    async def _delete_prompt_tune_dataset(self, request: web.Request) -> web.Response:
+        account = self._get_account(request)
+        if account is None:
+            return self._error(401, "Unauthorized")
+
+        data = await request.json()
+
+        dataset = self.datasets.get(data["id"])
+        if dataset is None or dataset["owner"] != account["email"]:
+            return self._error(404, "Dataset not found")
+
+        del self.datasets[data["id"]]
+
+        return web.json_response({ "id": data["id"] })
+
+if __name__ == "__main__":
+    from asyncio import run, Event
+
+    parser = ArgumentParser(description = "Local fake HoloAI server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8080)
+    parser.add_argument("--email", default = "user@example.com")
+    parser.add_argument("--password", default = "password")
+    parser.add_argument("--stories", type = int, default = 10, help = "Number of stories of the account")
+    parser.add_argument("--story-size", type = int, default = 1024, help = "Size of the stories (in characters)")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "Delay of the responses (in seconds)")
+    parser.add_argument("--jitter", type = float, default = 0.0, help = "Maximum random delay added (in seconds)")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "Probability of a request to fail")
+    parser.add_argument("--max-rps", type = float, default = None, help = "Requests per second above which requests get 429")
+    args = parser.parse_args()
+
+    async def main():
+        server = FakeServer(args.latency, args.jitter, args.error_rate, max_requests_per_second = args.max_rps)
+        server.add_account(args.email, args.password, args.stories, args.story_size)
+
+        address = await server.start(args.host, args.port)
+        print(f"Fake server listening on {address} (account {args.email} / {args.password})")
+
+        try:
+            await Event().wait()
+        finally:
+            await server.stop()
+
+    run(main())
@@ -1,13 +1,14 @@
 from holoai_api.HoloAIError import HoloAIError
 from holoai_api._low_level import Low_Level
 from holoai_api._high_level import High_Level
+from holoai_api.Metrics import Metrics
 
 from http.cookies import SimpleCookie
 from aiohttp import ClientSession, ClientTimeout, ClientTimeout, CookieJar
 from multidict import CIMultiDict
 
 from logging import Logger
-from typing import NoReturn, Optional
+from typing import NoReturn, Optional, Tuple
 
 from os.path import dirname, abspath
 
@@ -22,26 +23,35 @@ class HoloAI_API:
     _lib_root: str = dirname(abspath(__file__))
 
     _timeout: ClientTimeout
+    # address of the server, _BASE_ADDRESS by default
+    base_address: str
     headers: CIMultiDict
     cookies: SimpleCookie
 
+    ### Metrics of the requests, None if disabled
+    metrics: Optional[Metrics]
+
     ### Low Level Public API
     low_level: Low_Level
     ### High Level Public API
     high_level: High_Level
 
     # === Operators === #
-    def __init__(self, session: Optional[ClientSession] = None, logger: Optional[Logger] = None):
+    def __init__(self, session: Optional[ClientSession] = None, logger: Optional[Logger] = None,
+                       base_address: Optional[str] = None):
         # variable passing
         assert session is None or type(session) is ClientSession, f"Expected None or type 'ClientSession' for session, but got type '{type(session)}'"
+        assert base_address is None or type(base_address) is str, f"Expected None or type 'str' for base_address, but got type '{type(base_address)}'"
 
         # no session = synchronous
         self._logger = Logger("NovelAI_API") if logger is None else logger
         self._session = session
+        self.base_address = self._BASE_ADDRESS if base_address is None else base_address.rstrip("/")
 
         self._timeout = ClientTimeout(300)
         self.headers = CIMultiDict()
         self.cookies = SimpleCookie()
+        self.metrics = None
 
         # API parts
         self.low_level = Low_Level(self)
@@ -56,6 +66,33 @@ class HoloAI_API:
 
         self._session = session
 
+    def _create_session(self) -> ClientSession:
+        trace_configs = None if self.metrics is None else [self.metrics.trace_config]
+
+        return ClientSession(trace_configs = trace_configs)
+
+    def enable_metrics(self, buckets: Optional[Tuple[float, ...]] = None) -> Metrics:
+        """
+        Start collecting metrics of the requests. The network phases of an attached session are only
+        measured if it was created with trace_configs = [api.metrics.trace_config]
+
+        :param buckets: Bounds of the latency histogram buckets (in seconds)
+
+        :return: Metrics collected
+        """
+
+        if self.metrics is None:
+            self.metrics = Metrics(buckets)
+
+        return self.metrics
+
+    def disable_metrics(self) -> NoReturn:
+        """
+        Stop collecting metrics of the requests
+        """
+
+        self.metrics = None
+
     def detach_session(self) -> NoReturn:
         """
         Detach the current ClientSession, making the requests synchronous
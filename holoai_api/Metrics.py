@@ -0,0 +1,251 @@
+from re import compile
+from time import perf_counter
+from types import SimpleNamespace
+
+from typing import Any, Dict, List, Optional, Tuple
+
+class _NullTimer:
+    """
+    Timer doing nothing, used when the metrics are disabled
+    """
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ("_metrics", "_phase", "_endpoint", "_start")
+
+    def __init__(self, metrics: "Metrics", phase: str, endpoint: str):
+        self._metrics = metrics
+        self._phase = phase
+        self._endpoint = endpoint
+
+    def __enter__(self) -> "_Timer":
+        self._start = perf_counter()
+
+        return self
+
+    def __exit__(self, *args):
+        self._metrics.observe(self._phase, self._endpoint, perf_counter() - self._start)
+
+class Histogram:
+    """
+    Cumulative histogram of durations (in seconds)
+    """
+
+    _DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    buckets: Tuple[float, ...]
+    counts: List[int]
+    count: int
+    sum: float
+
+    def __init__(self, buckets: Optional[Tuple[float, ...]] = None):
+        self.buckets = self._DEFAULT_BUCKETS if buckets is None else tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": { str(bound): count for bound, count in zip(self.buckets, cumulative) },
+        }
+
+class Metrics:
+    """
+    Registry of the metrics of the requests: latency histograms per phase and endpoint, bytes sent and received,
+    and retries. The network phases (connection pool wait, DNS, connection, time to headers) are fed by an aiohttp
+    TraceConfig, that must be given to the ClientSession (done automatically for the sessions created by the API)
+    """
+
+    # ids in the endpoints, replaced to keep a bounded number of endpoints
+    _rgx_next_id = compile("^/_next/data/[^/]+")
+    _rgx_story_id = compile("/write/[^/]+\\.json$")
+
+    _histograms: Dict[Tuple[str, str], Histogram]
+    _counters: Dict[Tuple[str, str], int]
+
+    buckets: Optional[Tuple[float, ...]]
+
+    def __init__(self, buckets: Optional[Tuple[float, ...]] = None):
+        """
+        :param buckets: Bounds of the histogram buckets (in seconds)
+        """
+
+        self.buckets = buckets
+
+        self._histograms = {}
+        self._counters = {}
+        self._trace_config = None
+
+    @classmethod
+    def get_endpoint_label(cls, endpoint: str) -> str:
+        endpoint = cls._rgx_next_id.sub("/_next/data", endpoint)
+
+        return cls._rgx_story_id.sub("/write/{id}.json", endpoint)
+
+    def observe(self, phase: str, endpoint: str, seconds: float):
+        key = (phase, endpoint)
+
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = Histogram(self.buckets)
+            self._histograms[key] = histogram
+
+        histogram.observe(seconds)
+
+    def count(self, name: str, endpoint: str, value: int = 1):
+        key = (name, endpoint)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def timer(self, phase: str, endpoint: str) -> _Timer:
+        """
+        Context manager observing the duration of its block
+        """
+
+        return _Timer(self, phase, endpoint)
+
+    def clear(self):
+        self._histograms.clear()
+        self._counters.clear()
+
+    # === aiohttp tracing === #
+    @property
+    def trace_config(self) -> "TraceConfig":
+        """
+        TraceConfig feeding the network phases, to give to the ClientSession (trace_configs = [metrics.trace_config])
+        """
+
+        if self._trace_config is None:
+            from aiohttp import TraceConfig
+
+            trace_config = TraceConfig(trace_config_ctx_factory = self._make_trace_context)
+
+            trace_config.on_request_start.append(self._on_request_start)
+            trace_config.on_request_end.append(self._on_request_end)
+            trace_config.on_request_chunk_sent.append(self._on_request_chunk_sent)
+            trace_config.on_response_chunk_received.append(self._on_response_chunk_received)
+            trace_config.on_connection_queued_start.append(self._on_phase_start("pool_wait"))
+            trace_config.on_connection_queued_end.append(self._on_phase_end("pool_wait"))
+            trace_config.on_connection_create_start.append(self._on_phase_start("connect"))
+            trace_config.on_connection_create_end.append(self._on_phase_end("connect"))
+            trace_config.on_dns_resolvehost_start.append(self._on_phase_start("dns"))
+            trace_config.on_dns_resolvehost_end.append(self._on_phase_end("dns"))
+
+            self._trace_config = trace_config
+
+        return self._trace_config
+
+    @staticmethod
+    def _make_trace_context(trace_request_ctx: Optional[Dict[str, Any]] = None) -> SimpleNamespace:
+        endpoint = trace_request_ctx.get("endpoint") if trace_request_ctx else None
+
+        return SimpleNamespace(endpoint = endpoint, starts = {})
+
+    def _get_endpoint(self, ctx: SimpleNamespace, url: Any) -> str:
+        if ctx.endpoint is None:
+            ctx.endpoint = self.get_endpoint_label(url.path)
+
+        return ctx.endpoint
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.url = params.url
+        ctx.starts["headers"] = perf_counter()
+
+    async def _on_request_end(self, session, ctx, params):
+        self.observe("headers", self._get_endpoint(ctx, params.url), perf_counter() - ctx.starts.pop("headers"))
+
+    async def _on_request_chunk_sent(self, session, ctx, params):
+        self.count("bytes_out", self._get_endpoint(ctx, params.url), len(params.chunk))
+
+    async def _on_response_chunk_received(self, session, ctx, params):
+        self.count("bytes_in", self._get_endpoint(ctx, params.url), len(params.chunk))
+
+    def _on_phase_start(self, phase: str):
+        async def on_start(session, ctx, params):
+            ctx.starts[phase] = perf_counter()
+
+        return on_start
+
+    def _on_phase_end(self, phase: str):
+        async def on_end(session, ctx, params):
+            start = ctx.starts.pop(phase, None)
+            if start is not None:
+                self.observe(phase, self._get_endpoint(ctx, ctx.url), perf_counter() - start)
+
+        return on_end
+
+    # === Export === #
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Export the metrics as { "latency": { phase: { endpoint: histogram } }, "counters": { name: { endpoint: value } } }
+        """
+
+        latency = {}
+        for (phase, endpoint), histogram in self._histograms.items():
+            latency.setdefault(phase, {})[endpoint] = histogram.to_dict()
+
+        counters = {}
+        for (name, endpoint), value in self._counters.items():
+            counters.setdefault(name, {})[endpoint] = value
+
+        return { "latency": latency, "counters": counters }
+
+    def to_prometheus(self, prefix: str = "holoai") -> str:
+        """
+        Export the metrics in the Prometheus text format
+        """
+
+        def escape(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        lines = []
+
+        if self._histograms:
+            name = f"{prefix}_request_phase_seconds"
+            lines.append(f"# TYPE {name} histogram")
+
+            for (phase, endpoint), histogram in sorted(self._histograms.items()):
+                labels = f'phase="{escape(phase)}",endpoint="{escape(endpoint)}"'
+
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        counter_names = sorted(set(name for name, _ in self._counters))
+        for counter_name in counter_names:
+            name = f"{prefix}_{counter_name}_total"
+            lines.append(f"# TYPE {name} counter")
+
+            for (other_name, endpoint), value in sorted(self._counters.items()):
+                if other_name == counter_name:
+                    lines.append(f'{name}{{endpoint="{escape(endpoint)}"}} {value}')
+
+        return "\n".join(lines) + "\n"
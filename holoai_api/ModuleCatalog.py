@@ -0,0 +1,168 @@
+from asyncio import Task, CancelledError, get_event_loop, sleep
+
+from holoai_api.types import Model, Order_by
+
+from typing import Dict, List, Any, Iterator, Optional, Set, NoReturn
+
+class ModuleCatalog:
+    """
+    Local cache of the modules (prompt tunes), by id, with lookups by model and tag.
+    Refreshes only pull the modules created since the last refresh
+    """
+
+    _api: "HoloAI_API"
+
+    _modules: Dict[str, Dict[str, Any]]
+    _by_model: Dict[str, Set[str]]
+    _by_tag: Dict[str, Set[str]]
+
+    # creation date of the most recent module seen
+    _last_created_at: Optional[Any]
+    _refresh_task: Optional[Task]
+
+    filter: Dict[str, Any]
+    page_size: int
+
+    def __init__(self, api: "HoloAI_API", filter: Optional[Dict[str, Any]] = None, page_size: int = 50):
+        """
+        :param api: API used to fetch the modules
+        :param filter: Filter of the searched modules
+        :param page_size: Number of modules per request
+        """
+
+        self._api = api
+        self.filter = {} if filter is None else filter
+        self.page_size = page_size
+
+        self._modules = {}
+        self._by_model = {}
+        self._by_tag = {}
+
+        self._last_created_at = None
+        self._refresh_task = None
+
+    def __contains__(self, module_id: str) -> bool:
+        return module_id in self._modules
+
+    def __len__(self) -> int:
+        return len(self._modules)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._modules.values())
+
+    def get(self, module_id: str) -> Optional[Dict[str, Any]]:
+        return self._modules.get(module_id)
+
+    def get_by_model(self, model: Model) -> List[Dict[str, Any]]:
+        return [self._modules[module_id] for module_id in self._by_model.get(model.value, ())]
+
+    def get_by_tag(self, tag: str) -> List[Dict[str, Any]]:
+        return [self._modules[module_id] for module_id in self._by_tag.get(tag, ())]
+
+    def _unindex(self, module: Dict[str, Any]) -> NoReturn:
+        self._by_model.get(module.get("modelId"), set()).discard(module["id"])
+
+        for tag in module.get("tags") or ():
+            self._by_tag.get(tag, set()).discard(module["id"])
+
+    def add(self, module: Dict[str, Any]) -> NoReturn:
+        """
+        Add or replace a module in the catalog
+        """
+
+        module_id = module["id"]
+
+        previous = self._modules.get(module_id)
+        if previous is not None:
+            self._unindex(previous)
+
+        self._modules[module_id] = module
+        self._by_model.setdefault(module.get("modelId"), set()).add(module_id)
+
+        for tag in module.get("tags") or ():
+            self._by_tag.setdefault(tag, set()).add(module_id)
+
+        created_at = module.get("createdAt")
+        if created_at is not None and (self._last_created_at is None or self._last_created_at < created_at):
+            self._last_created_at = created_at
+
+    def remove(self, module_id: str) -> NoReturn:
+        """
+        Remove a module from the catalog, if present
+        """
+
+        module = self._modules.pop(module_id, None)
+        if module is not None:
+            self._unindex(module)
+
+    async def refresh(self, full: bool = False) -> int:
+        """
+        Pull the modules created since the last refresh (most recent first, stopping at the first one already seen).
+        Changes of the modules already in the catalog (e.g. their status) are only pulled by a full refresh,
+        which also removes the modules that were deleted on the server
+
+        :param full: Pull every module, and the modules of the user
+
+        :return: Number of modules pulled
+        """
+
+        last_created_at = None if full else self._last_created_at
+        pulled = 0
+        seen = set()
+
+        # incremental refreshes usually stop on the first page, don't request the next ones ahead
+        prefetch = 2 if last_created_at is None else 0
+        tunes = self._api.high_level.iter_prompt_tunes(self.filter, self.page_size, prefetch, Order_by.Creation_date)
+
+        try:
+            async for module in tunes:
+                created_at = module.get("createdAt")
+                if last_created_at is not None and created_at is not None and created_at <= last_created_at \
+                   and module["id"] in self._modules:
+                    break
+
+                self.add(module)
+                seen.add(module["id"])
+                pulled += 1
+        finally:
+            await tunes.aclose()
+
+        if full:
+            content = await self._api.low_level.read_prompt_tunes()
+            for module in (content if type(content) is list else content["data"]):
+                self.add(module)
+                seen.add(module["id"])
+                pulled += 1
+
+            # only reached if every page was pulled, so a missing module was deleted
+            for module_id in [module_id for module_id in self._modules if module_id not in seen]:
+                self.remove(module_id)
+
+        return pulled
+
+    def start_background_refresh(self, interval: float = 300.0) -> NoReturn:
+        """
+        Refresh the catalog periodically in the background. Failed refreshes are retried at the next period
+
+        :param interval: Time between two refreshes (in seconds)
+        """
+
+        self.stop_background_refresh()
+
+        async def refresh_loop():
+            while True:
+                try:
+                    await self.refresh()
+                except CancelledError:
+                    raise
+                except Exception as e:
+                    self._api._logger.warning(f"Module catalog refresh failed: {e}")
+
+                await sleep(interval)
+
+        self._refresh_task = get_event_loop().create_task(refresh_loop())
+
+    def stop_background_refresh(self) -> NoReturn:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
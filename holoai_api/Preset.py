@@ -1,12 +1,89 @@
-from json import loads
-from os import listdir
-from os.path import join, abspath, dirname, exists
+from json import loads, dumps
+from os import listdir, stat
+from os.path import join, abspath, dirname, exists, isdir, isfile, splitext
 from copy import deepcopy
 from random import choice
+from types import MappingProxyType
+from threading import Lock
 
 from holoai_api.types import Model
 
-from typing import Dict, List, Any, Union, Optional, NoReturn
+from typing import Dict, List, Any, Union, Optional, NoReturn, Mapping, Tuple
+
+# extensions of the preset files, the other files (e.g. editor backups) are ignored
+_PRESET_EXTENSIONS = (".preset", ".json")
+
+class PresetSnapshot:
+    """
+    Immutable and hashable state of a preset. The settings and their serialized form are computed once
+    """
+
+    __slots__ = ("name", "model", "version", "_items", "_settings", "_settings_json")
+
+    name: str
+    model: Model
+    version: int
+
+    _items: Tuple[Tuple[str, Any], ...]
+    _settings: Optional[Mapping[str, Any]]
+    _settings_json: Optional[bytes]
+
+    def __init__(self, name: str, model: Model, version: int, settings: Dict[str, Any]):
+        set_attr = super().__setattr__
+
+        set_attr("name", name)
+        set_attr("model", model)
+        set_attr("version", version)
+        set_attr("_items", tuple(sorted(settings.items())))
+        set_attr("_settings", None)
+        set_attr("_settings_json", None)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"PresetSnapshot is immutable, can't set '{name}'")
+
+    def __hash__(self) -> int:
+        return hash((self.name, self.model, self._items))
+
+    def __eq__(self, o: Any) -> bool:
+        if type(o) is not PresetSnapshot:
+            return NotImplemented
+
+        return (self.name, self.model, self._items) == (o.name, o.model, o._items)
+
+    def __repr__(self) -> str:
+        model = self.model.value if self.model is not None else "<?>"
+        return f"PresetSnapshot: '{self.name} ({model})' v{self.version}"
+
+    @property
+    def settings(self) -> Mapping[str, Any]:
+        """
+        Settings of the preset, merged with the default settings (read-only)
+        """
+
+        if self._settings is None:
+            settings = dict(Preset._DEFAULT)
+            settings.update(self._items)
+            settings.pop("id", None)
+
+            super().__setattr__("_settings", MappingProxyType(settings))
+
+        return self._settings
+
+    @property
+    def settings_json(self) -> bytes:
+        """
+        Settings of the preset, serialized as compact JSON
+        """
+
+        if self._settings_json is None:
+            settings_json = dumps(dict(self.settings), separators = (',', ':'), ensure_ascii = False).encode()
+
+            super().__setattr__("_settings_json", settings_json)
+
+        return self._settings_json
+
+    def to_settings(self) -> Dict[str, Any]:
+        return dict(self.settings)
 
 class Preset:
     _TYPE_MAPPING = {
@@ -31,21 +108,30 @@ class Preset:
     }
 
     _settings: Dict[str, Any]
+    _snapshot: Optional[PresetSnapshot]
     name: str
     model: Model
 
+    # incremented on every change of the settings
+    version: int
+
     def __init__(self, name: str, model: Model, settings: Optional[Dict[str, Any]] = None):
         self.name = name
         self.model = model
+        self.version = 0
 
         self._settings = {}
-        self.update(settings)
+        self._snapshot = None
+
+        if settings is not None:
+            self.update(settings)
 
     def __setitem__(self, o: str, v: Any):
         assert o in self._TYPE_MAPPING, f"'{o}' is not a valid setting"
         assert isinstance(v, self._TYPE_MAPPING[o]), f"Expected type '{self._TYPE_MAPPING[o]}' for {o}, but got type '{type(v)}'"
 
         self._settings[o] = v
+        self.version += 1
 
     def __contains__(self, o: str) -> bool:
         return o in self._settings
@@ -57,14 +143,21 @@ class Preset:
         model = self.model.value if self.model is not None else "<?>"
         return f"Preset: '{self.name} ({model})'"
 
-    def to_settings(self) -> Dict[str, Any]:
-        settings = deepcopy(self._DEFAULT)
-        settings.update(self._settings)
+    def snapshot(self) -> PresetSnapshot:
+        """
+        Get an immutable snapshot of the preset. The same snapshot is returned while the preset doesn't change
+        """
+
+        snapshot = self._snapshot
 
-        if "id" in settings:
-            del settings["id"]
+        if snapshot is None or snapshot.version != self.version or snapshot.name != self.name or snapshot.model is not self.model:
+            snapshot = PresetSnapshot(self.name, self.model, self.version, self._settings)
+            self._snapshot = snapshot
 
-        return settings
+        return snapshot
+
+    def to_settings(self) -> Dict[str, Any]:
+        return self.snapshot().to_settings()
 
     def to_file(self, path: str) -> NoReturn:
         raise NotImplementedError()
@@ -100,4 +193,123 @@ class Preset:
         with open(path) as f:
             data = loads(f.read())
 
-        return cls.from_preset_data(data)
\ No newline at end of file
+        return cls.from_preset_data(data)
+
+class PresetLibrary:
+    """
+    Index of a directory of preset files (.preset or .json). Presets in a subdirectory named after a model (value or name)
+    are for this model, the others have no model.
+    Files are only parsed on their first lookup, and parsed again only if their mtime or size changed.
+    Nothing is awaited, so the library can be shared by coroutines (and threads, through the lock)
+    """
+
+    # (name, model) -> path
+    _index: Dict[Tuple[str, Optional[Model]], str]
+    # path -> (mtime, size, preset)
+    _cache: Dict[str, Tuple[int, int, Preset]]
+    _lock: Lock
+
+    path: str
+
+    def __init__(self, path: str):
+        """
+        :param path: Directory of the presets
+        """
+
+        self.path = abspath(path)
+
+        self._index = {}
+        self._cache = {}
+        self._lock = Lock()
+
+        self.refresh()
+
+    @staticmethod
+    def _is_preset_file(path: str) -> bool:
+        return isfile(path) and splitext(path)[1].lower() in _PRESET_EXTENSIONS
+
+    @staticmethod
+    def _get_model(dirname: str) -> Optional[Model]:
+        for model in Model:
+            if dirname in (model.value, model.name):
+                return model
+
+        return None
+
+    def refresh(self) -> NoReturn:
+        """
+        Index the directory again, to pick up the added and removed files. The parsed presets are kept
+        """
+
+        index = {}
+
+        for filename in listdir(self.path):
+            path = join(self.path, filename)
+
+            if isdir(path):
+                model = self._get_model(filename)
+                if model is None:
+                    continue
+
+                for sub_filename in listdir(path):
+                    sub_path = join(path, sub_filename)
+                    if self._is_preset_file(sub_path):
+                        index[(splitext(sub_filename)[0], model)] = sub_path
+            elif self._is_preset_file(path):
+                index[(splitext(filename)[0], None)] = path
+
+        paths = set(index.values())
+
+        with self._lock:
+            self._index = index
+            self._cache = { path: entry for path, entry in self._cache.items() if path in paths }
+
+    def __contains__(self, name: str) -> bool:
+        return any(name == preset_name for preset_name, _ in self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def names(self, model: Optional[Model] = None) -> List[str]:
+        """
+        Get the names of the presets
+
+        :param model: Only get the presets for this model. If None, get all the presets
+        """
+
+        return sorted(set(name for name, preset_model in self._index if model is None or preset_model is model))
+
+    def get(self, name: str, model: Optional[Model] = None) -> Optional[Preset]:
+        """
+        Get a preset, parsing its file if it changed since the last lookup
+
+        :param name: Name of the preset
+        :param model: Model of the preset. Presets without model are used if there is none for this model
+
+        :return: Copy of the preset, or None if it doesn't exist
+        """
+
+        if (name, model) not in self._index:
+            model = None
+
+        path = self._index.get((name, model))
+        if path is None:
+            return None
+
+        try:
+            st = stat(path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            entry = self._cache.get(path)
+
+            if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+                preset = Preset.from_file(path)
+                preset.name = name
+                preset.model = model
+
+                entry = (st.st_mtime_ns, st.st_size, preset)
+                self._cache[path] = entry
+
+            return entry[2].copy()
@@ -0,0 +1,169 @@
+from asyncio import Future, CancelledError, get_event_loop
+from collections import OrderedDict, deque
+from enum import IntEnum
+from time import monotonic
+
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class Priority(IntEnum):
+    # lower value is served first
+    Interactive = 0
+    Background = 1
+
+class Scheduler:
+    """
+    Scheduler for the generations of several stories sharing a session.
+    Jobs are served by priority class, then round-robin across the stories of the same class.
+    Jobs of the same story never run concurrently, and at most max_concurrent jobs run at once
+    """
+
+    # waiting tickets (with their queuing time), by priority, then by story (in round-robin order)
+    _queues: Dict[Priority, "OrderedDict[Hashable, Deque[Tuple[Future, float]]]"]
+    # stories with a running job
+    _busy: Set[Hashable]
+    _running: int
+
+    # most recent wait times (in seconds), by priority
+    _wait_times: Dict[Priority, Deque[float]]
+    _completed: Dict[Priority, int]
+
+    max_concurrent: int
+
+    _WAIT_TIMES_WINDOW = 1000
+
+    def __init__(self, max_concurrent: int = 4):
+        """
+        :param max_concurrent: Maximum number of jobs running at once
+        """
+
+        assert type(max_concurrent) is int and 0 < max_concurrent, f"Expected a positive int for max_concurrent, but got '{max_concurrent}'"
+
+        self.max_concurrent = max_concurrent
+
+        self._queues = { priority: OrderedDict() for priority in Priority }
+        self._busy = set()
+        self._running = 0
+
+        self._wait_times = { priority: deque(maxlen = self._WAIT_TIMES_WINDOW) for priority in Priority }
+        self._completed = { priority: 0 for priority in Priority }
+
+    async def run(self, key: Hashable, job: Callable[[], Awaitable[T]], priority: Priority = Priority.Interactive) -> T:
+        """
+        Run a job once it is scheduled
+
+        :param key: Key of the story the job works on. Jobs with the same key are serialized
+        :param job: Coroutine function of the job
+        :param priority: Priority class of the job
+
+        :return: Result of the job
+        """
+
+        assert type(priority) is Priority, f"Expected type 'Priority' for priority, but got type '{type(priority)}'"
+
+        ticket = get_event_loop().create_future()
+        queued_at = monotonic()
+
+        self._queues[priority].setdefault(key, deque()).append((ticket, queued_at))
+        self._dispatch()
+
+        try:
+            await ticket
+        except CancelledError:
+            if ticket.cancelled():
+                self._remove_ticket(priority, key, ticket)
+            else:
+                # cancelled right after being scheduled, give the slot back
+                self._release(key)
+
+            raise
+
+        self._wait_times[priority].append(monotonic() - queued_at)
+
+        try:
+            return await job()
+        finally:
+            self._completed[priority] += 1
+            self._release(key)
+
+    def _remove_ticket(self, priority: Priority, key: Hashable, ticket: Future):
+        tickets = self._queues[priority].get(key)
+        if tickets is None:
+            return
+
+        for item in tickets:
+            if item[0] is ticket:
+                tickets.remove(item)
+                break
+
+        if len(tickets) == 0:
+            del self._queues[priority][key]
+
+    def _release(self, key: Hashable):
+        self._busy.discard(key)
+        self._running -= 1
+
+        self._dispatch()
+
+    def _next_ticket(self) -> Tuple[Hashable, Future]:
+        for priority in Priority:
+            queue = self._queues[priority]
+
+            for key in queue:
+                if key in self._busy:
+                    continue
+
+                tickets = queue[key]
+                ticket, _ = tickets.popleft()
+
+                # the story goes to the back of the line, so every story gets its turn
+                if len(tickets):
+                    queue.move_to_end(key)
+                else:
+                    del queue[key]
+
+                return (key, ticket)
+
+        return (None, None)
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent:
+            key, ticket = self._next_ticket()
+            if ticket is None:
+                break
+
+            # cancelled while queued, its owner removes it
+            if ticket.done():
+                continue
+
+            self._busy.add(key)
+            self._running += 1
+
+            ticket.set_result(None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get the queue depths and the wait times (in seconds) of the scheduler
+
+        :return: Metrics, by priority class for queue depths and wait times
+        """
+
+        metrics = {
+            "running": self._running,
+            "queue_depth": {},
+            "wait_time": {},
+        }
+
+        for priority in Priority:
+            metrics["queue_depth"][priority.name] = sum(len(tickets) for tickets in self._queues[priority].values())
+
+            waits = sorted(self._wait_times[priority])
+            metrics["wait_time"][priority.name] = {
+                "completed": self._completed[priority],
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "max": waits[-1] if waits else 0.0,
+            }
+
+        return metrics
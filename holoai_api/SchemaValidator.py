@@ -1,28 +1,73 @@
-from jsonschema import validate
 from json import loads
 from os import listdir
-from os.path import splitext, dirname, abspath, join
+from os.path import splitext, dirname, abspath, join, isdir
 
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 class SchemaValidator:
-	_schemas: Dict[str, Dict[str, Any]]
+	"""
+	Validators of the responses, by schema name. Schema files are only read, and their validator compiled,
+	when the schema is first used
+	"""
 
-	def __init__(self):
-		if not hasattr(self, "_schemas"):
-			schemas = {}
+	_schemas_path: str = join(dirname(abspath(__file__)), "schemas")
 
-			lib_root = dirname(abspath(__file__))
+	# schema name -> filename, listed on first use
+	_schema_files: Optional[Dict[str, str]] = None
+	_validators: Dict[str, Any] = {}
+	_counters: Dict[str, int] = {}
 
-			for filename in listdir(join(lib_root, "schemas")):
-				with open(join(lib_root, "schemas", filename)) as f:
-					schemas[splitext(filename)[0]] = loads(f.read())
+	# validate one object out of sample_rate, per schema (1 validates everything)
+	sample_rate: int = 1
 
-			SchemaValidator._schemas = schemas
+	@classmethod
+	def _get_schema_files(cls) -> Dict[str, str]:
+		if cls._schema_files is None:
+			filenames = listdir(cls._schemas_path) if isdir(cls._schemas_path) else []
+			cls._schema_files = { splitext(filename)[0]: filename for filename in filenames }
+
+		return cls._schema_files
+
+	@classmethod
+	def has_schema(cls, name: str) -> bool:
+		return name in cls._get_schema_files()
+
+	@classmethod
+	def _get_validator(cls, name: str) -> Any:
+		validator = cls._validators.get(name)
+
+		if validator is None:
+			from jsonschema.validators import validator_for
+
+			with open(join(cls._schemas_path, cls._get_schema_files()[name])) as f:
+				schema = loads(f.read())
+
+			# the schema is only checked once, here
+			Validator = validator_for(schema)
+			Validator.check_schema(schema)
+
+			validator = Validator(schema)
+			cls._validators[name] = validator
+
+		return validator
 
 	@classmethod
-	def validate(cls, name: str, obj: Any):
-		validate(cls._schemas[name], obj)
+	def validate(cls, name: str, obj: Any) -> bool:
+		"""
+		Validate an object against a schema, if it is sampled
+
+		:param name: Name of the schema
+		:param obj: Object to validate
+
+		:return: True if the object was validated, False if it was skipped by the sampling
+		"""
+
+		counter = cls._counters.get(name, 0)
+		cls._counters[name] = counter + 1
+
+		if counter % cls.sample_rate:
+			return False
+
+		cls._get_validator(name).validate(obj)
 
-# initialize the schemas. A bit dirty, but the simplest
-SchemaValidator()
\ No newline at end of file
+		return True
\ No newline at end of file
@@ -0,0 +1,191 @@
+from sqlite3 import connect, Connection
+from json import loads, dumps
+from copy import deepcopy
+from asyncio import gather
+
+from holoai_api.utils import format_and_decrypt_stories
+
+from typing import Dict, List, Any, Iterator, Optional, Tuple, NoReturn
+
+class StoryStore:
+    """
+    Local persistent store of the stories (raw and decrypted), keyed by id and lastUpdatedAt.
+    Syncing only fetches and decrypts the stories that changed since the last sync.
+    The local trees of the stories (that don't exist on the backend) are stored alongside
+    """
+
+    _connection: Connection
+
+    path: str
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the SQLite database (created if it doesn't exist)
+        """
+
+        self.path = path
+
+        self._connection = connect(path, check_same_thread = False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript("CREATE TABLE IF NOT EXISTS stories ("
+                                           "id TEXT PRIMARY KEY, "
+                                           "last_updated_at TEXT NOT NULL, "
+                                           "raw TEXT NOT NULL, "
+                                           "decrypted TEXT NOT NULL"
+                                       ");"
+                                       "CREATE TABLE IF NOT EXISTS trees ("
+                                           "id TEXT PRIMARY KEY, "
+                                           "tree TEXT NOT NULL"
+                                       ");")
+        self._connection.commit()
+
+    def close(self) -> NoReturn:
+        self._connection.close()
+
+    def __enter__(self) -> "StoryStore":
+        return self
+
+    def __exit__(self, *args) -> NoReturn:
+        self.close()
+
+    def __contains__(self, story_id: str) -> bool:
+        cursor = self._connection.execute("SELECT 1 FROM stories WHERE id = ?", (story_id,))
+
+        return cursor.fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return (row[0] for row in self._connection.execute("SELECT id FROM stories").fetchall())
+
+    def get(self, story_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a decrypted story
+
+        :param story_id: Id of the story
+
+        :return: Decrypted story or None if the story isn't in the store
+        """
+
+        row = self._connection.execute("SELECT decrypted FROM stories WHERE id = ?", (story_id,)).fetchone()
+
+        return None if row is None else loads(row[0])
+
+    def get_raw(self, story_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a story as sent by the server
+
+        :param story_id: Id of the story
+
+        :return: Raw story or None if the story isn't in the store
+        """
+
+        row = self._connection.execute("SELECT raw FROM stories WHERE id = ?", (story_id,)).fetchone()
+
+        return None if row is None else loads(row[0])
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        """
+        Get every decrypted story of the store
+        """
+
+        return [loads(row[0]) for row in self._connection.execute("SELECT decrypted FROM stories").fetchall()]
+
+    def get_timestamps(self) -> Dict[str, str]:
+        """
+        Get the lastUpdatedAt of every story of the store, by id
+        """
+
+        return dict(self._connection.execute("SELECT id, last_updated_at FROM stories").fetchall())
+
+    def upsert(self, raw: Dict[str, Any], decrypted: Dict[str, Any]) -> NoReturn:
+        """
+        Insert or replace a story
+
+        :param raw: Story as sent by the server
+        :param decrypted: Same story, formatted and decrypted
+        """
+
+        self._upsert(raw, decrypted)
+        self._connection.commit()
+
+    def _upsert(self, raw: Dict[str, Any], decrypted: Dict[str, Any]) -> NoReturn:
+        self._connection.execute("INSERT OR REPLACE INTO stories (id, last_updated_at, raw, decrypted) VALUES (?, ?, ?, ?)",
+                                 (raw["id"], str(raw["lastUpdatedAt"]), dumps(raw), dumps(decrypted)))
+
+    def delete(self, *story_ids: str) -> NoReturn:
+        with self._connection:
+            self._connection.executemany("DELETE FROM stories WHERE id = ?", ((story_id,) for story_id in story_ids))
+            self._connection.executemany("DELETE FROM trees WHERE id = ?", ((story_id,) for story_id in story_ids))
+
+    def get_tree(self, story_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the local tree of a story
+
+        :param story_id: Id of the story
+
+        :return: Tree or None if no tree was stored for the story
+        """
+
+        row = self._connection.execute("SELECT tree FROM trees WHERE id = ?", (story_id,)).fetchone()
+
+        return None if row is None else loads(row[0])
+
+    def set_tree(self, story_id: str, tree: Dict[str, Any]) -> NoReturn:
+        """
+        Insert or replace the local tree of a story
+
+        :param story_id: Id of the story
+        :param tree: Tree, as dumped by the story proxy
+        """
+
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO trees (id, tree) VALUES (?, ?)", (story_id, dumps(tree)))
+
+    def delete_tree(self, story_id: str) -> NoReturn:
+        with self._connection:
+            self._connection.execute("DELETE FROM trees WHERE id = ?", (story_id,))
+
+    async def sync(self, api: "HoloAI_API", account_key: bytes) -> Tuple[List[str], List[str]]:
+        """
+        Sync the store with the account. Only the stories with a different lastUpdatedAt are fetched and decrypted
+
+        :param api: API used to fetch the stories
+        :param account_key: Account key, as returned by login
+
+        :return: Ids of the updated stories and ids of the deleted stories
+        """
+
+        user = await api.high_level.get_user_data()
+        listing = user["stories"]
+
+        timestamps = self.get_timestamps()
+        changed = [story for story in listing if timestamps.get(story["id"]) != str(story["lastUpdatedAt"])]
+
+        # the listing usually holds the whole story, but fetch it if it doesn't
+        async def fetch(story: Dict[str, Any]) -> Dict[str, Any]:
+            if "content" in story:
+                return story
+
+            rsp = await api.low_level.get_story(story["id"])
+            return rsp["pageProps"]["story"]
+
+        raw_stories = await gather(*(fetch(story) for story in changed))
+
+        listing_ids = set(story["id"] for story in listing)
+        deleted = [story_id for story_id in timestamps if story_id not in listing_ids]
+
+        # single transaction for the whole sync
+        with self._connection:
+            for raw in raw_stories:
+                decrypted = deepcopy(raw)
+                format_and_decrypt_stories(account_key, decrypted)
+
+                self._upsert(raw, decrypted)
+
+            self._connection.executemany("DELETE FROM stories WHERE id = ?", ((story_id,) for story_id in deleted))
+            self._connection.executemany("DELETE FROM trees WHERE id = ?", ((story_id,) for story_id in deleted))
+
+        return ([story["id"] for story in changed], deleted)
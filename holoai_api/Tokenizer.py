@@ -1,6 +1,7 @@
 from os.path import abspath, dirname, join, split
 
 from holoai_api.types import Model
+from holoai_api.Tracing import start_span
 
 from typing import List, Union
 
@@ -51,14 +52,20 @@ class Tokenizer:
 
     @classmethod
     def encode(cls, model: Model, o: str) -> List[int]:
-        tokenizer = cls._get_tokenizer(model)
+        with start_span("tokenize") as span:
+            tokenizer = cls._get_tokenizer(model)
+            tokens = tokenizer.encode(o, verbose = False)
+
+            span.set_attribute("model", model.value)
+            span.set_attribute("chars", len(o))
+            span.set_attribute("tokens", len(tokens))
 
-        return tokenizer.encode(o, verbose = False)
+        return tokens
 
     @classmethod
-    def tokenize_if_not(model: Model, o: Union[str, List[int]]) -> List[int]:
+    def tokenize_if_not(cls, model: Model, o: Union[str, List[int]]) -> List[int]:
         if type(o) is list:
             return o
 
         assert type(o) is str
-        return Tokenizer.encode(model, o)
\ No newline at end of file
+        return cls.encode(model, o)
\ No newline at end of file
@@ -0,0 +1,163 @@
+# Lightweight tracing, modeled after OpenTelemetry spans
+# Spans nest through a context variable, so the spans started in child asyncio tasks have the right parent.
+# Without a tracer set, start_span returns a shared no-op span
+
+from contextvars import ContextVar, Token
+from collections import deque
+from itertools import count
+from time import time_ns
+
+from typing import Any, Callable, Deque, Dict, Optional, NoReturn
+
+class Span:
+    """
+    Timed operation, with attributes. The times are in nanoseconds since the epoch
+    """
+
+    __slots__ = ("_tracer", "_token", "_activate", "name", "trace_id", "span_id", "parent_id",
+                 "attributes", "start_time", "end_time", "error")
+
+    name: str
+    trace_id: int
+    span_id: int
+    parent_id: Optional[int]
+    attributes: Dict[str, Any]
+    start_time: int
+    end_time: Optional[int]
+    error: Optional[str]
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict[str, Any], activate: bool):
+        self._tracer = tracer
+        self._token = None
+        self._activate = activate
+
+        self.name = name
+        self.span_id = next(tracer._ids)
+        self.trace_id = self.span_id if parent is None else parent.trace_id
+        self.parent_id = None if parent is None else parent.span_id
+        self.attributes = attributes
+        self.start_time = time_ns()
+        self.end_time = None
+        self.error = None
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, span_id = {self.span_id}, parent_id = {self.parent_id}, attributes = {self.attributes})"
+
+    @property
+    def duration(self) -> Optional[int]:
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any) -> NoReturn:
+        self.attributes[key] = value
+
+    def end(self) -> NoReturn:
+        if self.end_time is None:
+            self.end_time = time_ns()
+            self._tracer._on_end(self)
+
+    def __enter__(self) -> "Span":
+        if self._activate:
+            self._token = _current_span.set(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc_value}"
+
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+
+        self.end()
+
+class _NullSpan:
+    """
+    Span doing nothing, returned when no tracer is set
+    """
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> NoReturn:
+        pass
+
+    def end(self) -> NoReturn:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Tracer:
+    """
+    Collect the finished spans, either through a callback (e.g. to forward them to an OpenTelemetry exporter)
+    or in a bounded buffer
+    """
+
+    _ids: "count"
+
+    spans: Deque[Span]
+    on_end: Optional[Callable[[Span], Any]]
+
+    def __init__(self, on_end: Optional[Callable[[Span], Any]] = None, max_spans: int = 10000):
+        """
+        :param on_end: Called with each finished span. If None, the spans are kept in the buffer
+        :param max_spans: Size of the buffer of finished spans
+        """
+
+        self._ids = count(1)
+
+        self.spans = deque(maxlen = max_spans)
+        self.on_end = on_end
+
+    def _on_end(self, span: Span) -> NoReturn:
+        if self.on_end is None:
+            self.spans.append(span)
+        else:
+            self.on_end(span)
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None, activate: bool = True) -> Span:
+        """
+        Start a span, child of the current span. Used as a context manager, it is the current span inside its block
+
+        :param name: Name of the span
+        :param attributes: Attributes of the span
+        :param activate: Make it the current span when entered. Spans held across a yield must not be activated,
+                         as the context of a generator is the context of its consumer
+        """
+
+        return Span(self, name, _current_span.get(), {} if attributes is None else attributes, activate)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("holoai_current_span", default = None)
+_tracer: Optional[Tracer] = None
+
+def set_tracer(tracer: Optional[Tracer]) -> NoReturn:
+    """
+    Set the tracer of the library, None to disable the tracing
+    """
+
+    global _tracer
+
+    assert tracer is None or isinstance(tracer, Tracer), f"Expected None or type 'Tracer' for tracer, but got type '{type(tracer)}'"
+
+    _tracer = tracer
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None, activate: bool = True):
+    """
+    Start a span with the tracer of the library, or return a no-op span if no tracer is set
+    """
+
+    if _tracer is None:
+        return NULL_SPAN
+
+    return _tracer.start_span(name, attributes, activate)
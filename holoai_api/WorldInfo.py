@@ -0,0 +1,227 @@
+from re import compile, IGNORECASE, error as RegexError
+from collections import deque
+
+from typing import Dict, List, Tuple, Iterable, Iterator, Any, Optional, Pattern, Union
+
+class KeyMatcher:
+    """
+    Multi-pattern matcher for world info keys.
+    Plain keys are compiled into an Aho-Corasick automaton and searched in a single pass over the text.
+    Regex keys (written as /pattern/) can't go in the automaton, so they are kept aside and searched one by one
+    """
+
+    # automaton: transitions, failure links and outputs (entry index, key length) per node
+    _goto: List[Dict[str, int]]
+    _fail: List[int]
+    _out: List[List[Tuple[int, int]]]
+
+    _regexes: List[Tuple[int, Pattern]]
+
+    case_sensitive: bool
+
+    def __init__(self, keys: Iterable[Tuple[int, str]], case_sensitive: bool = False):
+        """
+        :param keys: Pairs of (entry index, key) to compile
+        :param case_sensitive: Match the keys with case sensitivity
+        """
+
+        self.case_sensitive = case_sensitive
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._regexes = []
+
+        flags = 0 if case_sensitive else IGNORECASE
+
+        for index, key in keys:
+            assert type(key) is str, f"Expected type 'str' for key, but got type '{type(key)}'"
+
+            if len(key) == 0:
+                continue
+
+            if 2 < len(key) and key[0] == '/' and key[-1] == '/':
+                try:
+                    self._regexes.append((index, compile(key[1:-1], flags)))
+                    continue
+                except RegexError:
+                    pass    # not a valid regex, match it literally
+
+            self._add_key(index, key if case_sensitive else key.lower())
+
+        self._build_links()
+
+    def _add_key(self, index: int, key: str):
+        node = 0
+
+        for c in key:
+            next_node = self._goto[node].get(c)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][c] = next_node
+
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+
+            node = next_node
+
+        self._out[node].append((index, len(key)))
+
+    def _build_links(self):
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+
+            for c, child in goto[node].items():
+                queue.append(child)
+
+                state = fail[node]
+                while state and c not in goto[state]:
+                    state = fail[state]
+
+                link = goto[state].get(c, 0)
+                fail[child] = link if link != child else 0
+
+                # inherit the outputs of the suffix, so the scan never has to walk the failure links
+                out[child] = out[child] + out[fail[child]]
+
+    def scan(self, text: str) -> Dict[int, List[Tuple[int, int]]]:
+        """
+        Find every key in the text
+
+        :param text: Text to search
+
+        :return: Match positions (start, end) of the keys, by entry index
+        """
+
+        matches = {}
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        if len(goto) > 1:
+            search = text if self.case_sensitive else text.lower()
+
+            node = 0
+            for i, c in enumerate(search):
+                while node and c not in goto[node]:
+                    node = fail[node]
+
+                node = goto[node].get(c, 0)
+
+                for index, length in out[node]:
+                    matches.setdefault(index, []).append((i + 1 - length, i + 1))
+
+        for index, regex in self._regexes:
+            for match in regex.finditer(text):
+                if match.start() != match.end():
+                    matches.setdefault(index, []).append(match.span())
+
+        for positions in matches.values():
+            positions.sort()
+
+        return matches
+
+class WorldInfo:
+    """
+    Set of world info (lorebook) entries. The keys are compiled into a KeyMatcher on first use,
+    and the matcher is only rebuilt when the entries change
+    """
+
+    _entries: List[Dict[str, Any]]
+    _matcher: Optional[KeyMatcher]
+
+    case_sensitive: bool
+
+    # incremented on every change of the entries
+    version: int
+
+    def __init__(self, *entries: Dict[str, Any], case_sensitive: bool = False):
+        self.case_sensitive = case_sensitive
+        self.version = 0
+
+        self._entries = []
+        self._matcher = None
+
+        if entries:
+            self.add(*entries)
+
+    @classmethod
+    def from_data(cls, data: List[Dict[str, Any]]) -> "WorldInfo":
+        return cls(*data)
+
+    def _invalidate(self):
+        self._matcher = None
+        self.version += 1
+
+    def add(self, *entries: Dict[str, Any]) -> "WorldInfo":
+        for i, entry in enumerate(entries):
+            assert type(entry) is dict, f"Expected type 'dict' for entry #{i}, but got type '{type(entry)}'"
+            assert "keys" in entry, f"Expected key 'keys' in entry #{i}"
+            assert type(entry["keys"]) is list, f"Expected type 'list' for 'keys' in entry #{i}, but got type '{type(entry['keys'])}'"
+
+            self._entries.append(entry)
+
+        self._invalidate()
+
+        return self
+
+    def __iadd__(self, o: Dict[str, Any]) -> "WorldInfo":
+        self.add(o)
+
+        return self
+
+    def __setitem__(self, index: int, entry: Dict[str, Any]):
+        assert type(entry) is dict and "keys" in entry, f"Expected a world info entry, but got '{entry}'"
+
+        self._entries[index] = entry
+        self._invalidate()
+
+    def __delitem__(self, index: int):
+        del self._entries[index]
+        self._invalidate()
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self._entries[index]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._entries.__iter__()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_matcher(self) -> KeyMatcher:
+        """
+        Get the matcher of the enabled entries, compiling it if the entries changed
+
+        Entries modified in place aren't detected, reassign them (or use add/del) to recompile
+        """
+
+        if self._matcher is None:
+            keys = ((i, key) for i, entry in enumerate(self._entries) if entry.get("enabled", True)
+                             for key in entry["keys"])
+
+            self._matcher = KeyMatcher(keys, self.case_sensitive)
+
+        return self._matcher
+
+    def activate(self, text: str, offset: int = 0) -> List[Tuple[Dict[str, Any], List[Tuple[int, int]]]]:
+        """
+        Find the entries activated by the text
+
+        :param text: Text to search for the keys (usually the end of the story)
+        :param offset: Offset added to the match positions
+
+        :return: Activated entries with their match positions (start, end), in entry order
+        """
+
+        matches = self.get_matcher().scan(text)
+
+        return [(self._entries[i], [(start + offset, end + offset) for start, end in matches[i]])
+                for i in sorted(matches)]
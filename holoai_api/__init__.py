@@ -1,2 +1,43 @@
-from holoai_api.HoloAIError import HoloAIError
-from holoai_api.HoloAI_API import HoloAI_API
\ No newline at end of file
+# The public names are imported on first access, so importing the package (or one of its light modules)
+# doesn't pull in aiohttp, the crypto or the schema validation
+
+from sys import modules
+from types import ModuleType
+
+from typing import Any, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from holoai_api.HoloAIError import HoloAIError
+    from holoai_api.HoloAI_API import HoloAI_API
+
+# public name -> module defining it
+_LAZY_NAMES = {
+    "HoloAIError": "holoai_api.HoloAIError",
+    "HoloAI_API": "holoai_api.HoloAI_API",
+}
+
+__all__ = list(_LAZY_NAMES)
+
+class _Package(ModuleType):
+    def __setattr__(self, name: str, value: Any):
+        # importing a submodule binds it to the package, which would shadow the class of the same name
+        if name in _LAZY_NAMES and isinstance(value, ModuleType):
+            value = getattr(value, name)
+
+        super().__setattr__(name, value)
+
+modules[__name__].__class__ = _Package
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    from importlib import import_module
+
+    import_module(module_name)
+
+    return globals()[name]
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_NAMES))
@@ -1,17 +1,49 @@
 from json import loads, dumps
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Hash import SHA1
+from asyncio import Future, Semaphore, ensure_future, shield, gather, sleep
+from time import monotonic
+from collections import deque
+from os.path import basename
 
 from holoai_api.utils import format_and_decrypt_stories
+from holoai_api.Tracing import start_span
 from holoai_api.srp import create_verifier_and_salt, process_challenge
+from holoai_api.dataset import split_dataset
+from holoai_api.types import Order_by
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterable, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from holoai_api.DatasetIndex import DatasetIndex
+
+# polling intervals (in seconds) of the prompt tunes: queued tunes back off up to the max,
+# training tunes are polled about once per step
+_TUNE_QUEUED_INTERVAL = 5.0
+_TUNE_QUEUED_MAX_INTERVAL = 60.0
+_TUNE_QUEUED_BACKOFF = 1.5
+_TUNE_TRAINING_MIN_INTERVAL = 1.0
+_TUNE_TRAINING_MAX_INTERVAL = 30.0
+
+def _get_tune_state(tune: Dict[str, Any]) -> Tuple[str, Optional[int]]:
+    run_status = tune["data"]["runStatus"]
+    if run_status is None:
+        return ("finished", None)
+
+    step = run_status["currentStepNo"]
+
+    return ("queued" if step == 0 else "training", step)
+
+def _get_tune_items(content: Any) -> List[Dict[str, Any]]:
+    return content if type(content) is list else content["data"]
 
 class High_Level:
     _parent: "HoloAI_API"
 
+    # requests in flight of the watched prompt tunes, shared by the watchers
+    _tune_polls: Dict[str, Future]
+
     def __init__(self, parent: "HoloAI_API"):
         self._parent = parent
+        self._tune_polls = {}
 
     async def register(self, email: str, password: str):
         salt, verifier = create_verifier_and_salt(password)
@@ -33,23 +65,29 @@ class High_Level:
         :return: Encryption key
         """
 
-        challenge = await self._parent.low_level.get_srp_challenge(email)
+        with start_span("login"):
+            challenge = await self._parent.low_level.get_srp_challenge(email)
+
+            # verify challenge structure
 
-        # verify challenge structure
+            s = int(challenge["srp"]["salt"])
+            B = int(challenge["srp"]["challenge"])
 
-        s = int(challenge["srp"]["salt"])
-        B = int(challenge["srp"]["challenge"])
+            password = password.encode()
+            with start_span("srp.process_challenge"):
+                x, a, A, k, u, S, M1 = process_challenge(password, s, B)
+            A = str(A)
+            M1 = str(M1)
 
-        password = password.encode()
-        x, a, A, k, u, S, M1 = process_challenge(password, s, B)
-        A = str(A)
-        M1 = str(M1)
+            key_salt, session = await self._parent.low_level.verify_srp_challenge(email, A, M1)
+            self._parent.cookies["session"] = session
 
-        key_salt, session = await self._parent.low_level.verify_srp_challenge(email, A, M1)
-        self._parent.cookies["session"] = session
+            key_salt = key_salt["encryptionKeySalt"].encode()
 
-        key_salt = key_salt["encryptionKeySalt"].encode()
-        account_key = PBKDF2(password, key_salt, 16, 1, hmac_hash_module = SHA1)
+            from Crypto.Protocol.KDF import PBKDF2
+            from Crypto.Hash import SHA1
+
+            account_key = PBKDF2(password, key_salt, 16, 1, hmac_hash_module = SHA1)
 
         # yes, it is what you think it is: a key restricted to the [49:58] | [97:123] domain
         return account_key.hex().encode()
@@ -59,18 +97,240 @@ class High_Level:
 
         return home["pageProps"]["user"]
 
-    async def get_stories(self, account_key: bytes) -> Dict[str, Any]:
-        user = await self.get_user_data()
-        stories = user["stories"]
+    async def get_stories(self, account_key: bytes, store: Optional["StoryStore"] = None) -> List[Dict[str, Any]]:
+        """
+        Get the decrypted stories of the account
 
-        format_and_decrypt_stories(account_key, *stories)
+        :param account_key: Account key, as returned by login
+        :param store: Local store to sync. If provided, only the stories that changed are decrypted
+                      and the stories are read from the store
+
+        :return: Decrypted stories
+        """
+
+        with start_span("get_stories", { "store": store is not None }) as span:
+            if store is not None:
+                await store.sync(self._parent, account_key)
+                stories = store.get_all()
+            else:
+                user = await self.get_user_data()
+                stories = user["stories"]
+
+                with self._parent.low_level._timer("decrypt", "/home.json"):
+                    format_and_decrypt_stories(account_key, *stories)
+
+            span.set_attribute("stories", len(stories))
 
         return stories
 
+    async def iter_stories(self, account_key: Optional[bytes] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the stories of the account one at a time, so memory stays flat regardless of the account size.
+        Requires the ijson package
+
+        :param account_key: Account key, as returned by login. If provided, each story is decrypted as it arrives
+
+        :return: Async iterator over the stories
+        """
+
+        async for story in self._parent.low_level.iter_home_stories():
+            if account_key is not None:
+                with self._parent.low_level._timer("decrypt", "/home.json"):
+                    format_and_decrypt_stories(account_key, story)
+
+            yield story
+
     async def get_story(self, story_id: str, account_key: bytes) -> Dict[str, Any]:
         story = await self._parent.low_level.get_story(story_id)
 
         story = story["pageProps"]["story"]
-        format_and_decrypt_stories(account_key, story)
 
-        return story
\ No newline at end of file
+        with self._parent.low_level._timer("decrypt", "/write/{id}.json"):
+            format_and_decrypt_stories(account_key, story)
+
+        return story
+
+    async def upload_dataset_files(self, name: str, paths: Iterable[str], max_size: Optional[int] = None,
+                                         compress: bool = False, max_concurrent: int = 4,
+                                         index: Optional["DatasetIndex"] = None) -> List[Dict[str, Any]]:
+        """
+        Upload files as one or several datasets, streaming them from disk.
+        If any upload fails, the datasets already created are deleted
+
+        :param name: Name of the dataset. Numbered ("name (1/3)") if the files are split
+        :param paths: Paths of the documents
+        :param max_size: Maximum size of a dataset (in bytes, on disk), None to never split
+        :param compress: Compress the request bodies with gzip
+        :param max_concurrent: Maximum number of uploads running at once
+        :param index: Index of the known datasets. If provided, duplicate documents are dropped,
+                      and a known dataset with the same documents is reused instead of uploaded
+
+        :return: Created (or reused, marked with "reused": True) datasets
+        """
+
+        paths = list(paths)
+
+        hashes = {}
+        if index is not None:
+            # identical documents are only uploaded once
+            for path in paths:
+                hashes.setdefault(index.hash_file(path), path)
+
+            paths = list(hashes.values())
+            hashes = { path: document_hash for document_hash, path in hashes.items() }
+        groups = [paths] if max_size is None else split_dataset(paths, max_size)
+
+        names = [name] if len(groups) == 1 else [f"{name} ({i + 1}/{len(groups)})" for i in range(len(groups))]
+
+        semaphore = Semaphore(max_concurrent)
+        low_level = self._parent.low_level
+
+        async def upload(group_name: str, group: List[str]) -> Dict[str, Any]:
+            if index is not None:
+                group_hashes = [hashes[path] for path in group]
+
+                dataset = index.find_dataset(group_hashes)
+                if dataset is not None:
+                    dataset["reused"] = True
+                    return dataset
+
+            async with semaphore:
+                dataset = await low_level.create_prompt_tune_dataset_stream(group_name, group, compress)
+
+            if index is not None:
+                index.add_dataset(dataset, group_hashes, group_name, [basename(path) for path in group])
+
+            return dataset
+
+        datasets = await gather(*(upload(group_name, group) for group_name, group in zip(names, groups)),
+                                return_exceptions = True)
+
+        errors = [dataset for dataset in datasets if isinstance(dataset, BaseException)]
+        if errors:
+            created = [dataset for dataset in datasets if not isinstance(dataset, BaseException) and not dataset.get("reused")]
+
+            await gather(*(low_level.delete_prompt_tune_dataset(dataset["id"]) for dataset in created),
+                         return_exceptions = True)
+
+            if index is not None:
+                for dataset in created:
+                    index.remove_dataset(dataset["id"])
+
+            raise errors[0]
+
+        return datasets
+
+    async def _poll_prompt_tune(self, tune_id: str) -> Dict[str, Any]:
+        future = self._tune_polls.get(tune_id)
+
+        if future is None:
+            future = ensure_future(self._parent.low_level.read_prompt_tune(tune_id))
+            future.add_done_callback(lambda _: self._tune_polls.pop(tune_id, None))
+
+            self._tune_polls[tune_id] = future
+
+        # a cancelled watcher must not cancel the request of the others
+        return await shield(future)
+
+    async def watch_prompt_tunes(self, tune_ids: Iterable[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Watch the progress of several prompt tunes with a single polling loop.
+        Queued tunes are polled less and less often, training tunes about once per step.
+        Requests are shared with the other watchers of the same tune
+
+        :param tune_ids: Ids of the prompt tunes to watch
+
+        :return: Async iterator over the progress events ({ "id", "state", "step", "data" }),
+                 yielded when the state or step of a tune changes. Ends when every tune is finished
+        """
+
+        # per tune: next poll time, interval, last (state, step) and when the step was seen
+        watched = { tune_id: { "next": 0.0, "interval": _TUNE_QUEUED_INTERVAL, "state": None, "seen_at": None }
+                    for tune_id in dict.fromkeys(tune_ids) }
+
+        while watched:
+            now = monotonic()
+
+            due = [tune_id for tune_id, watch in watched.items() if watch["next"] <= now]
+            if len(due) == 0:
+                await sleep(min(watch["next"] for watch in watched.values()) - now)
+                continue
+
+            tunes = await gather(*(self._poll_prompt_tune(tune_id) for tune_id in due))
+            now = monotonic()
+
+            for tune_id, tune in zip(due, tunes):
+                watch = watched[tune_id]
+                state, step = _get_tune_state(tune)
+
+                if state == "queued":
+                    if watch["state"] is not None and watch["state"][0] == "queued":
+                        watch["interval"] = min(watch["interval"] * _TUNE_QUEUED_BACKOFF, _TUNE_QUEUED_MAX_INTERVAL)
+                elif state == "training":
+                    last_state, last_step = watch["state"] if watch["state"] is not None else (None, None)
+
+                    # estimate the time of a step from the last progress seen
+                    if last_state == "training" and last_step < step:
+                        step_time = (now - watch["seen_at"]) / (step - last_step)
+                        watch["interval"] = min(max(step_time, _TUNE_TRAINING_MIN_INTERVAL), _TUNE_TRAINING_MAX_INTERVAL)
+                    elif last_state != "training":
+                        watch["interval"] = _TUNE_TRAINING_MIN_INTERVAL
+
+                if watch["state"] != (state, step):
+                    watch["state"] = (state, step)
+                    watch["seen_at"] = now
+
+                    yield { "id": tune_id, "state": state, "step": step, "data": tune["data"] }
+
+                if state == "finished":
+                    del watched[tune_id]
+                else:
+                    watch["next"] = now + watch["interval"]
+
+    async def iter_prompt_tunes(self, filter: Dict[str, Any], page_size: int = 10, prefetch: int = 2,
+                                      order: Order_by = Order_by.Creation_date) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterate over the prompt tunes matching a filter, keeping the next pages in flight while the current one is consumed.
+        Tunes seen on a previous page (the pages can shift during the iteration) are skipped
+
+        :param filter: Filter of the search
+        :param page_size: Number of tunes per request
+        :param prefetch: Number of pages requested ahead
+        :param order: Order of the tunes
+
+        :return: Async iterator over the tunes
+        """
+
+        assert type(page_size) is int and 0 < page_size, f"Expected a positive int for page_size, but got '{page_size}'"
+        assert type(prefetch) is int and 0 <= prefetch, f"Expected a non-negative int for prefetch, but got '{prefetch}'"
+
+        low_level = self._parent.low_level
+
+        def fetch(page: int) -> Future:
+            return ensure_future(low_level.search_prompt_tunes(filter, page * page_size, (page + 1) * page_size, order))
+
+        pending = deque(fetch(page) for page in range(prefetch + 1))
+        next_page = prefetch + 1
+
+        seen = set()
+
+        try:
+            while pending:
+                tunes = _get_tune_items(await pending.popleft())
+
+                if len(tunes) < page_size:
+                    # last page, the pages in flight are past the end
+                    for future in pending:
+                        future.cancel()
+                    pending.clear()
+                else:
+                    pending.append(fetch(next_page))
+                    next_page += 1
+
+                for tune in tunes:
+                    if tune["id"] not in seen:
+                        seen.add(tune["id"])
+                        yield tune
+        finally:
+            for future in pending:
+                future.cancel()
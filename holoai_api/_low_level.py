@@ -4,15 +4,22 @@
 from aiohttp import ClientSession
 from aiohttp.client_reqrep import ClientResponse
 from aiohttp.client_exceptions import ClientConnectionError
+from multidict import CIMultiDict
 
 from re import compile
 from json import dumps, loads
+from time import perf_counter
 
 from holoai_api.HoloAIError import HoloAIError
-from holoai_api.types import Model, Prefix, Order_by, Listing
+from holoai_api.types import Model, Prefix, Order_by, Listing, encode_prefix_header
 from holoai_api.Tokenizer import Tokenizer
+from holoai_api.Preset import PresetSnapshot
+from holoai_api.SchemaValidator import SchemaValidator
+from holoai_api.dataset import encode_dataset
+from holoai_api.Metrics import NULL_TIMER
+from holoai_api.Tracing import start_span
 
-from typing import Union, Dict, Tuple, List, Any, Optional
+from typing import Union, Dict, Tuple, List, Any, Optional, AsyncIterator, Iterable
 
 #=== INTERNALS ===#
 #=== API ===#
@@ -27,6 +34,11 @@ class Low_Level:
         self._parent = parent
         self.is_schema_validation_enabled = True
 
+    def _timer(self, phase: str, endpoint: Optional[str]):
+        metrics = self._parent.metrics
+
+        return NULL_TIMER if metrics is None else metrics.timer(phase, endpoint)
+
     def _treat_response_object(self, rsp: ClientResponse, content: Any, status: int) -> Any:
         # error is an unexpected fail and usually come with a success status
         if type(content) is dict and "error" in content and content["error"] is not None:    # HoloAI REST API error
@@ -41,6 +53,11 @@ class Low_Level:
         else:
             raise HoloAIError(rsp.status, "Unknown error")
 
+    def _validate_response(self, name: str, content: Any):
+        # only responses with a schema are validated
+        if self.is_schema_validation_enabled and SchemaValidator.has_schema(name):
+            SchemaValidator.validate(name, content)
+
     def _treat_response_bool(self, rsp: ClientResponse, content: Any, status: int) -> bool:
         if rsp.status == status:
             return True
@@ -78,8 +95,15 @@ class Low_Level:
 
         return data
 
-    async def _request(self, method: str, url: str, session: ClientSession,
-                             data: Union[Dict[str, Any], str], stream: bool) -> Tuple[ClientResponse, Any]:
+    def _get_request_kwargs(self, data: Any, headers: Optional[Dict[str, str]] = None,
+                                  label: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Arguments of session.request common to every request
+
+        :param data: Data of the request, None for no data. Bytes are pre-serialized JSON
+        :param headers: Headers added to the headers of the API
+        :param label: Endpoint label of the metrics, None if the metrics are disabled
+        """
 
         kwargs = {
             "timeout": self._parent._timeout,
@@ -87,14 +111,69 @@ class Low_Level:
             "headers": self._parent.headers,
         }
 
-        kwargs["json" if type(data) is dict else "data"] = data
+        if data is not None:
+            kwargs["json" if type(data) is dict else "data"] = data
+
+        extra_headers = {}
+        if type(data) is bytes:
+            extra_headers["Content-Type"] = "application/json"
+        if headers is not None:
+            extra_headers.update(headers)
+
+        if extra_headers:
+            kwargs["headers"] = CIMultiDict(self._parent.headers)
+            kwargs["headers"].update(extra_headers)
+
+        if label is not None:
+            kwargs["trace_request_ctx"] = { "endpoint": label }
+
+        return kwargs
+
+    async def _request(self, method: str, url: str, session: ClientSession,
+                             data: Union[Dict[str, Any], str, bytes], stream: bool,
+                             endpoint: Optional[str] = None) -> Tuple[ClientResponse, Any]:
+
+        metrics = self._parent.metrics
+        label = None
+
+        if metrics is not None:
+            label = metrics.get_endpoint_label(endpoint if endpoint is not None else url)
+
+            # serialize here to time the encoding
+            if type(data) is dict:
+                with metrics.timer("encode", label):
+                    data = dumps(data).encode()
+
+            start = perf_counter()
+
+        kwargs = self._get_request_kwargs(data, label = label)
+
+        try:
+            async with session.request(method, url, **kwargs) as rsp:
+                if stream:
+                    async for i in rsp.content.iter_any():
+                        with self._timer("response", label):
+                            content = await self._treat_response_stream(rsp, i)
+
+                        yield (rsp, content)
+                else:
+                    with self._timer("response", label):
+                        content = await self._treat_response(rsp, rsp)
+
+                    # observed before yielding, as the consumer may not resume the generator
+                    if metrics is not None:
+                        metrics.observe("request", label, perf_counter() - start)
 
-        async with session.request(method, url, **kwargs) as rsp:
-            if stream:
-                async for i in rsp.content.iter_any():
-                    yield (rsp, await self._treat_response_stream(rsp, i))
-            else:
-                yield (rsp, await self._treat_response(rsp, rsp))
+                    yield (rsp, content)
+                    return
+
+            if metrics is not None:
+                metrics.observe("request", label, perf_counter() - start)
+        except Exception:
+            if metrics is not None:
+                metrics.count("errors", label)
+
+            raise
 
     async def request_stream(self, method: str, endpoint: str, data: Optional[Union[Dict[str, Any], str]] = None,
                                    stream: bool = True) -> Tuple[ClientResponse, Any]:
@@ -107,18 +186,30 @@ class Low_Level:
         :param stream: Use data streaming for the response
         """
 
-        url = f"{self._parent._BASE_ADDRESS}{endpoint}"
+        url = f"{self._parent.base_address}{endpoint}"
 
         is_sync = self._parent._session is None
-        session = ClientSession() if is_sync else self._parent._session
+        session = self._parent._create_session() if is_sync else self._parent._session
+
+        # held across the yields, so not activated
+        span = start_span("request", activate = False)
+        span.set_attribute("method", method)
+        span.set_attribute("endpoint", endpoint)
 
         try:
-            async for i in self._request(method, url, session, data, stream):
-                yield i
+            async for rsp, content in self._request(method, url, session, data, stream, endpoint):
+                span.set_attribute("status", rsp.status)
+                if rsp.content_length is not None:
+                    span.set_attribute("bytes_in", rsp.content_length)
+
+                yield rsp, content
         except ClientConnectionError as e:      # No internet
+            span.set_attribute("error", str(e))
             raise HoloAIError(e.errno, str(e))
         # TODO: there may be other request errors to catch
         finally:
+            span.end()
+
             if is_sync:
                 await session.close()
 
@@ -131,8 +222,44 @@ class Low_Level:
         :param data: Data to pass to the method if needed
         """
 
-        async for i in self.request_stream(method, endpoint, data, False):
-            return i
+        # closed explicitly, so the session and the span end with the request
+        stream = self.request_stream(method, endpoint, data, False)
+
+        try:
+            async for i in stream:
+                return i
+        finally:
+            await stream.aclose()
+
+    async def request_raw(self, method: str, endpoint: str, data: Optional[Union[Dict[str, Any], str, AsyncIterator[bytes]]] = None,
+                                headers: Optional[Dict[str, str]] = None) -> AsyncIterator[ClientResponse]:
+        """
+        Send request, yielding the response with its content unread, for incremental parsing
+
+        :param method: Method of the request (get, post, delete)
+        :param endpoint: Endpoint of the request
+        :param data: Data to pass to the method if needed. An async iterator is sent as a chunked body
+        :param headers: Headers added to the headers of the API
+        """
+
+        url = f"{self._parent.base_address}{endpoint}"
+
+        is_sync = self._parent._session is None
+        session = self._parent._create_session() if is_sync else self._parent._session
+
+        metrics = self._parent.metrics
+        label = None if metrics is None else metrics.get_endpoint_label(endpoint)
+
+        kwargs = self._get_request_kwargs(data, headers, label)
+
+        try:
+            async with session.request(method, url, **kwargs) as rsp:
+                yield rsp
+        except ClientConnectionError as e:      # No internet
+            raise HoloAIError(e.errno, str(e))
+        finally:
+            if is_sync:
+                await session.close()
 
     async def _get_next_id(self) -> str:
         rsp, content = await self.request("get", "/404")
@@ -162,6 +289,10 @@ class Low_Level:
             if e.status != 404:
                 raise e
 
+            metrics = self._parent.metrics
+            if metrics is not None:
+                metrics.count("retries", metrics.get_endpoint_label(endpoint_with_next))
+
             # failed to retrieve, next_id might be out of date. Refresh id
             self._next_id = await self._get_next_id()
             endpoint_with_next = f"/_next/data/{self._next_id}{endpoint}"
@@ -220,12 +351,14 @@ class Low_Level:
 
         rsp, content = await self.request("post", "/api/srp_init", { "emailAddress": email })
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("srp_init", content)
 
         return content
 
     async def verify_srp_challenge(self, email: str, A: str, M1: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         rsp, content = await self.request("post", "/api/srp_verify", { "emailAddress": email, "A": A, "M1": M1 })
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("srp_verify", content)
 
         return (content, rsp.cookies["session"])
 
@@ -239,12 +372,51 @@ class Low_Level:
     async def get_home(self) -> Dict[str, Any]:
         rsp, content = await self.request_with_next("get", "/home.json")
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("home", content)
 
         return content
 
+    async def iter_home_stories(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the stories of the home page, parsing the response incrementally, so the whole document
+        is never held in memory. Requires the ijson package
+
+        :return: Async iterator over the (raw) stories
+        """
+
+        try:
+            import ijson
+        except ImportError:
+            raise ImportError("iter_home_stories requires the ijson package, install holoai-api[streaming]") from None
+
+        if not hasattr(self, "_next_id"):
+            self._next_id = await self._get_next_id() # get id
+
+        for is_retry in (False, True):
+            request = self.request_raw("get", f"/_next/data/{self._next_id}/home.json")
+
+            try:
+                rsp = await request.__anext__()
+
+                if rsp.status != 200:
+                    # failed to retrieve, next_id might be out of date. Refresh id
+                    if rsp.status == 404 and not is_retry:
+                        self._next_id = await self._get_next_id()
+                        continue
+
+                    self._treat_response_object(rsp, await self._treat_response(rsp, rsp), 200)
+
+                async for story in ijson.items_async(rsp.content, "pageProps.user.stories.item", use_float = True):
+                    yield story
+
+                return
+            finally:
+                await request.aclose()
+
     async def get_story(self, story_id: str) -> Dict[str, Any]:
         rsp, content = await self.request_with_next("get", f"/write/{story_id}.json")
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("story", content)
 
         return content
 
@@ -258,8 +430,17 @@ class Low_Level:
         return content
 
     # TODO: upsert_generation_settings (set story settings)
-    async def upsert_generation_settings(self, story_id: str, settings: Dict[str, Any]) -> Dict[str, Any]:
-        data = { "set_story": { "id": story_id, "settings": settings } }
+    async def upsert_generation_settings(self, story_id: str, settings: Union[Dict[str, Any], PresetSnapshot]) -> Dict[str, Any]:
+        """
+        :param story_id: Id of the story
+        :param settings: Generation settings, or a preset snapshot to use the cached serialized settings of
+        """
+
+        if type(settings) is PresetSnapshot:
+            # splice the cached settings in the body instead of serializing them again
+            data = b''.join((b'{"set_story":{"id":', dumps(story_id).encode(), b',"settings":', settings.settings_json, b'}}'))
+        else:
+            data = { "set_story": { "id": story_id, "settings": settings } }
 
         rsp, content = await self.request("post", "/api/upsert_generation_settings", data)
         self._treat_response_object(rsp, content, 200)
@@ -296,21 +477,29 @@ class Low_Level:
         assert type(model) is Model, f"Expected type 'Model' for model, but got type '{type(model)}'"
         assert module is None or type(module) is str, f"Expected type 'str' or 'None' for module, but got type '{type(module)}'"
 
-        if type(prefix) is str:
-            prefix = Tokenizer.encode(model, prefix)
+        with start_span("draw_completions") as span:
+            with self._timer("tokenize", "/api/draw_completions"):
+                # the prefix is the same for every generation of a story, so its tokens are memoized
+                if type(prefix) is str:
+                    prefix = encode_prefix_header(model, prefix)
 
-        if type(input) is str:
-            input = Tokenizer.encode(model, input)
+                if type(input) is str:
+                    input = Tokenizer.encode(model, input)
 
-        data = {
-            "prefixTokens": prefix,
-            "promptTokens": input,
-            "model_name": model.value,
-            "module_id": module,
-        }
+            span.set_attribute("model", model.value)
+            span.set_attribute("prefix_tokens", len(prefix))
+            span.set_attribute("prompt_tokens", len(input))
 
-        rsp, content = await self.request("post", "/api/draw_completions", data)
-        self._treat_response_object(rsp, content, 200)
+            data = {
+                "prefixTokens": prefix,
+                "promptTokens": input,
+                "model_name": model.value,
+                "module_id": module,
+            }
+
+            rsp, content = await self.request("post", "/api/draw_completions", data)
+            self._treat_response_object(rsp, content, 200)
+            self._validate_response("draw_completions", content)
 
         return content
 
@@ -327,12 +516,14 @@ class Low_Level:
 
         rsp, content = await self.request("post", "/api/search_prompt_tunes", data)
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("search_prompt_tunes", content)
 
         return content
 
     async def read_prompt_tunes(self) -> Dict[str, Any]:
         rsp, content = await self.request("post", "/api/read_prompt_tunes", { })
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("read_prompt_tunes", content)
 
         return content
 
@@ -359,6 +550,36 @@ class Low_Level:
 
         return content
 
+    async def create_prompt_tune_dataset_stream(self, name: str, paths: Iterable[str], compress: bool = False) -> Dict[str, Any]:
+        """
+        Create a dataset from files, reading and encoding them incrementally into a chunked request body,
+        so the dataset is never held in memory
+
+        :param name: Name of the dataset
+        :param paths: Paths of the documents (the filename of a document is the basename of its path)
+        :param compress: Compress the body with gzip
+
+        :return: Created dataset
+        """
+
+        assert type(name) is str, f"Expected type 'str' for name, but got type '{type(name)}'"
+
+        headers = { "Content-Type": "application/json" }
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+
+        request = self.request_raw("post", "/api/create_prompt_tune_dataset", encode_dataset(name, paths, compress), headers)
+
+        try:
+            rsp = await request.__anext__()
+            content = await self._treat_response(rsp, rsp)
+        finally:
+            await request.aclose()
+
+        self._treat_response_object(rsp, content, 200)
+
+        return content
+
     async def read_prompt_tune_datasets(self):
         # why a post request O_o
         rsp, content = await self.request("post", "/api/read_prompt_tune_datasets", { })
@@ -395,12 +616,12 @@ class Low_Level:
                  "datasetId": dataset_id,
                  "description": description,
                  "destroyDataAfterTune": destroy_dataset,
-                 "listed": listing is not self.Listing.Private,
+                 "listed": listing is not Listing.Private,
                  "modelId": model.value,
                  "nsfw": nsfw,
                  "numTrainSteps": steps,
                  "prefix": dumps(prefix_value, separators = (',', ':')),
-                 "public": listing is self.Listing.Public,
+                 "public": listing is Listing.Public,
                  "tags": tags,
                  "title": title
         }
@@ -413,6 +634,7 @@ class Low_Level:
     async def read_prompt_tune(self, tune_id: str) -> Dict[str, Any]:
         rsp, content = await self.request("post", "/api/read_prompt_tune", { "id": tune_id })
         self._treat_response_object(rsp, content, 200)
+        self._validate_response("read_prompt_tune", content)
 
         return content
 
@@ -0,0 +1,255 @@
+# Load test of the API: virtual users going through the usual flow of the client
+# (login, list the stories, open a story, generate, save) against a server, usually the fake server
+# The edit step of the flow is not measured: the edit and save of the story proxy are not implemented yet,
+# so it would only time a local no-op
+#
+# usage: python -m holoai_api.bench --base-url http://127.0.0.1:8080 --users 50 --duration 30
+#        python -m holoai_api.bench --spawn-fake --users 50 --duration 30 --json results.json
+
+from argparse import ArgumentParser
+from asyncio import run, gather, sleep
+from aiohttp import ClientSession, TCPConnector
+from copy import deepcopy
+from json import dumps
+from math import ceil
+from random import Random
+from subprocess import Popen
+from sys import executable
+from time import monotonic, process_time
+
+from holoai_api import HoloAI_API
+from holoai_api.types import Model
+from holoai_api.utils import encrypt_and_format_stories
+
+from typing import Any, Awaitable, Dict, List, Optional, NoReturn
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:     # not available on Windows
+    getrusage = None
+
+_OPERATIONS = ("login", "list_stories", "open_story", "generate", "save")
+
+def get_percentile(values: List[float], percentile: float) -> Optional[float]:
+    """
+    Percentile of a list of values (nearest rank)
+    """
+
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = min(len(values), max(1, ceil(percentile / 100 * len(values)))) - 1
+
+    return values[rank]
+
+def _get_max_rss() -> Optional[int]:
+    """
+    Peak resident memory of the process (in bytes)
+    """
+
+    if getrusage is None:
+        return None
+
+    # kilobytes on Linux
+    return getrusage(RUSAGE_SELF).ru_maxrss * 1024
+
+class _Stats:
+    latencies: Dict[str, List[float]]
+    errors: Dict[str, int]
+    error_samples: Dict[str, str]
+
+    def __init__(self):
+        self.latencies = { op: [] for op in _OPERATIONS }
+        self.errors = { op: 0 for op in _OPERATIONS }
+        self.error_samples = {}
+
+    async def timed(self, op: str, awaitable: Awaitable) -> Any:
+        start = monotonic()
+
+        try:
+            result = await awaitable
+        except Exception as e:
+            self.errors[op] += 1
+            self.error_samples.setdefault(op, f"{type(e).__name__}: {e}")
+
+            raise
+
+        self.latencies[op].append(monotonic() - start)
+
+        return result
+
+async def _save_story(api: HoloAI_API, story: Dict[str, Any], account_key: bytes) -> Dict[str, Any]:
+    story = deepcopy(story)
+    encrypt_and_format_stories(account_key, story)
+
+    return await api.low_level.update_story(story["id"], story)
+
+async def _virtual_user(index: int, args: Any, stats: _Stats, deadline: float) -> NoReturn:
+    rng = Random(index)
+    account_key = None
+    iteration = 0
+
+    async with ClientSession(connector = TCPConnector(limit = args.connections)) as session:
+        api = HoloAI_API(session, base_address = args.base_url)
+        api.timeout = args.timeout
+
+        while monotonic() < deadline and (args.iterations is None or iteration < args.iterations):
+            iteration += 1
+
+            try:
+                if account_key is None:
+                    account_key = await stats.timed("login", api.high_level.login(args.email, args.password))
+
+                stories = await stats.timed("list_stories", api.high_level.get_stories(account_key))
+                if not stories:
+                    await sleep(args.think_time)
+                    continue
+
+                story_id = rng.choice(stories)["id"]
+                story = await stats.timed("open_story", api.high_level.get_story(story_id, account_key))
+
+                # the tokenizer isn't measured here: synthetic tokens, about one per 4 characters of the story
+                text = story["content"]["ct"]["content"]
+                prompt = [rng.randrange(50000) for _ in range(min(len(text) // 4, args.context_tokens))]
+                content = await stats.timed("generate", api.low_level.draw_completions([], prompt, args.model))
+
+                # the generation is appended to the story, so the save sends a changed story
+                story["content"]["ct"]["content"] = text + content["completions"][0]
+                await stats.timed("save", _save_story(api, story, account_key))
+            except Exception:
+                if args.fail_fast:
+                    raise
+
+            if args.think_time:
+                await sleep(args.think_time)
+
+def _report(stats: _Stats, elapsed: float, cpu_time: float, max_rss: Optional[int], users: int) -> Dict[str, Any]:
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    total_errors = sum(stats.errors.values())
+
+    operations = {}
+    for op in _OPERATIONS:
+        latencies = stats.latencies[op]
+        count = len(latencies) + stats.errors[op]
+
+        operations[op] = {
+            "count": len(latencies),
+            "errors": stats.errors[op],
+            "error_rate": (stats.errors[op] / count) if count else 0.0,
+            "throughput": len(latencies) / elapsed,
+            "p50": get_percentile(latencies, 50),
+            "p95": get_percentile(latencies, 95),
+            "p99": get_percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        }
+
+    return {
+        "users": users,
+        "elapsed": elapsed,
+        "operations": operations,
+        "throughput": total / elapsed,
+        "error_rate": total_errors / (total + total_errors) if total + total_errors else 0.0,
+        "error_samples": stats.error_samples,
+        "cpu_time": cpu_time,
+        "cpu_usage": cpu_time / elapsed,
+        "max_rss": max_rss,
+    }
+
+def _print_report(report: Dict[str, Any]) -> NoReturn:
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    print(f"{report['users']} users, {report['elapsed']:.1f}s, {report['throughput']:.1f} op/s, "
+          f"error rate {report['error_rate']:.2%}")
+    print(f"{'operation':<14}{'count':>8}{'errors':>8}{'op/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    for op, stats in report["operations"].items():
+        print(f"{op:<14}{stats['count']:>8}{stats['errors']:>8}{stats['throughput']:>9.1f}"
+              f"{ms(stats['p50']):>10}{ms(stats['p95']):>10}{ms(stats['p99']):>10}")
+
+    for op, error in report["error_samples"].items():
+        print(f"first error of {op}: {error}")
+
+    rss = "-" if report["max_rss"] is None else f"{report['max_rss'] / (1 << 20):.1f} MiB"
+    print(f"client cpu: {report['cpu_time']:.2f}s ({report['cpu_usage']:.0%} of a core), peak rss: {rss}")
+
+async def bench(args: Any) -> Dict[str, Any]:
+    """
+    Run the virtual users and gather their statistics
+    """
+
+    stats = _Stats()
+
+    cpu_start = process_time()
+    start = monotonic()
+
+    await gather(*(_virtual_user(i, args, stats, start + args.duration) for i in range(args.users)))
+
+    elapsed = monotonic() - start
+
+    return _report(stats, elapsed, process_time() - cpu_start, _get_max_rss(), args.users)
+
+async def _wait_reachable(base_url: str, timeout: float) -> NoReturn:
+    deadline = monotonic() + timeout
+
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/404"):
+                    return
+            except OSError:
+                if deadline < monotonic():
+                    raise
+
+                await sleep(0.1)
+
+def main() -> NoReturn:
+    parser = ArgumentParser(description = "Load test of the API with concurrent virtual users. The edit step is not "
+                                          "measured, as the edit and save of the story proxy are not implemented yet")
+    parser.add_argument("--base-url", default = "http://127.0.0.1:8080", help = "Address of the server")
+    parser.add_argument("--email", default = "user@example.com")
+    parser.add_argument("--password", default = "password")
+    parser.add_argument("--users", type = int, default = 10, help = "Number of concurrent virtual users")
+    parser.add_argument("--duration", type = float, default = 10.0, help = "Duration of the test (in seconds)")
+    parser.add_argument("--iterations", type = int, default = None, help = "Maximum number of flows per user")
+    parser.add_argument("--think-time", type = float, default = 0.0, help = "Pause between two flows (in seconds)")
+    parser.add_argument("--context-tokens", type = int, default = 1024, help = "Maximum number of tokens sent per generation")
+    parser.add_argument("--model", type = Model, default = Model.Model_6B, choices = list(Model))
+    parser.add_argument("--connections", type = int, default = 4, help = "Maximum connections per user")
+    parser.add_argument("--timeout", type = int, default = 30, help = "Timeout of a request (in seconds)")
+    parser.add_argument("--fail-fast", action = "store_true", help = "Stop at the first error")
+    parser.add_argument("--json", default = None, help = "Write the report to this file")
+    parser.add_argument("--spawn-fake", action = "store_true",
+                        help = "Start the fake server in a separate process, so it doesn't count in the client cpu")
+    parser.add_argument("--fake-stories", type = int, default = 20)
+    parser.add_argument("--fake-story-size", type = int, default = 4096)
+    parser.add_argument("--fake-latency", type = float, default = 0.0)
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_fake:
+        port = args.base_url.rsplit(":", 1)[-1].strip("/")
+        server = Popen([executable, "-m", "holoai_api.FakeServer", "--port", port,
+                        "--email", args.email, "--password", args.password,
+                        "--stories", str(args.fake_stories), "--story-size", str(args.fake_story_size),
+                        "--latency", str(args.fake_latency)])
+
+    try:
+        if server is not None:
+            run(_wait_reachable(args.base_url, 30))
+
+        report = run(bench(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    _print_report(report)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            f.write(dumps(report, indent = 4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+class LRUCache:
+    """
+    Simple mapping keeping only the most recently used items, bounded by count and/or by total weight
+    """
+
+    _items: "OrderedDict[Hashable, Any]"
+    # items that couldn't be evicted, out of the LRU order until they are used again
+    _pinned: "Dict[Hashable, Any]"
+    _weights: "Dict[Hashable, int]"
+
+    max_size: Optional[int]
+    max_weight: Optional[int]
+    weight: int
+
+    # weight of an item (e.g. its estimated size in bytes)
+    _weigh: Optional[Callable[[Any], int]]
+    # called with (key, value) for each item evicted to respect the bounds
+    _on_evict: Optional[Callable[[Hashable, Any], None]]
+    # called with (key, value) before evicting an item, the item is kept if it returns False
+    _can_evict: Optional[Callable[[Hashable, Any], bool]]
+
+    def __init__(self, max_size: Optional[int] = 128, max_weight: Optional[int] = None,
+                       weigh: Optional[Callable[[Any], int]] = None,
+                       on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+                       can_evict: Optional[Callable[[Hashable, Any], bool]] = None):
+        """
+        :param max_size: Maximum number of items, None for no limit
+        :param max_weight: Maximum total weight of the items, None for no limit
+        :param weigh: Function giving the weight of an item. Required if max_weight is set
+        :param on_evict: Function called on every evicted item
+        :param can_evict: Function telling if an item can be evicted. Items that can't be evicted
+                          are kept, even past the bounds, until they are used again
+        """
+
+        assert max_size is None or (type(max_size) is int and 0 < max_size), f"Expected None or a positive int for max_size, but got '{max_size}'"
+        assert max_weight is None or weigh is not None, "Expected a weigh function for max_weight"
+
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self.weight = 0
+
+        self._weigh = weigh
+        self._on_evict = on_evict
+        self._can_evict = can_evict
+
+        self._items = OrderedDict()
+        self._pinned = {}
+        self._weights = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items or key in self._pinned
+
+    def __len__(self) -> int:
+        return len(self._items) + len(self._pinned)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        yield from self._pinned
+        yield from self._items
+
+    def __getitem__(self, key: Hashable) -> Any:
+        if key in self._pinned:
+            # used again, so it goes back in the LRU order (and can be evicted if it can be by then)
+            value = self._pinned.pop(key)
+            self._items[key] = value
+
+            return value
+
+        value = self._items[key]
+        self._items.move_to_end(key)
+
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.pop(key)
+
+        self._items[key] = value
+
+        if self._weigh is not None:
+            weight = self._weigh(value)
+            self._weights[key] = weight
+            self.weight += weight
+
+        self._evict()
+
+    def __delitem__(self, key: Hashable):
+        if key in self._pinned:
+            del self._pinned[key]
+        else:
+            del self._items[key]
+
+        self.weight -= self._weights.pop(key, 0)
+
+    def _is_over_bounds(self) -> bool:
+        return ((self.max_size is not None and self.max_size < len(self)) or
+                (self.max_weight is not None and self.max_weight < self.weight))
+
+    def _evict(self):
+        # the most recent item is always kept, even if it is heavier than max_weight
+        while 1 < len(self._items) and self._is_over_bounds():
+            key, value = self._items.popitem(last = False)
+
+            if self._can_evict is not None and not self._can_evict(key, value):
+                # out of the LRU order, so it isn't checked again on every insertion
+                self._pinned[key] = value
+                continue
+
+            self.weight -= self._weights.pop(key, 0)
+
+            if self._on_evict is not None:
+                self._on_evict(key, value)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]:
+        if key not in self:
+            return default
+
+        return self[key]
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]:
+        if key not in self:
+            return default
+
+        self.weight -= self._weights.pop(key, 0)
+
+        if key in self._pinned:
+            return self._pinned.pop(key)
+
+        return self._items.pop(key)
+
+    def clear(self):
+        self._items.clear()
+        self._pinned.clear()
+        self._weights.clear()
+        self.weight = 0
@@ -0,0 +1,170 @@
+# Helpers for the prompt tune datasets
+# Documents are read lazily from disk, so datasets larger than the memory can be uploaded
+
+from json import dumps
+from os.path import basename, getsize
+from zlib import compressobj
+
+from holoai_api.types import Model
+from holoai_api.Tokenizer import Tokenizer
+
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+# size of the chunks read from the documents (in characters)
+_READ_CHUNK_SIZE = 1 << 16
+
+def _iter_json_chunks(name: str, paths: Iterable[str]) -> Iterator[str]:
+    """
+    JSON-encode a dataset ({ "name", "documents": [{ "filename", "text" }] }) piece by piece,
+    without holding any document in memory
+    """
+
+    yield f'{{"name":{dumps(name)},"documents":['
+
+    for i, path in enumerate(paths):
+        separator = ',' if i else ''
+        yield f'{separator}{{"filename":{dumps(basename(path))},"text":"'
+
+        with open(path) as f:
+            while True:
+                chunk = f.read(_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                # escaping is per character, so the chunks can be escaped independently
+                yield dumps(chunk)[1:-1]
+
+        yield '"}'
+
+    yield ']}'
+
+async def encode_dataset(name: str, paths: Iterable[str], compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Encode a dataset as a stream of JSON chunks, suitable for a chunked request body
+
+    :param name: Name of the dataset
+    :param paths: Paths of the documents of the dataset
+    :param compress: Compress the body with gzip
+
+    :return: Async iterator over the chunks of the body
+    """
+
+    compressor = compressobj(wbits = 31) if compress else None    # 31 = gzip container
+
+    for chunk in _iter_json_chunks(name, paths):
+        chunk = chunk.encode()
+
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+
+        if chunk:
+            yield chunk
+
+    if compressor is not None:
+        yield compressor.flush()
+
+def split_dataset(paths: Iterable[str], max_size: int) -> List[List[str]]:
+    """
+    Split the documents in groups under a size limit, keeping their order.
+    A document larger than the limit is alone in its group
+
+    :param paths: Paths of the documents
+    :param max_size: Maximum size of a group (in bytes, on disk)
+
+    :return: Groups of paths
+    """
+
+    assert type(max_size) is int and 0 < max_size, f"Expected a positive int for max_size, but got '{max_size}'"
+
+    groups = []
+    group = []
+    group_size = 0
+
+    for path in paths:
+        size = getsize(path)
+
+        if group and max_size < group_size + size:
+            groups.append(group)
+            group = []
+            group_size = 0
+
+        group.append(path)
+        group_size += size
+
+    if group:
+        groups.append(group)
+
+    return groups
+
+def _count_tokens(path: str, model: Model) -> int:
+    """
+    Count the tokens of a document, tokenizing it by pieces cut at line ends, so it's never fully in memory
+    """
+
+    tokens = 0
+    remainder = ""
+
+    with open(path) as f:
+        while True:
+            chunk = f.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            chunk = remainder + chunk
+
+            # keep the last (possibly incomplete) line for the next piece
+            end = chunk.rfind("\n") + 1
+            if end == 0:
+                remainder = chunk
+                continue
+
+            remainder = chunk[end:]
+            tokens += len(Tokenizer.encode(model, chunk[:end]))
+
+    if remainder:
+        tokens += len(Tokenizer.encode(model, remainder))
+
+    return tokens
+
+def estimate_dataset_tokens(paths: Iterable[str], model: Model, index: Optional["DatasetIndex"] = None,
+                            max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Count the tokens of the documents of a dataset locally, tokenizing them in parallel across processes.
+    The documents are cut at line ends, so the count is an estimate of the server's count
+
+    :param paths: Paths of the documents
+    :param model: Model to tokenize for
+    :param index: Index caching the counts by document hash. Unchanged documents aren't tokenized again
+    :param max_workers: Number of processes, None for the number of cores
+
+    :return: { "documents": number of tokens by path, "total": total number of tokens }
+    """
+
+    paths = list(dict.fromkeys(paths))
+    counts = {}
+    hashes = {}
+
+    if index is not None:
+        # hashing is cheap next to the tokenization, so it stays in this process
+        hashes = { path: index.hash_file(path) for path in paths }
+
+        for path, document_hash in hashes.items():
+            tokens = index.get_token_estimate(document_hash, model)
+            if tokens is not None:
+                counts[path] = tokens
+
+    # the processes are only started if some documents need to be tokenized
+    missing = [path for path in paths if path not in counts]
+    if missing:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers) as executor:
+            counts.update(zip(missing, executor.map(_count_tokens, missing, [model] * len(missing))))
+
+        if index is not None:
+            index.set_token_estimates({ hashes[path]: counts[path] for path in missing }, model)
+
+    return {
+        "documents": { path: counts[path] for path in paths },
+        "total": sum(counts.values()),
+    }
@@ -1,18 +1,23 @@
 from holoai_api import HoloAI_API
-from holoai_api.utils import encrypt_user_data, decrypt_user_data, b64_to_tokens
 from holoai_api.types import Model
 from holoai_api.Tokenizer import Tokenizer
 from holoai_api.BanList import BanList
 from holoai_api.BiasGroup import BiasGroup
 from holoai_api.Preset import Preset
 from holoai_api.GlobalSettings import GlobalSettings
+from holoai_api.WorldInfo import WorldInfo
+from holoai_api.cache import LRUCache
+from holoai_api.StoryStore import StoryStore
+from holoai_api.Scheduler import Scheduler, Priority
+from holoai_api.Tracing import start_span
 
 from copy import deepcopy
 from time import time
 from json import loads, dumps
 from enum import Enum, auto
+from asyncio import Task, CancelledError, create_task, shield
 
-from typing import Dict, Iterator, List, NoReturn, Any, Optional, Union, Iterable, Tuple
+from typing import Dict, Iterator, List, NoReturn, Any, Optional, Union, Iterable, Tuple, Set
 
 def _get_time() -> int:
     """
@@ -45,22 +50,52 @@ class Story_DataFragmentOrigin:
     AI = auto()     # generation
     Edit = auto()   # edit by user
 
+# names of the origins in the stored trees
+_ORIGIN_NAMES = {
+    Story_DataFragmentOrigin.Prompt: "prompt",
+    Story_DataFragmentOrigin.AI: "ai",
+    Story_DataFragmentOrigin.Edit: "edit",
+}
+_ORIGINS = { name: origin for origin, name in _ORIGIN_NAMES.items() }
+
 class HoloAI_StoryProxy:
     _parent: "HoloAI_Story"
 
     _api: HoloAI_API
     _story: Dict[str, Any]
 
-    # story tree. As it doesn't exist on the backend, it won't be saved
+    # story tree. As it doesn't exist on the backend, it is only kept in the local store
     _tree: Dict[str, Any]
+    # the tree changed since the story was loaded, or since it was stored
+    _dirty: bool
+
+    # built contexts, by tree position and context settings
+    _context_cache: LRUCache
 
     banlists: List[BanList]
     biases: List[BiasGroup]
-    model: Model
+    # not stored in the story, they must be set before building a context or generating
+    model: Optional[Model]
     preset: Preset
-    prefix: str
+    world_info: WorldInfo
+    prefix: Optional[str]
+    module: Optional[str]
     context_size: int
 
+    # number of characters, from the end of the story, searched for world info keys
+    world_info_search_range: int
+
+    # speculative generation: draw the next completions in the background right after a generation
+    speculative: bool
+    # maximum number of wasted speculative generations, relative to the number of generations
+    speculative_budget: float
+
+    # prefetch key and task of the speculative generation in flight
+    _prefetch: Optional[Tuple[Tuple[Any, ...], Task]]
+    _prefetch_started: bool
+    _generation_count: int
+    _speculative_wasted: int
+
     def _handle_banlist(self, data: Dict[str, Any]) -> NoReturn:
         if "depressedWords" not in data:
             data["depressedWords"] = []
@@ -83,6 +118,12 @@ class HoloAI_StoryProxy:
         self.preset.name = "Preset"
         self.preset.model = self.model
 
+    def _handle_worldinfo(self, data: Dict[str, Any]) -> NoReturn:
+        if "worldInfo" not in data:
+            data["worldInfo"] = []
+
+        self.world_info = WorldInfo.from_data(data["worldInfo"])
+
     def __init__(self, parent: "HoloAI_Story", story: Dict[str, Any]):
         self._parent = parent
 
@@ -91,10 +132,14 @@ class HoloAI_StoryProxy:
 
         data = story["content"]["ct"]
 
-        print(dumps(story, indent = 4))
+        self.model = None
+        self.prefix = None
+        self.module = None
+
         self._handle_banlist(data["depressedWords"])
         self._handle_biasgroups(data["favoredPhrases"])
         self._handle_preset(story)
+        self._handle_worldinfo(data)
 
         self._tree = {
             "fragments": [
@@ -108,19 +153,28 @@ class HoloAI_StoryProxy:
             "path": [0],
             "position": 0,
         }
+        self._dirty = False
+
+        self._context_cache = LRUCache(16)
+
+        self.speculative = False
+        self.speculative_budget = 0.25
+        self._prefetch = None
+        self._prefetch_started = False
+        self._generation_count = 0
+        self._speculative_wasted = 0
 
         # FIXME: variable context size ? From global settings ?
         self.context_size = 2048
+        self.world_info_search_range = 4 * self.context_size
 
         # TODO: remember (memory)
         # TODO: AN (authorsNote)
 
-        # TODO: World Info (worldInfo)
-
     def _create_dataFragment(self, origin: Story_DataFragmentOrigin, content: str, **kwargs) -> NoReturn:
         fragments = self._tree["fragments"]
 
-        path = self._tree["path"][:self._tree["position"]]
+        path = self._tree["path"][:self._tree["position"] + 1]
 
         current_index = path[-1]
         current_fragment = fragments[current_index]
@@ -145,6 +199,32 @@ class HoloAI_StoryProxy:
         path.append(new_index)
         self._tree["path"] = path
         self._tree["position"] = len(path) - 1
+        self._dirty = True
+
+    @property
+    def is_dirty(self) -> bool:
+        """
+        The tree changed since the story was loaded or stored. Evicting a dirty proxy stores its tree
+        """
+
+        return self._dirty
+
+    def _dump_tree(self) -> Dict[str, Any]:
+        fragments = [dict(fragment, origin = _ORIGIN_NAMES[fragment["origin"]]) for fragment in self._tree["fragments"]]
+
+        return { "fragments": fragments, "path": self._tree["path"], "position": self._tree["position"] }
+
+    def _restore_tree(self, tree: Dict[str, Any]) -> bool:
+        fragments = [dict(fragment, origin = _ORIGINS[fragment["origin"]]) for fragment in tree["fragments"]]
+
+        # a tree stored before the story changed on the backend doesn't match it anymore
+        if fragments[0]["content"] != self._tree["fragments"][0]["content"]:
+            return False
+
+        self._tree = { "fragments": fragments, "path": tree["path"], "position": tree["position"] }
+        self._dirty = False
+
+        return True
 
     def get_current_tree(self) -> List[Tuple[int, Dict[str, Any]]]:
         fragments = self._tree["fragments"]
@@ -167,9 +247,51 @@ class HoloAI_StoryProxy:
             else:
                 content[i] = fragment["content"]
 
-        return "".join(*content.items())
+        return "".join(content.values())
+
+    def get_activated_world_info(self) -> List[Tuple[Dict[str, Any], List[Tuple[int, int]]]]:
+        """
+        Get the world info entries activated by the end of the story
+
+        :return: Activated entries with the positions (start, end) of their keys in the story
+        """
+
+        story_content = str(self)
+        search_range = story_content[-self.world_info_search_range:]
+
+        return self.world_info.activate(search_range, len(story_content) - len(search_range))
+
+    def _get_context_key(self) -> Tuple[Any, ...]:
+        # fragments are never modified once created, so the path fully describes the content
+        path = tuple(self._tree["path"][:self._tree["position"] + 1])
+
+        return (path, self.model, self.context_size)
+
+    def _get_prefetch_key(self) -> Tuple[Any, ...]:
+        # the prefix and module don't change the context, but they change the generation
+        return (self._get_context_key(), self.prefix, self.module)
 
     def build_context(self) -> List[int]:
+        """
+        Build the context for the current position in the tree. Contexts are memoized per position,
+        so undo/redo/choose followed by a generation don't need to tokenize again
+
+        :return: Tokens of the context
+        """
+
+        assert self.model is not None, "Expected the model of the story to be set"
+
+        key = self._get_context_key()
+
+        context = self._context_cache.get(key)
+        if context is None:
+            context = self._build_context()
+            self._context_cache[key] = context
+
+        # the cached tokens must not be modified by the caller
+        return list(context["tokens"])
+
+    def _build_context(self) -> Dict[str, List[int]]:
         tokens = []
 
         # TODO: Remember tokens
@@ -203,16 +325,105 @@ class HoloAI_StoryProxy:
         # Internal assert, should never happen
         assert len(tokens) <= self.context_size
 
-        return tokens
+        return {
+            "tokens": tokens,
+            "story": story_tokens,
+        }
+
+    async def _draw_completions(self) -> Dict[str, Any]:
+        assert self.prefix is not None, "Expected the prefix of the story to be set"
 
-    async def generate(self) -> "HoloAI_StoryProxy":
         input = self.build_context()
-        rsp = await self._api.low_level.draw_completions(self.prefix, input, self.model, self.module)
 
-        # FIXME: choose if 2 completions
-        output = rsp["completions"]
+        return await self._api.low_level.draw_completions(self.prefix, input, self.model, self.module)
+
+    def _start_prefetch(self) -> NoReturn:
+        # don't spend more than the budget on speculative generations that end up unused
+        if self.speculative_budget * self._generation_count <= self._speculative_wasted:
+            return
+
+        # the speculation doesn't touch the tree, so it doesn't need to wait for the story's generations
+        key = (self._story["id"], "speculative")
+        job = self._parent.scheduler.run(key, self._speculate, Priority.Background)
+
+        task = create_task(job)
+        self._prefetch = (self._get_prefetch_key(), task)
+        self._prefetch_started = False
+
+    async def _speculate(self) -> Dict[str, Any]:
+        self._prefetch_started = True
+
+        return await self._draw_completions()
+
+    def discard_prefetch(self) -> NoReturn:
+        """
+        Cancel the speculative generation in flight, if any
+        """
+
+        if self._prefetch is None:
+            return
+
+        _, task = self._prefetch
+        self._prefetch = None
+
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()    # retrieve the exception, if any, so it isn't reported as unhandled
+
+        # still waiting for the scheduler, no request was sent
+        if self._prefetch_started:
+            self._speculative_wasted += 1
+
+    async def _consume_prefetch(self) -> Optional[Dict[str, Any]]:
+        if self._prefetch is None:
+            return None
+
+        # waiting for the scheduler behind this generation would deadlock, so only started speculations are used
+        key, task = self._prefetch
+        if key != self._get_prefetch_key() or not self._prefetch_started:
+            self.discard_prefetch()
+            return None
+
+        self._prefetch = None
+
+        try:
+            # shielded, so the cancellation of the caller can be told apart from the one of the speculation
+            return await shield(task)
+        except CancelledError:
+            if task.cancelled():
+                return None
+
+            task.cancel()
+            raise
+        except Exception:
+            # the failed speculation is retried as a regular generation
+            self._speculative_wasted += 1
+            return None
+
+    async def generate(self, priority: Priority = Priority.Interactive) -> "HoloAI_StoryProxy":
+        """
+        Generate the next fragment, going through the scheduler of the parent HoloAI_Story
+
+        :param priority: Priority class of the generation
+        """
+
+        with start_span("generate", { "story": self._story["id"], "priority": priority.name }):
+            await self._parent.scheduler.run(self._story["id"], self._generate, priority)
+
+    async def _generate(self) -> NoReturn:
+        rsp = await self._consume_prefetch()
+        if rsp is None:
+            rsp = await self._draw_completions()
+
+        # FIXME: choose if 2 completions, the first one is kept for now
+        output = rsp["completions"][0]
 
         self._create_dataFragment(Story_DataFragmentOrigin.AI, output)
+        self._generation_count += 1
+
+        if self.speculative:
+            self._start_prefetch()
 
     def edit(self, start: int, end: int, replace: str) -> bool:
         l = 0
@@ -242,6 +453,7 @@ class HoloAI_StoryProxy:
         if len(targets) == 0:
             return False
 
+        self.discard_prefetch()
         self._create_dataFragment(Story_DataFragmentOrigin.Edit, content, targets = targets)
 
         return True
@@ -250,7 +462,9 @@ class HoloAI_StoryProxy:
         if self._tree["position"] == 0:
             return False
 
+        self.discard_prefetch()
         self._tree["position"] -= 1
+        self._dirty = True
 
         return True
 
@@ -258,7 +472,9 @@ class HoloAI_StoryProxy:
         if self._tree["position"] + 1 == len(self._tree["path"]):
             return False
 
+        self.discard_prefetch()
         self._tree["position"] += 1
+        self._dirty = True
 
         return True
 
@@ -273,8 +489,11 @@ class HoloAI_StoryProxy:
         if len(next) <= index:
             return False
 
+        self.discard_prefetch()
+
         path.append(next[index])
         self._tree["path"] = path
+        self._dirty = True
 
         return True
 
@@ -284,39 +503,107 @@ class HoloAI_StoryProxy:
     async def delete(self):
         pass
 
+def _estimate_proxy_size(proxy: HoloAI_StoryProxy) -> int:
+    """
+    Rough size of a proxy, estimated from its story when it is loaded
+    """
+
+    return len(dumps(proxy._story, ensure_ascii = False))
+
 class HoloAI_Story:
-    _story_instances: Dict[str, HoloAI_StoryProxy]
+    # loaded proxies, least recently used first
+    _story_instances: LRUCache
+
+    # ids of the proxies evicted to respect the bounds. They are reloaded when selected again.
+    # The trees of the changed proxies are stored when they are evicted, so nothing is lost
+    _evicted: Set[str]
 
     _api: HoloAI_API
 #    _idstore: Idstore
 
     global_settings: GlobalSettings
+    store: Optional[StoryStore]
+
+    # scheduler of the generations of all the stories
+    scheduler: Scheduler
+
+    def __init__(self, api: HoloAI_API, global_settings: GlobalSettings, store: Optional[StoryStore] = None,
+                       max_loaded: Optional[int] = None, max_loaded_bytes: Optional[int] = None,
+                       max_concurrent_generations: int = 4):
+        """
+        :param api: API used by the stories
+        :param global_settings: Global settings of the stories
+        :param store: Local store used to reload the evicted stories, and to keep their trees
+        :param max_loaded: Maximum number of loaded stories, None for no limit. Without store, stories with
+                           changes are kept past the limit
+        :param max_loaded_bytes: Maximum estimated size of the loaded stories, None for no limit. Without store,
+                                 stories with changes are kept past the limit
+        :param max_concurrent_generations: Maximum number of generations running at once, across all the stories
+        """
 
-    def __init__(self, api: HoloAI_API, global_settings: GlobalSettings):
         self._api = api
 #        self._idstore = Idstore()
 
         self.global_settings = global_settings
+        self.store = store
+        self.scheduler = Scheduler(max_concurrent_generations)
+
+        self._story_instances = LRUCache(max_loaded, max_loaded_bytes, _estimate_proxy_size, self._on_evict, self._can_evict)
+        self._evicted = set()
+
+    def _can_evict(self, story_id: str, proxy: HoloAI_StoryProxy) -> bool:
+        # without store, the tree of a changed proxy would be lost, so it is kept loaded
+        return self.store is not None or not proxy.is_dirty
+
+    def _on_evict(self, story_id: str, proxy: HoloAI_StoryProxy) -> NoReturn:
+        proxy.discard_prefetch()
+
+        if proxy.is_dirty:
+            self.store.set_tree(story_id, proxy._dump_tree())
+            proxy._dirty = False
 
-        self._story_instances = {}
+        self._evicted.add(story_id)
+
+    def _get_loaded(self, story_id: str) -> Optional[HoloAI_StoryProxy]:
+        if story_id in self._story_instances:
+            return self._story_instances[story_id]
+
+        if story_id in self._evicted and self.store is not None:
+            story = self.store.get(story_id)
+            if story is not None:
+                return self.load(story)
+
+        return None
 
     def __iter__(self) -> Iterator[HoloAI_StoryProxy]:
         return self._story_instances.__iter__()
 
     def __getitem__(self, story_id: str) -> HoloAI_StoryProxy:
-        return self._story_instances[story_id]
+        proxy = self._get_loaded(story_id)
+        if proxy is None:
+            raise KeyError(story_id)
+
+        return proxy
 
     def __len__(self) -> int:
         return len(self._story_instances)
 
     def load(self, story: Dict[str, Any]) -> HoloAI_StoryProxy:
         """
-        Load a story proxy from a story object
+        Load a story proxy from a story object. The tree of the story is restored from the store, if it has one
         """
         story_id = story["id"]
 
         proxy = HoloAI_StoryProxy(self, story)
+
+        # the tree stored when the proxy was evicted
+        if self.store is not None:
+            tree = self.store.get_tree(story_id)
+            if tree is not None:
+                proxy._restore_tree(tree)
+
         self._story_instances[story_id] = proxy
+        self._evicted.discard(story_id)
 
         return proxy
 
@@ -324,7 +611,8 @@ class HoloAI_Story:
         loaded = []
 
         for story in stories:
-            if story.get("decrypted"):
+            # the fields of the story are decrypted individually
+            if story.get("content") and story["content"].get("decrypted"):
                 proxy = self.load(story)
                 loaded.append(proxy)
 
@@ -335,6 +623,20 @@ class HoloAI_Story:
 
         return self.loads(stories)
 
+    async def load_from_store(self, store: StoryStore, account_key: Optional[bytes] = None) -> List[HoloAI_StoryProxy]:
+        """
+        Load the stories from a local store
+
+        :param store: Store to load the stories from
+        :param account_key: If provided, sync the store with the account before loading
+        """
+
+        if account_key is not None:
+            await store.sync(self._api, account_key)
+
+        # stories of the store are always decrypted
+        return [self.load(story) for story in store.get_all()]
+
     def create(self) -> HoloAI_StoryProxy:
         raise NotImplementedError()
 
@@ -347,15 +649,37 @@ class HoloAI_Story:
         :return: Story or None if the story does't exist in the handler
         """
 
-        if story_id not in self._story_instances:
-            return None
+        return self._get_loaded(story_id)
+
+    async def rehydrate(self, story_id: str, account_key: bytes) -> Optional[HoloAI_StoryProxy]:
+        """
+        Select a story proxy, reloading it from the store, or from the remote if the store doesn't have it,
+        when it has been evicted
+
+        :param story_id: Id of the selected story
+        :param account_key: Account key, as returned by login
+
+        :return: Story or None if the story does't exist in the handler
+        """
+
+        proxy = self._get_loaded(story_id)
 
-        return self._story_instances[story_id]
+        if proxy is None and story_id in self._evicted:
+            story = await self._api.high_level.get_story(story_id, account_key)
+            proxy = self.load(story)
+
+        return proxy
 
     def unload(self, story_id: str) -> NoReturn:
         """
-        Unload a previously created/loaded story, free'ing the HoloAI_StoryProxy object
+        Unload a previously created/loaded story, free'ing the HoloAI_StoryProxy object and its stored tree
         """
 
-        if story_id in self._story_instances:
-            del self._story_instances[story_id]
\ No newline at end of file
+        proxy = self._story_instances.pop(story_id)
+        if proxy is not None:
+            proxy.discard_prefetch()
+
+        if self.store is not None:
+            self.store.delete_tree(story_id)
+
+        self._evicted.discard(story_id)
\ No newline at end of file
@@ -1,7 +1,9 @@
 from enum import Enum, auto, EnumMeta
 from json import dumps
 
-from typing import Union, Dict, List, Optional, Any
+from holoai_api.cache import LRUCache
+
+from typing import Union, Dict, List, Optional, Any, Tuple
 
 class StrEnum(str, Enum):
     pass
@@ -18,6 +20,42 @@ _DEFAULT_PREFIX_FIELDS = {
     "tags": None,
 }
 
+# prefix headers and their tokens. Tokens are keyed by (model, header), headers by (prefix, metadata, overwrite)
+_prefix_header_cache = LRUCache(256)
+
+def _prefix_fields_key(fields: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Stable key of the fields used by the prefix header, so unrelated metadata doesn't change the key
+    """
+
+    if fields is None:
+        return None
+
+    return dumps({ field: fields[field] for field in _DEFAULT_PREFIX_FIELDS if field in fields },
+                 separators = (',', ':'), sort_keys = True)
+
+def encode_prefix_header(model: "Model", header: str) -> List[int]:
+    """
+    Tokenize a prefix header, memoizing the result as headers are identical across the generations of a story
+
+    :param model: Model to tokenize for
+    :param header: Prefix header, as returned by to_prefix_header
+
+    :return: Tokens of the header
+    """
+
+    # circular import
+    from holoai_api.Tokenizer import Tokenizer
+
+    key = (model, header)
+
+    tokens = _prefix_header_cache.get(key)
+    if tokens is None:
+        tokens = tuple(Tokenizer.encode(model, header))
+        _prefix_header_cache[key] = tokens
+
+    return list(tokens)
+
 class Prefix(Enum):
     Novel = { "prefix_name": "googreads" }
     Fanfic = { "prefix_name": "ao3" }
@@ -30,6 +68,32 @@ class Prefix(Enum):
         assert type(metadata) is dict, f"Expected type 'dict' for metadata, but got type '{type(metadata)}'"
         assert local_overwrite is None or type(local_overwrite) is dict, f"Expected None or type 'dict' for local_overwrite, but got type '{type(local_overwrite)}'"
 
+        key = (self, _prefix_fields_key(metadata), _prefix_fields_key(local_overwrite))
+
+        prefix = _prefix_header_cache.get(key)
+        if prefix is None:
+            prefix = self._build_prefix_header(metadata, local_overwrite)
+            _prefix_header_cache[key] = prefix
+
+        return prefix
+
+    def to_prefix_header_tokens(self, model: "Model", metadata: Dict[str, Any],
+                                      local_overwrite: Optional[Dict[str, Any]] = None) -> Tuple[str, List[int]]:
+        """
+        Get the prefix header and its tokens. Both are memoized
+
+        :param model: Model to tokenize for
+        :param metadata: Metadata of the story
+        :param local_overwrite: Fields overwriting the metadata
+
+        :return: Prefix header and its tokens
+        """
+
+        header = self.to_prefix_header(metadata, local_overwrite)
+
+        return (header, encode_prefix_header(model, header))
+
+    def _build_prefix_header(self, metadata: Dict[str, Any], local_overwrite: Optional[Dict[str, Any]]) -> str:
         prefix = { "source": self.value.get("prefix_name") }
 
         for field in _DEFAULT_PREFIX_FIELDS:
@@ -1,17 +1,38 @@
 from base64 import b64encode, b64decode
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Hash import SHA256
 from functools import partial
 from json import dumps, loads
 
 from holoai_api.types import Model
-from holoai_api.Tokenizer import Tokenizer
-from holoai_api.Preset import Preset
-from holoai_api.BanList import BanList
-from holoai_api.BiasGroup import BiasGroup
+from holoai_api.cache import LRUCache
+from holoai_api.Tracing import start_span
 
-from typing import Dict, Union, List, Tuple, Any, Optional, NoReturn, TypeVar
+from typing import Dict, Union, List, Tuple, Any, Optional, NoReturn, TypeVar, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from holoai_api.Tokenizer import Tokenizer
+    from holoai_api.Preset import Preset
+    from holoai_api.BanList import BanList
+    from holoai_api.BiasGroup import BiasGroup
+
+# names of this namespace only imported on first access (Crypto is imported on first encryption or decryption)
+_LAZY_NAMES = {
+    "Tokenizer": "holoai_api.Tokenizer",
+    "Preset": "holoai_api.Preset",
+    "BanList": "holoai_api.BanList",
+    "BiasGroup": "holoai_api.BiasGroup",
+}
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    from importlib import import_module
+
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+
+    return value
 
 T = TypeVar("T")
 
@@ -25,6 +46,10 @@ class Sjcl_ccm:
         salt = b64decode(content["salt"])
         key_len = content["ks"] // 8
         key_iter = content["iter"]
+
+        from Crypto.Protocol.KDF import PBKDF2
+        from Crypto.Hash import SHA256
+
         return PBKDF2(account_key, salt, key_len, key_iter, hmac_hash_module = SHA256)
 
     # kudos to Schmitty#5079 for coming up with the way to convert iv to nonce (extracted from ccm.js in sjcl)
@@ -49,6 +74,8 @@ class Sjcl_ccm:
         key = cls.get_key(content, account_key)
         nonce = cls.get_nonce_from_iv(content, cipher_len)
 
+        from Crypto.Cipher import AES
+
         aes = AES.new(key, AES.MODE_CCM, nonce = nonce, mac_len = tag_len)
         cleartext = aes.decrypt_and_verify(ciphertext, tag)
 
@@ -68,6 +95,8 @@ class Sjcl_ccm:
         key = cls.get_key(content, account_key)
         nonce = cls.get_nonce_from_iv(content, clear_len)
 
+        from Crypto.Cipher import AES
+
         aes = AES.new(key, AES.MODE_CCM, nonce = nonce, mac_len = tag_len)
         ciphertext, tag = aes.encrypt_and_digest(cleartext)
 
@@ -93,20 +122,23 @@ def decrypt_content(content: Dict[str, Any], account_key: bytes, loads_ct: Optio
     content["decrypted"] = True
 
 def format_and_decrypt_stories(account_key: bytes, *stories: Dict[str, Any]) -> NoReturn:
-    for story in stories:
-        story["genSettings"]["logitBias"] = loads(story["genSettings"]["logitBias"])
+    with start_span("decrypt") as span:
+        span.set_attribute("stories", len(stories))
 
-        for field in ("title", "preview", "content", "description"):
-            if field in story:
-                if not story[field]:
-                    story[field] = None
-                else:
-                    story[field] = loads(story[field])
+        for story in stories:
+            story["genSettings"]["logitBias"] = loads(story["genSettings"]["logitBias"])
 
-                    if type(story[field]) is str:	# safer than checking story["encrypted"]
+            for field in ("title", "preview", "content", "description"):
+                if field in story:
+                    if not story[field]:
+                        story[field] = None
+                    else:
                         story[field] = loads(story[field])
 
-                    decrypt_content(story[field], account_key, (field == "content"))
+                        if type(story[field]) is str:	# safer than checking story["encrypted"]
+                            story[field] = loads(story[field])
+
+                        decrypt_content(story[field], account_key, (field == "content"))
 
 def encrypt_content(content: Dict[str, Any], account_key: bytes) -> NoReturn:
     if content.get("decrypted", False):
@@ -138,12 +170,63 @@ def encrypt_and_format_stories(account_key: bytes, *stories: Dict[str, Any]) ->
 
                     story[field] = dumps(dumps(story[field]))
 
-def build_gen_settings(preset: Preset, banlists: List[BanList], biases: List[BiasGroup]) -> Dict[str, Any]:
+# compiled badWords and logitBias, by model and versions of the banlists and biases. The versions are unique
+# across groups, so the key identifies their content without keeping the groups alive
+_gen_tables_cache = LRUCache(64)
+
+def _get_sequence_text(model: Model, sequence: Union[List[int], str]) -> str:
+    from holoai_api.Tokenizer import Tokenizer
+
+    return sequence if type(sequence) is str else Tokenizer.decode(model, sequence)
+
+def _compile_gen_tables(model: Model, banlists: List["BanList"], biases: List["BiasGroup"]) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    key = (model,
+           tuple(banlist.version for banlist in banlists),
+           tuple(bias.version for bias in biases))
+
+    tables = _gen_tables_cache.get(key)
+    if tables is None:
+        # sequences are merged by their tokens, so a text and its tokens are a single entry
+        bad_words = {}
+        for banlist in banlists:
+            if banlist.enabled:
+                for tokens, sequence in banlist.get_tokenized_table(model).items():
+                    bad_words.setdefault(tokens, sequence)
+
+        # conflicting biases on the same tokens are resolved by the last group
+        logit_bias = {}
+        for bias in biases:
+            if bias.enabled:
+                for tokens, sequence in bias.get_tokenized_table(model).items():
+                    text = logit_bias[tokens][0] if tokens in logit_bias else sequence
+                    logit_bias[tokens] = (text, { "bias": bias.strength, "rep_pen_multiplier": bias.rep_pen })
+
+        tables = ([_get_sequence_text(model, sequence) for sequence in bad_words.values()],
+                  { _get_sequence_text(model, text): value for text, value in logit_bias.values() })
+        _gen_tables_cache[key] = tables
+
+    return tables
+
+def build_gen_settings(preset: "Preset", banlists: List["BanList"], biases: List["BiasGroup"],
+                       model: Optional[Model] = None) -> Dict[str, Any]:
+    """
+    Build the generation settings of a preset, with the enabled banlists and biases
+
+    :param preset: Preset of the generation
+    :param banlists: Banlists of the generation
+    :param biases: Biases of the generation
+    :param model: Model the sequences are tokenized for. Default to the model of the preset
+    """
+
+    model = preset.model if model is None else model
+    assert model is not None, "Expected a model to tokenize the banlists and biases for"
+
     settings = preset.to_settings()
 
-    # TODO: support tokens ?
-    settings["badWords"] = [b for banlist in banlists for b in banlist if type(b) is str]
-    settings["logitBias"] = { b["value"]: { "bias": b["strength"], "rep_pen_multiplier": b["rep_pen"] }
-                                for bias in biases for b in bias if type(b["value"]) is str }
+    bad_words, logit_bias = _compile_gen_tables(model, banlists, biases)
+
+    # the cached tables must not be modified through the settings
+    settings["badWords"] = list(bad_words)
+    settings["logitBias"] = { value: dict(bias) for value, bias in logit_bias.items() }
 
     return settings
\ No newline at end of file
@@ -32,5 +32,9 @@ setuptools.setup(
 		"aiohttp",
         "jsonschema",
         "requests"
-	]
+	],
+    extras_require = {
+        # incremental parsing of the home page (Low_Level.iter_home_stories)
+        "streaming": [ "ijson" ],
+    }
 )
@@ -0,0 +1,32 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.bench import bench, get_percentile
+from holoai_api.FakeServer import FakeServer
+from holoai_api.types import Model
+
+from types import SimpleNamespace
+
+def test_percentile():
+    values = list(range(1, 101))
+
+    assert get_percentile(values, 50) == 50
+    assert get_percentile(values, 99) == 99
+    assert get_percentile([3.0], 95) == 3.0
+    assert get_percentile([], 50) is None
+
+async def test_bench_flow():
+    async with FakeServer() as server:
+        server.add_account("user@example.com", "password", stories = 2)
+
+        args = SimpleNamespace(base_url = server.address, email = "user@example.com", password = "password",
+                               users = 2, duration = 30.0, iterations = 2, think_time = 0.0, context_tokens = 64,
+                               model = Model.Model_6B, connections = 2, timeout = 30, fail_fast = True)
+
+        report = await bench(args)
+
+    assert report["error_rate"] == 0.0
+    assert report["operations"]["login"]["count"] == 2
+    assert all(report["operations"][op]["count"] == 4 for op in ("list_stories", "open_story", "generate", "save"))
@@ -0,0 +1,56 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.cache import LRUCache
+
+def test_least_recently_used_items_are_evicted():
+    evicted = []
+    cache = LRUCache(2, on_evict = lambda key, value: evicted.append(key))
+
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+
+    cache["c"] = 3
+    assert list(cache) == ["a", "c"]
+    assert evicted == ["b"]
+
+def test_weight_bound_keeps_the_most_recent_item():
+    cache = LRUCache(None, 10, len)
+
+    cache["a"] = "x" * 4
+    cache["b"] = "x" * 4
+    assert cache.weight == 8
+
+    cache["c"] = "x" * 20
+    assert list(cache) == ["c"] and cache.weight == 20
+
+    cache.pop("c")
+    assert len(cache) == 0 and cache.weight == 0
+
+def test_items_that_cannot_be_evicted_are_set_aside():
+    checked = []
+
+    def can_evict(key, value):
+        checked.append(key)
+        return key != "pinned"
+
+    cache = LRUCache(2, can_evict = can_evict)
+
+    cache["pinned"] = 1
+    cache["a"] = 2
+    cache["b"] = 3
+    cache["c"] = 4
+
+    # the pinned item is only checked once, then kept out of the LRU order
+    assert checked == ["pinned", "a", "b"]
+    assert sorted(cache) == ["c", "pinned"] and len(cache) == 2
+
+    # used again, it can be evicted again
+    assert cache["pinned"] == 1
+    cache["d"] = 5
+    assert checked[-1] == "c"
+    assert "pinned" in cache and cache.pop("pinned") == 1
+    assert list(cache) == ["d"]
@@ -0,0 +1,54 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+import holoai_api.dataset as dataset
+from holoai_api.dataset import estimate_dataset_tokens, encode_dataset
+from holoai_api.DatasetIndex import DatasetIndex
+from holoai_api.types import Model
+
+from json import loads
+from zlib import decompress
+
+def _write_documents(tmp_path, *texts):
+    paths = []
+
+    for i, text in enumerate(texts):
+        document = tmp_path / f"{i}.txt"
+        document.write_text(text)
+        paths.append(str(document))
+
+    return paths
+
+def test_estimate_uses_the_index_without_processes(tmp_path, monkeypatch):
+    paths = _write_documents(tmp_path, "first document\n", "second document\n")
+
+    with DatasetIndex(str(tmp_path / "index.db")) as index:
+        index.set_token_estimates({ index.hash_file(paths[0]): 3, index.hash_file(paths[1]): 4 }, Model.Model_20B)
+
+        # everything is in the index: nothing is tokenized, and no process is started
+        def fail(*args, **kwargs):
+            raise AssertionError("Expected no tokenization")
+
+        monkeypatch.setattr(dataset, "_count_tokens", fail)
+        monkeypatch.setattr("concurrent.futures.ProcessPoolExecutor", fail)
+
+        estimate = estimate_dataset_tokens(paths, Model.Model_20B, index)
+
+    assert estimate == { "documents": { paths[0]: 3, paths[1]: 4 }, "total": 7 }
+
+async def test_encoded_dataset_round_trip(tmp_path):
+    # larger than a read chunk, with characters that must be escaped
+    texts = ['"quoted" \\ back\tslash \u00e9\u4e16\U0001f600\n' * 5000, ""]
+    paths = _write_documents(tmp_path, *texts)
+
+    for compress in (False, True):
+        body = b"".join([chunk async for chunk in encode_dataset("name", paths, compress)])
+        if compress:
+            body = decompress(body, wbits = 31)
+
+        assert loads(body) == {
+            "name": "name",
+            "documents": [{ "filename": "0.txt", "text": texts[0] }, { "filename": "1.txt", "text": "" }],
+        }
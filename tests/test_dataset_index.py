@@ -0,0 +1,55 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.DatasetIndex import DatasetIndex
+from holoai_api.types import Model
+
+def test_hash_is_newline_agnostic(tmp_path):
+    document = tmp_path / "a.txt"
+    document.write_bytes(b"line 1\r\nline 2\r\n")
+
+    assert DatasetIndex.hash_text("line 1\nline 2\n") == DatasetIndex.hash_text("line 1\r\nline 2\r\n")
+    assert DatasetIndex.hash_file(str(document)) == DatasetIndex.hash_text("line 1\nline 2\n")
+
+def test_find_dataset_hit_and_miss(tmp_path):
+    hashes = [DatasetIndex.hash_text("a"), DatasetIndex.hash_text("b")]
+    dataset = { "id": "1", "name": "test", "documents": [{ "filename": "a.txt", "tokensLength": 10 },
+                                                          { "filename": "b.txt", "tokensLength": 20 }] }
+
+    with DatasetIndex(str(tmp_path / "index.db")) as index:
+        assert index.find_dataset(hashes) is None
+
+        index.add_dataset(dataset, hashes)
+
+        # same set of documents, in any order
+        found = index.find_dataset(hashes[::-1])
+        assert found == dataset
+
+        assert index.find_dataset(hashes[:1]) is None
+        assert index.find_dataset(hashes + [DatasetIndex.hash_text("c")]) is None
+
+        index.remove_dataset("1")
+        assert index.find_dataset(hashes) is None
+
+def test_unknown_token_length_is_a_miss(tmp_path):
+    hashes = [DatasetIndex.hash_text("a")]
+
+    with DatasetIndex(str(tmp_path / "index.db")) as index:
+        index.add_dataset({ "id": "1" }, hashes, "test", ["a.txt"])
+        assert index.find_dataset(hashes) is None
+
+        # the lengths are filled in later (e.g. on refresh)
+        index.add_dataset({ "id": "1", "documents": [{ "filename": "a.txt", "tokensLength": 5 }] }, hashes)
+        assert index.find_dataset(hashes)["documents"] == [{ "filename": "a.txt", "tokensLength": 5 }]
+
+def test_token_estimates(tmp_path):
+    document_hash = DatasetIndex.hash_text("a")
+
+    with DatasetIndex(str(tmp_path / "index.db")) as index:
+        assert index.get_token_estimate(document_hash, Model.Model_20B) is None
+
+        index.set_token_estimates({ document_hash: 42 }, Model.Model_20B)
+        assert index.get_token_estimate(document_hash, Model.Model_20B) == 42
+        assert index.get_token_estimate(document_hash, Model.Model_6B) is None
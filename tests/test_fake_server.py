@@ -0,0 +1,205 @@
+# Run the API against the bundled fake server, without credentials or network access
+
+from sys import path, modules
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api import HoloAI_API
+from holoai_api.HoloAIError import HoloAIError
+from holoai_api.FakeServer import FakeServer, generate_story
+from holoai_api.StoryStore import StoryStore
+from holoai_api.types import Model, Prefix, Listing
+import holoai_api._high_level as high_level
+
+from aiohttp import ClientSession
+
+import asyncio
+
+async def test_login_and_stories():
+    async with FakeServer() as server:
+        account = server.add_account("user@example.com", "password", stories = 3)
+
+        async with ClientSession() as session:
+            api = HoloAI_API(session, base_address = server.address)
+
+            account_key = await api.high_level.login("user@example.com", "password")
+            assert account_key == account["account_key"]
+
+            stories = await api.high_level.get_stories(account_key)
+            assert len(stories) == 3
+            assert all(story["content"]["decrypted"] for story in stories)
+
+            story = await api.high_level.get_story(stories[0]["id"], account_key)
+            assert story["content"]["ct"] == stories[0]["content"]["ct"]
+
+async def test_story_store_sync(tmp_path):
+    async with FakeServer() as server:
+        account = server.add_account("user@example.com", "password", stories = 3)
+        first, second, third = account["stories"]
+
+        api = HoloAI_API(base_address = server.address)
+        account_key = await api.high_level.login("user@example.com", "password")
+
+        with StoryStore(str(tmp_path / "stories.db")) as store:
+            updated, deleted = await store.sync(api, account_key)
+            assert sorted(updated) == sorted(account["stories"]) and deleted == []
+
+            # nothing changed, nothing is fetched
+            assert await store.sync(api, account_key) == ([], [])
+
+            story = generate_story(account_key, 64, first, iterations = 1)
+            story["lastUpdatedAt"] = account["stories"][first]["lastUpdatedAt"] + 1
+            account["stories"][first] = story
+            del account["stories"][second]
+
+            assert await store.sync(api, account_key) == ([first], [second])
+            assert sorted(store) == sorted([first, third])
+            assert store.get_raw(first) == story
+            assert store.get(first)["content"]["decrypted"]
+
+            stories = await api.high_level.get_stories(account_key, store)
+            assert sorted(story["id"] for story in stories) == sorted([first, third])
+
+async def test_generation_errors():
+    async with FakeServer() as server:
+        server.add_account("user@example.com", "password")
+
+        api = HoloAI_API(base_address = server.address)
+        await api.high_level.login("user@example.com", "password")
+
+        content = await api.low_level.draw_completions([1, 2], [3, 4], Model.Model_6B)
+        assert len(content["completions"]) == 2
+
+        server.inject_error("/api/draw_completions", 503)
+
+        try:
+            await api.low_level.draw_completions([1, 2], [3, 4], Model.Model_6B)
+        except HoloAIError as e:
+            assert e.status == 503
+        else:
+            assert False, "Expected the injected error"
+
+async def test_home_stories_streaming(monkeypatch):
+    async with FakeServer() as server:
+        server.add_account("user@example.com", "password", stories = 3)
+
+        api = HoloAI_API(base_address = server.address)
+        await api.high_level.login("user@example.com", "password")
+
+        home = await api.low_level.get_home()
+        streamed = [story async for story in api.low_level.iter_home_stories()]
+        assert streamed == home["pageProps"]["user"]["stories"]
+
+        # without the optional dependency, the error tells what to install
+        monkeypatch.setitem(modules, "ijson", None)
+        try:
+            await api.low_level.iter_home_stories().__anext__()
+        except ImportError as e:
+            assert "ijson" in str(e)
+        else:
+            assert False, "Expected an ImportError"
+
+async def _create_tune(api, tmp_path, title, steps = 5, listing = Listing.Private):
+    document = tmp_path / f"{title}.txt"
+    document.write_text("some text")
+
+    dataset, = await api.high_level.upload_dataset_files(title, [str(document)])
+    tune = await api.low_level.create_prompt_tune([steps], dataset["id"], "", True, listing, Model.Model_6B,
+                                                  False, steps, Prefix.Generic, [], title)
+
+    return tune["data"]
+
+async def test_watch_prompt_tunes(tmp_path, monkeypatch):
+    monkeypatch.setattr(high_level, "_TUNE_QUEUED_INTERVAL", 0.01)
+    monkeypatch.setattr(high_level, "_TUNE_TRAINING_MIN_INTERVAL", 0.01)
+
+    async with FakeServer(tune_queue_time = 0.05, tune_step_time = 0.02) as server:
+        server.add_account("user@example.com", "password")
+
+        api = HoloAI_API(base_address = server.address)
+        await api.high_level.login("user@example.com", "password")
+
+        first = await _create_tune(api, tmp_path, "first")
+        second = await _create_tune(api, tmp_path, "second", steps = 3)
+
+        # never more than one request in flight per tune
+        in_flight = {}
+        read_prompt_tune = api.low_level.read_prompt_tune
+
+        async def count_reads(tune_id):
+            in_flight[tune_id] = in_flight.get(tune_id, 0) + 1
+            assert in_flight[tune_id] == 1, "Expected the watchers to share the requests"
+
+            try:
+                return await read_prompt_tune(tune_id)
+            finally:
+                in_flight[tune_id] -= 1
+
+        monkeypatch.setattr(api.low_level, "read_prompt_tune", count_reads)
+
+        async def watch(tune_ids):
+            return [event async for event in api.high_level.watch_prompt_tunes(tune_ids)]
+
+        events, other_events = await asyncio.gather(watch([first["id"], second["id"]]), watch([first["id"]]))
+
+        for tune in (first, second):
+            tune_events = [event for event in events if event["id"] == tune["id"]]
+            states = [event["state"] for event in tune_events]
+            steps = [event["step"] for event in tune_events if event["state"] == "training"]
+
+            assert states[0] == "queued" and states[-1] == "finished"
+            assert states.index("finished") == len(states) - 1
+            assert steps == sorted(steps) and len(set(steps)) == len(steps)
+
+        assert other_events[-1]["state"] == "finished"
+        assert api.high_level._tune_polls == {}
+
+async def test_iter_prompt_tunes(tmp_path):
+    async with FakeServer() as server:
+        server.add_account("user@example.com", "password")
+
+        api = HoloAI_API(base_address = server.address)
+        await api.high_level.login("user@example.com", "password")
+
+        tunes = [await _create_tune(api, tmp_path, f"tune {i}", listing = Listing.Public) for i in range(7)]
+        await _create_tune(api, tmp_path, "private")
+
+        expected = [tune["id"] for tune in sorted(tunes, key = lambda tune: tune["createdAt"], reverse = True)]
+
+        for page_size, prefetch in ((3, 0), (3, 2), (7, 1), (10, 2)):
+            iterated = [tune["id"] async for tune in api.high_level.iter_prompt_tunes({}, page_size, prefetch)]
+            assert sorted(iterated) == sorted(expected)
+
+        # a tune created during the iteration shifts the next pages, the shifted tunes aren't repeated
+        iterated = []
+        async for tune in api.high_level.iter_prompt_tunes({}, 3, 0):
+            if len(iterated) == 0:
+                await _create_tune(api, tmp_path, "new", listing = Listing.Public)
+
+            iterated.append(tune["id"])
+
+        assert sorted(iterated) == sorted(expected)
+
+async def test_dataset_upload_streaming(tmp_path):
+    documents = []
+    for i, words in enumerate((3, 5, 7)):
+        document = tmp_path / f"{i}.txt"
+        document.write_text(" ".join(["w\u00e9rd"] * words) + "\n")
+        documents.append(str(document))
+
+    async with FakeServer() as server:
+        server.add_account("user@example.com", "password")
+
+        api = HoloAI_API(base_address = server.address)
+        await api.high_level.login("user@example.com", "password")
+
+        # any two documents are larger than max_size, so each one is uploaded as its own dataset
+        datasets = await api.high_level.upload_dataset_files("data", documents, max_size = 30, compress = True)
+
+        assert [dataset["name"] for dataset in datasets] == ["data (1/3)", "data (2/3)", "data (3/3)"]
+        assert [dataset["documents"] for dataset in datasets] == [[{ "filename": f"{i}.txt", "tokensLength": words }]
+                                                                  for i, words in enumerate((3, 5, 7))]
+
+        stored = (await api.low_level.read_prompt_tune_datasets())["data"]
+        assert sorted(dataset["id"] for dataset in stored) == sorted(dataset["id"] for dataset in datasets)
@@ -0,0 +1,128 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.utils import build_gen_settings, _gen_tables_cache
+from holoai_api.Preset import Preset
+from holoai_api.BanList import BanList
+from holoai_api.BiasGroup import BiasGroup
+from holoai_api.Tokenizer import Tokenizer
+from holoai_api.types import Model
+
+from gc import collect
+from weakref import ref
+
+import pytest
+
+@pytest.fixture(autouse = True)
+def encoded(monkeypatch):
+    """
+    Character tokenizer, recording the encoded texts
+    """
+
+    encoded = []
+
+    def encode(model, text):
+        encoded.append(text)
+        return [ord(c) for c in text]
+
+    monkeypatch.setattr(Tokenizer, "encode", encode)
+    monkeypatch.setattr(Tokenizer, "decode", lambda model, tokens: "".join(chr(t) for t in tokens))
+
+    _gen_tables_cache.clear()
+
+    return encoded
+
+def _build(banlists, biases):
+    return build_gen_settings(Preset("test", Model.Model_6B, { "temperature": 0.7 }), banlists, biases)
+
+def test_tables_follow_the_changes_of_the_groups():
+    banlist = BanList("foo")
+    bias = BiasGroup(1.0).add("bar")
+
+    settings = _build([banlist], [bias])
+    assert settings["badWords"] == ["foo"]
+    assert settings["logitBias"] == { "bar": { "bias": 1.0, "rep_pen_multiplier": 1.0 } }
+
+    bias.strength = -5
+    bias.rep_pen = 2.0
+    assert _build([banlist], [bias])["logitBias"] == { "bar": { "bias": -5, "rep_pen_multiplier": 2.0 } }
+
+    bias.add("baz")
+    banlist += "qux"
+    settings = _build([banlist], [bias])
+    assert settings["badWords"] == ["foo", "qux"]
+    assert list(settings["logitBias"]) == ["bar", "baz"]
+
+def test_sequences_are_tokenized_once_per_model(encoded):
+    banlist = BanList("foo", "bar")
+    bias = BiasGroup(1.0).add("baz")
+
+    _build([banlist], [bias])
+    assert sorted(encoded) == ["bar", "baz", "foo"]
+
+    # changes that don't touch the sequences don't tokenize again
+    bias.strength = 2.0
+    banlist.enabled = False
+    banlist.enabled = True
+    _build([banlist], [bias])
+    assert len(encoded) == 3
+
+    banlist.get_tokenized_banlist(Model.Model_20B)
+    assert len(encoded) == 5
+
+    banlist += "qux"
+    assert banlist.get_tokenized_banlist(Model.Model_6B) == (tuple(b"foo"), tuple(b"bar"), tuple(b"qux"))
+    assert len(encoded) == 8
+
+def test_sequences_are_merged_by_tokens():
+    banlist = BanList("foo", [ord(c) for c in "foo"], [ord(c) for c in "bar"])
+    first = BiasGroup(1.0).add("baz", [ord(c) for c in "qux"])
+    second = BiasGroup(-1.0, 2.0).add([ord(c) for c in "baz"])
+
+    settings = _build([banlist, BanList("bar")], [first, second])
+
+    # token sequences are kept, and duplicates (as text or tokens) are merged
+    assert settings["badWords"] == ["foo", "bar"]
+
+    # the last group wins
+    assert settings["logitBias"] == { "baz": { "bias": -1.0, "rep_pen_multiplier": 2.0 },
+                                      "qux": { "bias": 1.0, "rep_pen_multiplier": 1.0 } }
+
+def test_disabled_groups_are_skipped():
+    banlist = BanList("foo")
+    other = BanList("bar")
+    bias = BiasGroup(1.0).add("baz")
+
+    assert _build([banlist, other], [bias])["badWords"] == ["foo", "bar"]
+
+    banlist.enabled = False
+    bias.enabled = False
+    settings = _build([banlist, other], [bias])
+    assert settings["badWords"] == ["bar"] and settings["logitBias"] == {}
+
+    bias.enabled = True
+    assert list(_build([banlist, other], [bias])["logitBias"]) == ["baz"]
+
+def test_settings_do_not_alias_the_cached_tables():
+    banlist = BanList("foo")
+    bias = BiasGroup(1.0).add("bar")
+
+    settings = _build([banlist], [bias])
+    settings["badWords"].append("oops")
+    settings["logitBias"]["bar"]["bias"] = 0
+
+    settings = _build([banlist], [bias])
+    assert settings["badWords"] == ["foo"]
+    assert settings["logitBias"]["bar"]["bias"] == 1.0
+
+def test_cache_does_not_keep_the_groups_alive():
+    bias = BiasGroup(1.0).add("bar")
+    _build([], [bias])
+
+    bias_ref = ref(bias)
+    del bias
+    collect()
+
+    assert bias_ref() is None
@@ -0,0 +1,36 @@
+from sys import path, executable
+from os.path import join, abspath, dirname
+from subprocess import run
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+_ROOT = abspath(join(dirname(__file__), '..'))
+
+def _imported_modules(statement: str, *names: str) -> list:
+    script = f"from sys import modules\n{statement}\nprint(','.join(name for name in {names!r} if name in modules))"
+    result = run([executable, "-c", script], cwd = _ROOT, capture_output = True, text = True)
+    assert result.returncode == 0, result.stderr
+
+    return [name for name in result.stdout.splitlines()[-1].split(",") if name]
+
+def test_package_import_is_lazy():
+    assert _imported_modules("import holoai_api", "aiohttp", "Crypto", "jsonschema", "transformers") == []
+    assert _imported_modules("import holoai_api.utils", "aiohttp", "Crypto", "jsonschema", "transformers") == []
+
+def test_client_import_defers_crypto_and_schemas():
+    assert _imported_modules("from holoai_api import HoloAI_API", "Crypto", "jsonschema", "transformers") == []
+
+def test_lazy_names_resolve():
+    statement = "import holoai_api.HoloAI_API\n" \
+                "from holoai_api import HoloAI_API, HoloAIError\n" \
+                "from holoai_api.utils import Preset\n" \
+                "assert isinstance(HoloAI_API, type) and issubclass(HoloAIError, Exception)\n" \
+                "assert Preset.__module__ == 'holoai_api.Preset'"
+
+    assert _imported_modules(statement) == []
+
+def test_decryption_imports_crypto_on_first_use():
+    statement = "from holoai_api.utils import Sjcl_ccm\n" \
+                "Sjcl_ccm.get_key({ 'salt': '', 'ks': 128, 'iter': 1 }, b'key')"
+
+    assert _imported_modules(statement, "Crypto") == ["Crypto"]
@@ -0,0 +1,29 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.Metrics import Metrics
+
+def test_metrics_export():
+    metrics = Metrics(buckets = (0.1, 1.0))
+
+    label = Metrics.get_endpoint_label("/_next/data/abc123/write/xyz.json")
+    assert label == "/_next/data/write/{id}.json"
+
+    metrics.observe("request", label, 0.05)
+    metrics.observe("request", label, 0.5)
+    metrics.observe("request", label, 5)
+    metrics.count("bytes_in", label, 128)
+    metrics.count("bytes_in", label, 64)
+
+    content = metrics.to_dict()
+    histogram = content["latency"]["request"][label]
+
+    assert histogram["count"] == 3
+    assert histogram["buckets"] == { "0.1": 1, "1.0": 2 }
+    assert content["counters"]["bytes_in"][label] == 192
+
+    text = metrics.to_prometheus()
+    assert 'holoai_request_phase_seconds_bucket{phase="request",endpoint="/_next/data/write/{id}.json",le="+Inf"} 3' in text
+    assert 'holoai_bytes_in_total{endpoint="/_next/data/write/{id}.json"} 192' in text
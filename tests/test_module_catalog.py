@@ -0,0 +1,41 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.ModuleCatalog import ModuleCatalog
+
+from types import SimpleNamespace
+
+def _make_api(public, owned):
+    async def iter_prompt_tunes(filter, page_size, prefetch, order_by):
+        for module in sorted(public, key = lambda module: module["createdAt"], reverse = True):
+            yield module
+
+    async def read_prompt_tunes():
+        return { "data": list(owned) }
+
+    return SimpleNamespace(high_level = SimpleNamespace(iter_prompt_tunes = iter_prompt_tunes),
+                           low_level = SimpleNamespace(read_prompt_tunes = read_prompt_tunes))
+
+def _module(module_id, created_at, tags = ()):
+    return { "id": module_id, "createdAt": created_at, "modelId": "model", "tags": list(tags) }
+
+async def test_full_refresh_prunes_the_deleted_modules():
+    public = [_module("a", 1, ["x"]), _module("b", 2, ["x"])]
+    owned = [_module("c", 3)]
+
+    catalog = ModuleCatalog(_make_api(public, owned))
+    await catalog.refresh(full = True)
+    assert {module["id"] for module in catalog} == {"a", "b", "c"}
+
+    public.pop(0)
+    owned.clear()
+
+    # an incremental refresh only pulls the new modules
+    await catalog.refresh()
+    assert "a" in catalog and "c" in catalog
+
+    await catalog.refresh(full = True)
+    assert {module["id"] for module in catalog} == {"b"}
+    assert [module["id"] for module in catalog.get_by_tag("x")] == ["b"]
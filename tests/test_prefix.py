@@ -0,0 +1,55 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+import holoai_api.types as types
+from holoai_api.types import Prefix, Model, encode_prefix_header
+from holoai_api.Tokenizer import Tokenizer
+from holoai_api.cache import LRUCache
+
+from json import loads
+
+def test_prefix_headers_are_memoized(monkeypatch):
+    monkeypatch.setattr(types, "_prefix_header_cache", LRUCache(256))
+
+    built = []
+    build_prefix_header = Prefix._build_prefix_header
+
+    def count_builds(self, metadata, local_overwrite):
+        built.append(self)
+        return build_prefix_header(self, metadata, local_overwrite)
+
+    monkeypatch.setattr(Prefix, "_build_prefix_header", count_builds)
+
+    header = Prefix.Novel.to_prefix_header({ "tags": ["a"], "title": "first" })
+    assert loads(header)["tags"] == ["a"]
+
+    # fields that aren't in the header don't matter
+    assert Prefix.Novel.to_prefix_header({ "tags": ["a"], "title": "second" }) == header
+    assert len(built) == 1
+
+    assert loads(Prefix.Novel.to_prefix_header({ "tags": ["a"] }, { "tags": ["b"] }))["tags"] == ["b"]
+    assert Prefix.Fanfic.to_prefix_header({ "tags": ["a"] }) != header
+    assert len(built) == 3
+
+def test_prefix_tokens_are_memoized(monkeypatch):
+    monkeypatch.setattr(types, "_prefix_header_cache", LRUCache(256))
+
+    encoded = []
+
+    def encode(model, header):
+        encoded.append((model, header))
+        return [len(encoded)]
+
+    monkeypatch.setattr(Tokenizer, "encode", encode)
+
+    tokens = encode_prefix_header(Model.Model_6B, "header")
+    assert tokens == [1]
+
+    # the memoized tokens are not shared with the caller
+    tokens.append(0)
+    assert encode_prefix_header(Model.Model_6B, "header") == [1]
+
+    assert encode_prefix_header(Model.Model_20B, "header") == [2]
+    assert len(encoded) == 2
@@ -0,0 +1,51 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api import HoloAI_API
+from holoai_api.Preset import Preset
+from holoai_api.FakeServer import FakeServer
+from holoai_api.types import Model
+
+from json import loads
+
+def test_snapshots_follow_the_changes_of_the_preset():
+    preset = Preset("test", Model.Model_6B, { "temperature": 0.7 })
+
+    snapshot = preset.snapshot()
+    assert preset.snapshot() is snapshot
+    assert snapshot.settings["temperature"] == 0.7 and snapshot.settings["tfs"] == Preset._DEFAULT["tfs"]
+    assert loads(snapshot.settings_json) == snapshot.to_settings()
+
+    try:
+        snapshot.name = "other"
+    except AttributeError:
+        pass
+    else:
+        assert False, "Expected the snapshot to be immutable"
+
+    preset["temperature"] = 0.9
+    changed = preset.snapshot()
+    assert changed is not snapshot and changed.settings["temperature"] == 0.9
+    assert snapshot.settings["temperature"] == 0.7
+
+    # equal content, equal snapshots
+    preset["temperature"] = 0.7
+    assert preset.snapshot() == snapshot and hash(preset.snapshot()) == hash(snapshot)
+
+async def test_snapshot_settings_are_sent_as_is():
+    async with FakeServer() as server:
+        account = server.add_account("user@example.com", "password", stories = 2)
+        first, second = account["stories"]
+
+        api = HoloAI_API(base_address = server.address)
+        await api.high_level.login("user@example.com", "password")
+
+        preset = Preset("test", Model.Model_6B, { "temperature": 0.7, "noCompletions": 1 })
+
+        await api.low_level.upsert_generation_settings(first, preset.snapshot())
+        await api.low_level.upsert_generation_settings(second, preset.to_settings())
+
+        assert account["stories"][first]["genSettings"] == account["stories"][second]["genSettings"]
+        assert account["stories"][first]["genSettings"]["temperature"] == 0.7
@@ -0,0 +1,32 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.Preset import PresetLibrary
+from holoai_api.types import Model
+
+from json import dumps
+
+def _write(path, settings):
+    path.write_text(dumps(settings))
+
+def test_only_preset_files_are_indexed(tmp_path):
+    _write(tmp_path / "a.preset", { "temperature": 0.5 })
+    _write(tmp_path / "b.json", { "temperature": 0.6 })
+    (tmp_path / ".DS_Store").write_bytes(b"\x00\x01")
+    (tmp_path / "a.preset~").write_text("{")
+    (tmp_path / "notes.txt").write_text("not a preset")
+
+    model_dir = tmp_path / Model.Model_6B.name
+    model_dir.mkdir()
+    _write(model_dir / "a.preset", { "temperature": 0.7 })
+    (model_dir / "a.preset.bak").write_text("{")
+
+    library = PresetLibrary(str(tmp_path))
+
+    assert len(library) == 3
+    assert library.names() == ["a", "b"]
+    assert library.get("a")["temperature"] == 0.5
+    assert library.get("a", Model.Model_6B)["temperature"] == 0.7
+    assert library.get("notes") is None and library.get(".DS_Store") is None
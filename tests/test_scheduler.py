@@ -0,0 +1,79 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.Scheduler import Scheduler, Priority
+
+import asyncio
+
+async def test_scheduler_order_and_serialization():
+    scheduler = Scheduler(max_concurrent = 1)
+
+    order = []
+    running = set()
+
+    def make_job(key, name):
+        async def job():
+            assert key not in running, f"Jobs of {key} ran concurrently"
+            running.add(key)
+
+            await asyncio.sleep(0.01)
+            order.append(name)
+
+            running.discard(key)
+
+        return job
+
+    # the first job takes the only slot, the others queue behind it
+    jobs = [scheduler.run("a", make_job("a", "a1"), Priority.Background)]
+    await asyncio.sleep(0)
+
+    jobs.append(scheduler.run("a", make_job("a", "a2"), Priority.Background))
+    jobs.append(scheduler.run("a", make_job("a", "a3"), Priority.Background))
+    jobs.append(scheduler.run("b", make_job("b", "b1"), Priority.Background))
+    jobs.append(scheduler.run("c", make_job("c", "c1"), Priority.Interactive))
+
+    await asyncio.gather(*jobs)
+
+    # interactive first, then round-robin across the stories
+    assert order == ["a1", "c1", "a2", "b1", "a3"]
+
+    metrics = scheduler.get_metrics()
+    assert metrics["running"] == 0
+    assert metrics["queue_depth"] == { "Interactive": 0, "Background": 0 }
+    assert metrics["wait_time"]["Background"]["completed"] == 4
+
+async def test_scheduler_concurrency_cap():
+    scheduler = Scheduler(max_concurrent = 2)
+
+    active = 0
+    peak = 0
+
+    async def job():
+        nonlocal active, peak
+
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    await asyncio.gather(*(scheduler.run(i, job) for i in range(8)))
+
+    assert peak == 2
+
+async def test_scheduler_cancel_queued():
+    scheduler = Scheduler(max_concurrent = 1)
+
+    blocker = asyncio.ensure_future(scheduler.run("a", lambda: asyncio.sleep(0.05)))
+    await asyncio.sleep(0)
+
+    queued = asyncio.ensure_future(scheduler.run("b", lambda: asyncio.sleep(0)))
+    await asyncio.sleep(0)
+    queued.cancel()
+
+    await blocker
+    await asyncio.gather(queued, return_exceptions = True)
+
+    assert scheduler.get_metrics()["queue_depth"]["Interactive"] == 0
+    assert scheduler._running == 0
@@ -0,0 +1,45 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.SchemaValidator import SchemaValidator
+
+from json import dumps
+
+from jsonschema.exceptions import ValidationError
+
+def _use_schemas(monkeypatch, tmp_path, **schemas):
+    for name, schema in schemas.items():
+        (tmp_path / f"{name}.json").write_text(dumps(schema))
+
+    monkeypatch.setattr(SchemaValidator, "_schemas_path", str(tmp_path))
+    monkeypatch.setattr(SchemaValidator, "_schema_files", None)
+    monkeypatch.setattr(SchemaValidator, "_validators", {})
+    monkeypatch.setattr(SchemaValidator, "_counters", {})
+
+def test_validators_are_compiled_on_first_use(monkeypatch, tmp_path):
+    _use_schemas(monkeypatch, tmp_path, number = { "type": "number" })
+
+    assert SchemaValidator.has_schema("number") and not SchemaValidator.has_schema("string")
+    assert SchemaValidator._validators == {}
+
+    assert SchemaValidator.validate("number", 1)
+    validator = SchemaValidator._validators["number"]
+
+    try:
+        SchemaValidator.validate("number", "1")
+    except ValidationError:
+        pass
+    else:
+        assert False, "Expected a validation error"
+
+    assert SchemaValidator._validators["number"] is validator
+
+def test_sampled_validation(monkeypatch, tmp_path):
+    _use_schemas(monkeypatch, tmp_path, number = { "type": "number" })
+    monkeypatch.setattr(SchemaValidator, "sample_rate", 3)
+
+    # one object out of three is validated, the others are skipped even if invalid
+    assert [SchemaValidator.validate("number", 1), SchemaValidator.validate("number", "skipped"),
+            SchemaValidator.validate("number", "skipped"), SchemaValidator.validate("number", 2)] == [True, False, False, True]
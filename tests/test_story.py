@@ -0,0 +1,212 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.story import HoloAI_Story
+from holoai_api.GlobalSettings import GlobalSettings
+from holoai_api.StoryStore import StoryStore
+from holoai_api.FakeServer import generate_story, get_account_key
+from holoai_api.utils import format_and_decrypt_stories
+
+from copy import deepcopy
+from random import Random
+
+import asyncio
+
+_ACCOUNT_KEY = get_account_key("password", "salt")
+
+def _make_story(story_id: str):
+    raw = generate_story(_ACCOUNT_KEY, 256, story_id, Random(story_id), iterations = 1)
+
+    story = deepcopy(raw)
+    format_and_decrypt_stories(_ACCOUNT_KEY, story)
+
+    return raw, story
+
+def _make_holo_story(tmp_path, story_ids, max_loaded):
+    store = StoryStore(str(tmp_path / "stories.db"))
+    stories = []
+
+    for story_id in story_ids:
+        raw, story = _make_story(story_id)
+        store.upsert(raw, story)
+        stories.append(story)
+
+    return HoloAI_Story(None, GlobalSettings(), store, max_loaded = max_loaded), stories
+
+def test_contexts_are_memoized_per_position(tmp_path):
+    holo_story, (a,) = _make_holo_story(tmp_path, ["a"], None)
+    proxy = holo_story.load(a)
+    proxy.model = "model"
+
+    built = []
+
+    def build_context():
+        built.append(str(proxy))
+        return { "tokens": [len(built)] }
+
+    proxy._build_context = build_context
+
+    assert proxy.build_context() == [1]
+    assert proxy.edit(0, 1, "x")
+    assert proxy.build_context() == [2]
+
+    # going back to a known position doesn't build again
+    assert proxy.undo()
+    context = proxy.build_context()
+    assert context == [1]
+
+    # the memoized tokens are not shared with the caller
+    context.append(0)
+    assert proxy.redo()
+    assert proxy.build_context() == [2]
+    assert proxy.undo()
+    assert proxy.build_context() == [1]
+
+    proxy.context_size = 1024
+    assert proxy.build_context() == [3]
+    assert len(built) == 3
+
+def test_clean_proxies_are_evicted_and_reloaded(tmp_path):
+    holo_story, (a, b) = _make_holo_story(tmp_path, ["a", "b"], 1)
+
+    proxy_a = holo_story.load(a)
+    holo_story.load(b)
+
+    assert list(holo_story) == ["b"]
+
+    reloaded = holo_story.select("a")
+    assert reloaded is not proxy_a and str(reloaded) == str(proxy_a)
+
+def test_evicted_proxies_keep_their_edits(tmp_path):
+    holo_story, (a, b, c) = _make_holo_story(tmp_path, ["a", "b", "c"], 1)
+
+    proxy_a = holo_story.load(a)
+    assert proxy_a.edit(0, 1, "x")
+    assert proxy_a.undo() and proxy_a.redo()
+    tree = proxy_a.get_current_tree()
+
+    # the changed proxy is evicted, its tree is stored
+    holo_story.load(b)
+    holo_story.load(c)
+    assert list(holo_story) == ["c"]
+    assert not proxy_a.is_dirty
+
+    reloaded = holo_story.select("a")
+    assert reloaded is not proxy_a
+    assert reloaded.get_current_tree() == tree and str(reloaded) == str(proxy_a)
+    assert not reloaded.is_dirty
+
+    # the stored tree is found again by a new handler
+    other, _ = _make_holo_story(tmp_path, [], 1)
+    assert other.load(a).get_current_tree() == tree
+
+    holo_story.unload("a")
+    assert "a" not in holo_story
+    assert holo_story.store.get_tree("a") is None
+
+def test_stale_trees_are_ignored(tmp_path):
+    holo_story, (a, b) = _make_holo_story(tmp_path, ["a", "b"], 1)
+
+    proxy_a = holo_story.load(a)
+    assert proxy_a.edit(0, 1, "x")
+    holo_story.load(b)
+
+    # the story changed on the backend since its tree was stored
+    changed = deepcopy(a)
+    changed["content"]["ct"]["content"] = "changed"
+
+    proxy = holo_story.load(changed)
+    assert str(proxy) == "changed" and len(proxy.get_current_tree()) == 1
+
+def test_changed_proxies_are_kept_without_store():
+    holo_story = HoloAI_Story(None, GlobalSettings(), max_loaded = 1)
+    (_, a), (_, b), (_, c) = _make_story("a"), _make_story("b"), _make_story("c")
+
+    proxy_a = holo_story.load(a)
+    assert proxy_a.edit(0, 1, "x")
+
+    holo_story.load(b)
+    holo_story.load(c)
+    assert "a" in holo_story and "b" not in holo_story
+    assert holo_story.select("a") is proxy_a
+
+async def test_eviction_cancels_the_prefetch(tmp_path):
+    holo_story, (a, b) = _make_holo_story(tmp_path, ["a", "b"], 1)
+
+    proxy_a = holo_story.load(a)
+
+    task = asyncio.ensure_future(asyncio.sleep(10))
+    proxy_a._prefetch = (proxy_a._get_context_key(), task)
+
+    holo_story.load(b)
+    await asyncio.sleep(0)
+
+    assert task.cancelled()
+    assert proxy_a._prefetch is None
+
+def _set_prefetch(proxy, coroutine):
+    task = asyncio.ensure_future(coroutine)
+    proxy._prefetch = (proxy._get_prefetch_key(), task)
+    proxy._prefetch_started = True
+
+    return task
+
+async def test_cancelled_generation_does_not_draw_again(tmp_path):
+    holo_story, (a,) = _make_holo_story(tmp_path, ["a"], None)
+    proxy = holo_story.load(a)
+
+    draws = []
+
+    async def draw_completions():
+        draws.append(1)
+        return { "completions": [""] }
+
+    proxy._draw_completions = draw_completions
+    prefetch = _set_prefetch(proxy, asyncio.sleep(10))
+
+    generation = asyncio.ensure_future(proxy.generate())
+    await asyncio.sleep(0.01)
+    generation.cancel()
+
+    try:
+        await generation
+    except asyncio.CancelledError:
+        pass
+    else:
+        assert False, "Expected the generation to be cancelled"
+
+    await asyncio.sleep(0)
+    assert draws == []
+    assert prefetch.cancelled()
+
+async def test_cancelled_prefetch_is_a_miss(tmp_path):
+    holo_story, (a,) = _make_holo_story(tmp_path, ["a"], None)
+    proxy = holo_story.load(a)
+
+    prefetch = _set_prefetch(proxy, asyncio.sleep(10))
+
+    consume = asyncio.ensure_future(proxy._consume_prefetch())
+    await asyncio.sleep(0)
+    prefetch.cancel()
+
+    assert await consume is None
+
+async def test_prefetch_depends_on_the_prefix_and_module(tmp_path):
+    holo_story, (a,) = _make_holo_story(tmp_path, ["a"], None)
+    proxy = holo_story.load(a)
+    proxy.prefix = "prefix"
+
+    async def speculation():
+        return { "completions": "speculated" }
+
+    prefetch = _set_prefetch(proxy, speculation())
+    await asyncio.sleep(0)
+    proxy.module = "module"
+
+    assert await proxy._consume_prefetch() is None
+    assert proxy._prefetch is None
+
+    prefetch = _set_prefetch(proxy, speculation())
+    assert await proxy._consume_prefetch() == { "completions": "speculated" }
@@ -0,0 +1,32 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.Tracing import Tracer, set_tracer, start_span, get_current_span, NULL_SPAN
+
+import asyncio
+
+async def test_spans_nest_across_tasks():
+    tracer = Tracer()
+    set_tracer(tracer)
+
+    async def child(i):
+        with start_span("child", { "i": i }):
+            await asyncio.sleep(0)
+
+    try:
+        with start_span("root") as root:
+            await asyncio.gather(*(child(i) for i in range(3)))
+
+        assert get_current_span() is None
+    finally:
+        set_tracer(None)
+
+    children = [span for span in tracer.spans if span.name == "child"]
+    assert len(children) == 3
+    assert all(span.parent_id == root.span_id and span.trace_id == root.trace_id for span in children)
+    assert tracer.spans[-1] is root and root.end_time is not None
+
+def test_no_tracer_is_noop():
+    assert start_span("anything") is NULL_SPAN
@@ -0,0 +1,43 @@
+from sys import path
+from os.path import join, abspath, dirname
+
+path.insert(0, abspath(join(dirname(__file__), '..')))
+
+from holoai_api.WorldInfo import KeyMatcher, WorldInfo
+
+from random import Random
+
+def naive_scan(keys, text):
+    matches = {}
+    for i, key in enumerate(keys):
+        for start in range(len(text)):
+            if text.startswith(key, start):
+                matches.setdefault(i, []).append((start, start + len(key)))
+
+    return matches
+
+def test_key_matcher_against_naive():
+    rng = Random(0)
+
+    for _ in range(500):
+        keys = [''.join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+        text = ''.join(rng.choice("abcd") for _ in range(40))
+
+        matcher = KeyMatcher(enumerate(keys), case_sensitive = True)
+        assert matcher.scan(text) == naive_scan(keys, text)
+
+def test_world_info_activation():
+    world_info = WorldInfo({ "keys": ["Alice", "/bo+b/"], "entry": "a" },
+                           { "keys": ["Carol"], "entry": "c", "enabled": False },
+                           { "keys": ["Dave"], "entry": "d" })
+
+    activated = world_info.activate("ALICE met Booob and alice", 10)
+    assert activated == [(world_info[0], [(10, 15), (20, 25), (30, 35)])]
+
+    # the matcher is only rebuilt when the entries change
+    matcher = world_info.get_matcher()
+    assert world_info.get_matcher() is matcher
+
+    world_info += { "keys": ["met"], "entry": "m" }
+    assert world_info.get_matcher() is not matcher
+    assert [entry["entry"] for entry, _ in world_info.activate("Alice met Dave")] == ["a", "d", "m"]
@@ -1,16 +1,18 @@
 from os import environ as env, listdir
 from sys import path
-from os.path import dirname, abspath, join
+from os.path import dirname, abspath, join, getsize
 from json import dumps
 from asyncio import run
 from argparse import ArgumentParser
 from math import ceil
 from tqdm import tqdm
-from time import sleep
 
 path.append(join(dirname(abspath(__file__)), ".."))
 
 from holoai_api import HoloAI_API
+from holoai_api.DatasetIndex import DatasetIndex
+from holoai_api.dataset import estimate_dataset_tokens
+from holoai_api.types import Model, Prefix, Listing
 from aiohttp import ClientSession
 
 from typing import Union
@@ -49,35 +51,54 @@ def format_time(t: Union[float, int]) -> str:
     else:
         return f"{int(t / hours)} hours {int(t / mins) % mins} mins"
 
-if "HAI_USERNAME" not in env or "HAI_PASSWORD" not in env:
-    raise RuntimeError("Please ensure that HAI_USERNAME and HAI_PASSWORD are set in your environment")
+async def main():
+    # the documents are streamed from disk during the upload
+    paths = [join(args.directory, filename) for filename in listdir(args.directory)]
+    size = sum(getsize(path) for path in paths)
 
-username = env["HAI_USERNAME"]
-password = env["HAI_PASSWORD"]
+    percentage = float(args.percentage)
+    prefix = { "novel": Prefix.Novel, "fanfic": Prefix.Fanfic, "romance": Prefix.Romance, "generic": Prefix.Generic }[args.prefix]
+    visibility = { "private": Listing.Private, "unlisted": Listing.Unlisted, "public": Listing.Public }[args.visibility]
+
+    # with an index, an identical dataset uploaded before is reused (and kept after training)
+    index = DatasetIndex(args.index) if args.index else None
+
+    # counted locally, so a bad dataset is rejected before anything is uploaded
+    estimate = estimate_dataset_tokens(paths, args.model, index)
+
+    empty = [path for path, tokens in estimate["documents"].items() if tokens == 0]
+    if empty:
+        raise RuntimeError(f"Empty documents in the dataset: {', '.join(empty)}")
+
+    if args.max_tokens is not None and args.max_tokens < estimate["total"]:
+        raise RuntimeError(f"The dataset has about {estimate['total']} tokens, more than the maximum of {args.max_tokens}")
+
+    estimated_steps = ceil(estimate["total"] / 8192 * percentage / 100)
+    print(f"Dataset of about {estimate['total']} tokens, {estimated_steps} steps ({format_file_size(size)})")
+
+    if args.estimate_only:
+        return
+
+    if "HAI_USERNAME" not in env or "HAI_PASSWORD" not in env:
+        raise RuntimeError("Please ensure that HAI_USERNAME and HAI_PASSWORD are set in your environment")
+
+    username = env["HAI_USERNAME"]
+    password = env["HAI_PASSWORD"]
 
-async def main():
     async with ClientSession() as session:
         api = HoloAI_API(session)
-        Prefix = api.low_level.Prefix
-        Listing = api.low_level.Listing
 
         account_key = await api.high_level.login(username, password)
 
-        size = 0
-        documents = []
-        for filename in listdir(args.directory):
-            with open(join(args.directory, filename)) as f:
-                data = f.read()
-                documents.append({ "filename": filename, "text": data })
-                size += len(data)
-
-        percentage = float(args.percentage)
-        prefix = { "novel": Prefix.Novel, "fanfic": Prefix.Fanfic, "romance": Prefix.Romance, "cyoa": Prefix.CYOA, "generic": Prefix.Generic }[args.prefix]
-        visibility = { "private": Listing.Private, "unlisted": Listing.Unlisted, "public": Listing.Public }[args.visibility]
+        if index is not None:
+            await index.refresh(api)
 
-        dataset = await api.low_level.create_prompt_tune_dataset(args.name, documents)
+        dataset, = await api.high_level.upload_dataset_files(args.name, paths, index = index)
         dataset_id = dataset["id"]
-        dataset_size = sum(d["tokensLength"] for d in dataset["documents"])
+
+        # the count of the server is authoritative, the estimate is only used if it is missing
+        tokens_lengths = [d.get("tokensLength") for d in dataset.get("documents", [])]
+        dataset_size = estimate["total"] if not tokens_lengths or None in tokens_lengths else sum(tokens_lengths)
 
         steps = ceil(dataset_size / 8192 * percentage / 100)
         checkpoints = [ *range(0, steps, 20), steps ]
@@ -87,16 +108,17 @@ async def main():
             module = await api.low_level.create_prompt_tune(checkpoints,
                                                             dataset_id,
                                                             args.description,
-                                                            True,
+                                                            index is None,
                                                             visibility,
-                                                            api.low_level.ModelName.Model,
+                                                            args.model,
                                                             args.nsfw,
                                                             steps,
                                                             prefix,
                                                             [],
                                                             args.name)
         except Exception as e:
-            await api.low_level.delete_prompt_tune_dataset(dataset_id)
+            if not dataset.get("reused"):
+                await api.low_level.delete_prompt_tune_dataset(dataset_id)
             raise e
 
         tune_id = module["id"]
@@ -106,21 +128,14 @@ async def main():
         progress = tqdm(total = steps, unit = "step")
         progress.set_description("Queued, waiting for training")
 
-        while True:
-            state = await api.low_level.read_prompt_tune(tune_id)
-
-            run_state = state["data"]["runStatus"]
-            if run_state is None:
-                break
+        async for event in api.high_level.watch_prompt_tunes([tune_id]):
+            state = event
 
-            cur_steps = run_state["currentStepNo"]
-            if cur_steps == 0:
-                progress.refresh()
-                sleep(5)
-            else:
-                progress.n = cur_steps
+            if event["state"] == "training":
+                progress.n = event["step"]
                 progress.set_description("Training")
-                sleep(1)
+            else:
+                progress.refresh()
 
         progress.n = steps
         progress.set_description("Finished")
@@ -147,6 +162,10 @@ parser.add_argument("visibility", choices = ["private", "unlisted", "public"], h
 parser.add_argument("-d", "--description", nargs = '?', default = "", help = "Description of the module. Default to empty")
 parser.add_argument("-p", "--percentage", nargs = '?', default = "100.0", help = "Percentage of the dataset to use (100.0 is 100%%). Default is 100%%")
 parser.add_argument("-n", "--nsfw", action = "store_true", help = "Is the module NSFW")
+parser.add_argument("-i", "--index", nargs = '?', default = None, help = "Path of a local dataset index, to reuse identical datasets")
+parser.add_argument("-m", "--model", type = Model, default = Model.Model_6B, choices = list(Model), help = "Model to train the module for")
+parser.add_argument("--max-tokens", type = int, default = None, help = "Reject datasets with more tokens (estimated locally)")
+parser.add_argument("--estimate-only", action = "store_true", help = "Only estimate the size of the dataset, without uploading it")
 args = parser.parse_args()
 
 run(main())
\ No newline at end of file